@@ -18,7 +18,8 @@
 #                                                                           #
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-# The sole purpose of this module is to invoke run_benchmark().
+# The sole purpose of this module is to invoke run_benchmark(), or to invoke
+# run_interleaved_benchmarks() when comparing the speeds of multiple engines.
 #
 #   - binary   : Relative path to, and including, the Binary File
 #   - network  : Relative path to a private engine's Network File, or None
@@ -26,23 +27,40 @@
 #   - threads  : Number of concurrent benches to run
 #   - sets     : Number of times to repeat this experiment
 #   - expected : None, or an expected value, which if not matched raises Exceptions
+#   - affinity : None, or a list of CPU sets, on which to pin each concurrent bench
 #
-# run_benchmark() may raise utils.OpenBenchBadBenchException.
+# run_interleaved_benchmarks() takes a list of (binary, network, private, expected),
+# and runs one set of each engine in turn, ABAB, so that thermal and turbo drift is
+# shared evenly between them. Sets are repeated, between min_sets and max_sets, until
+# every engine's confidence interval is within precision of its mean. The outcome for
+# each engine is a BenchResult, whose speed excludes any outlying samples.
+#
+# Both may raise utils.OpenBenchBadBenchException.
 # An associated error message, including the binary name, is included
 
+import collections
+import math
 import multiprocessing
 import os
 import queue
 import re
+import statistics
 import subprocess
 import sys
 
 ## Local imports must only use "import x", never "from x import ..."
 
+import topology
 import utils
 
 MAX_BENCH_TIME_SECONDS = 60
 
+BENCH_Z_SCORE      = 1.96 # 95% Confidence Intervals
+BENCH_OUTLIER_MADS = 3.50 # Rejection threshold, in scaled median absolute deviations
+BENCH_MIN_SAMPLES  = 3    # Required before rejecting outliers, or judging convergence
+
+BenchResult = collections.namedtuple('BenchResult', ['nps', 'bench', 'stdev', 'ci', 'samples', 'rejected'])
+
 def parse_stream_output(stream):
 
     nps = bench = None # Search through output Stream
@@ -68,7 +86,7 @@ def parse_stream_output(stream):
     bench = int(re.search(r'\d+', bench).group()) if bench else None
     return (bench, nps)
 
-def single_core_bench(binary, network, private, outqueue):
+def single_core_bench(binary, network, private, outqueue, cpus=None):
 
     # Basic command for Public engines
     cmd = ['./%s' % (binary), 'bench']
@@ -79,21 +97,24 @@ def single_core_bench(binary, network, private, outqueue):
         cmd = ['./%s' % (binary), option, 'bench', 'quit']
 
     try: # Launch the bench and wait for results
-        stdout, stderr = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        stdout, stderr = topology.pinned_popen(
+            cmd, cpus, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
         ).communicate()
         outqueue.put(parse_stream_output(stdout))
 
     except: # Signal an error with (None, None)
         outqueue.put((None, None))
 
-def multi_core_bench(binary, network, private, threads):
+def multi_core_bench(binary, network, private, threads, affinity=None):
 
     outqueue = multiprocessing.Queue()
 
+    # Benches are placed on the same CPUs that the games will be played on
+    cpus = [affinity[ii % len(affinity)] if affinity else None for ii in range(threads)]
+
     processes = [
         multiprocessing.Process(
-            target=single_core_bench, args=(binary, network, private, outqueue))
+            target=single_core_bench, args=(binary, network, private, outqueue, cpus[ii]))
         for ii in range(threads)
     ]
 
@@ -111,14 +132,23 @@ def multi_core_bench(binary, network, private, threads):
         for process in processes:
             process.join()
 
-def run_benchmark(binary, network, private, threads, sets, expected=None):
+def reject_outliers(speeds):
+
+    if len(speeds) < BENCH_MIN_SAMPLES:
+        return speeds, []
+
+    # Median absolute deviation, scaled to match the stdev of a normal distribution
+    median = statistics.median(speeds)
+    mad    = 1.4826 * statistics.median(abs(x - median) for x in speeds)
 
-    engine = os.path.basename(binary)
+    if not mad:
+        return speeds, []
 
-    benches, speeds = [], []
-    for ii in range(sets):
-        for bench, speed in multi_core_bench(binary, network, private, threads):
-            benches.append(bench); speeds.append(speed)
+    kept     = [x for x in speeds if abs(x - median) <= BENCH_OUTLIER_MADS * mad]
+    rejected = [x for x in speeds if abs(x - median) >  BENCH_OUTLIER_MADS * mad]
+    return kept, rejected
+
+def summarize_benchmark(engine, benches, speeds, expected):
 
     if len(set(benches)) != 1:
         raise utils.OpenBenchBadBenchException('[%s] Non-Deterministic Benches' % (engine))
@@ -129,4 +159,41 @@ def run_benchmark(binary, network, private, threads, sets, expected=None):
     if expected and expected != benches[0]:
         raise utils.OpenBenchBadBenchException('[%s] Wrong Bench: %d' % (engine, benches[0]))
 
-    return sum(speeds) // len(speeds), benches[0]
+    kept, rejected = reject_outliers(speeds)
+
+    mean  = sum(kept) / len(kept)
+    stdev = statistics.stdev(kept) if len(kept) > 1 else 0.0
+    ci    = BENCH_Z_SCORE * stdev / math.sqrt(len(kept))
+
+    return BenchResult(int(mean), benches[0], stdev, ci, len(kept), len(rejected))
+
+def converged(result, precision):
+    return result.samples >= BENCH_MIN_SAMPLES and result.ci <= precision * result.nps
+
+def run_interleaved_benchmarks(engines, threads, min_sets, max_sets, precision=0.01, affinity=None):
+
+    samples = [([], []) for engine in engines]
+
+    for ii in range(max_sets):
+
+        # One set of each engine in turn, validating as we go to fail quickly
+        results = []
+        for (binary, network, private, expected), (benches, speeds) in zip(engines, samples):
+
+            for bench, speed in multi_core_bench(binary, network, private, threads, affinity):
+                benches.append(bench); speeds.append(speed)
+
+            results.append(summarize_benchmark(
+                os.path.basename(binary), benches, speeds, expected))
+
+        if ii + 1 >= min_sets and all(converged(x, precision) for x in results):
+            break
+
+    return results
+
+def run_benchmark(binary, network, private, threads, sets, expected=None, affinity=None):
+
+    engines = [(binary, network, private, expected)]
+    result  = run_interleaved_benchmarks(engines, threads, sets, sets, affinity=affinity)[0]
+
+    return result.nps, result.bench
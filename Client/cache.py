@@ -0,0 +1,316 @@
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                           #
+#   OpenBench is a chess engine testing framework by Andrew Grant.          #
+#   <https://github.com/AndyGrant/OpenBench>  <andrew@grantnet.us>          #
+#                                                                           #
+#   OpenBench is free software: you can redistribute it and/or modify       #
+#   it under the terms of the GNU General Public License as published by    #
+#   the Free Software Foundation, either version 3 of the License, or       #
+#   (at your option) any later version.                                     #
+#                                                                           #
+#   OpenBench is distributed in the hope that it will be useful,            #
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+#   GNU General Public License for more details.                            #
+#                                                                           #
+#   You should have received a copy of the GNU General Public License       #
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+#                                                                           #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# The purpose of this module is to share Engine binaries and Network files,
+# between workloads and between many workers running on the same machine.
+#
+#   - Artifacts are addressed by a key, via artifact_key(), which is a hash of
+#     everything that determines the artifact's contents. For engines this is
+#     the engine, commit sha, compiler, CPU flags, and Network.
+#
+#   - The cache keeps an index.json of every artifact, its size, and the last
+#     time that it was used. Once the cache exceeds its quota, the artifacts
+#     that were used least recently are evicted first.
+#
+#   - Artifacts are hard-linked into a worker's Engines/ and Networks/ folders
+#     whenever possible, so evicting from the cache never pulls a file out from
+#     under a running worker. Across filesystems, artifacts are copied instead.
+#     Each fetch touches the file, since links share one mtime, and a worker's
+#     cleanup removes whatever has gone unused for a week.
+#
+#   - All access to the index is done under a file lock. A per-artifact lock
+#     is held while fetching or building, so that when many workers on one
+#     machine want the same artifact, only one of them will produce it.
+#
+#   - Benchmark results are kept alongside the artifacts, in bench.json, so that
+#     the same binaries are not benchmarked again for every workload.
+#
+#   - Probes of the machine, such as compiler versions and CPU flags, are kept
+#     in probes.json. Each is keyed by a stamp of what it depends on, such as
+#     the path, size, and mtime of a binary, and is reused until that changes.
+
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import shutil
+import threading
+import time
+
+## Local imports must only use "import x", never "from x import ..."
+
+IS_WINDOWS = platform.system() == 'Windows' # Don't touch this
+IS_LINUX   = platform.system() != 'Windows' # Don't touch this
+
+## File locks are held per process, so threads must also exclude one another
+
+THREAD_LOCKS      = collections.defaultdict(threading.Lock)
+THREAD_LOCKS_LOCK = threading.Lock()
+
+def artifact_key(*parts):
+
+    # Stable across runs and machines, regardless of the types used in parts
+    serialized = json.dumps([str(x) for x in parts])
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+@contextlib.contextmanager
+def file_lock(path):
+
+    with THREAD_LOCKS_LOCK:
+        thread_lock = THREAD_LOCKS[os.path.abspath(path)]
+
+    # Blocking exclusive lock on the first byte of the file
+    with thread_lock, open(path, 'a+') as lockfile:
+
+        if IS_WINDOWS:
+            import msvcrt
+            lockfile.seek(0)
+            while True:
+                try: msvcrt.locking(lockfile.fileno(), msvcrt.LK_LOCK, 1); break
+                except OSError: continue # LK_LOCK gives up after 10 seconds
+
+        else:
+            import fcntl
+            fcntl.lockf(lockfile, fcntl.LOCK_EX)
+
+        try: yield
+
+        finally:
+
+            if IS_WINDOWS:
+                lockfile.seek(0)
+                msvcrt.locking(lockfile.fileno(), msvcrt.LK_UNLCK, 1)
+
+            else:
+                fcntl.lockf(lockfile, fcntl.LOCK_UN)
+
+def link_or_copy(source, destination):
+
+    # Build the destination under a temporary name, so it appears atomically
+    temp_path = '%s.%d.tmp' % (destination, os.getpid())
+
+    try: os.link(source, temp_path)
+    except OSError: shutil.copy2(source, temp_path)
+
+    os.replace(temp_path, destination)
+
+class JSONIndex(object):
+
+    ## A JSON file of entries, kept in path, and replaced atomically whenever written.
+    ## Access is guarded by the lockfile alongside it, which callers must hold
+
+    def __init__(self, path, name):
+
+        self.path     = os.path.abspath(path)
+        self.index    = os.path.join(self.path, '%s.json' % (name))
+        self.lockfile = os.path.join(self.path, '%s.lock' % (name))
+
+        os.makedirs(self.path, exist_ok=True)
+
+    def read_index(self):
+
+        try:
+            with open(self.index) as fin:
+                return json.load(fin)
+
+        except (OSError, ValueError):
+            return {}
+
+    def write_index(self, index):
+
+        with open(self.index + '.tmp', 'w') as fout:
+            json.dump(index, fout, indent=2)
+
+        os.replace(self.index + '.tmp', self.index)
+
+class ArtifactCache(JSONIndex):
+
+    def __init__(self, path, quota_mb):
+
+        super().__init__(path, 'index')
+
+        self.quota   = quota_mb * 1024 * 1024
+        self.objects = os.path.join(self.path, 'objects')
+        self.locks   = os.path.join(self.path, 'locks')
+
+        for folder in [self.objects, self.locks]:
+            os.makedirs(folder, exist_ok=True)
+
+    def lock(self, key):
+        return file_lock(os.path.join(self.locks, '%s.lock' % (key)))
+
+    def contains(self, key):
+        return key in self.read_index() and os.path.isfile(os.path.join(self.objects, key))
+
+    def fetch(self, key, destination):
+
+        # Place the artifact at destination, returning False if it is not cached
+        with file_lock(self.lockfile):
+
+            index    = self.read_index()
+            obj_path = os.path.join(self.objects, key)
+
+            if key not in index or not os.path.isfile(obj_path):
+                index.pop(key, None)
+                self.write_index(index)
+                return False
+
+            index[key]['atime'] = time.time()
+            self.write_index(index)
+
+            if not os.path.isfile(destination):
+                link_or_copy(obj_path, destination)
+
+            # Links share an mtime, which cleanup_client() uses to find stale files
+            try: os.utime(destination)
+            except OSError: pass
+
+            return True
+
+    def store(self, key, source, description=''):
+
+        # Add a newly built or downloaded artifact to the cache, evicting if needed
+        with file_lock(self.lockfile):
+
+            index    = self.read_index()
+            obj_path = os.path.join(self.objects, key)
+
+            if not os.path.isfile(obj_path):
+                link_or_copy(source, obj_path)
+
+            index[key] = {
+                'size'        : os.path.getsize(obj_path),
+                'atime'       : time.time(),
+                'description' : description,
+            }
+
+            self.evict_from_index(index, keep=key)
+            self.write_index(index)
+
+    def evict(self):
+
+        with file_lock(self.lockfile):
+            index = self.read_index()
+            self.evict_from_index(index)
+            self.write_index(index)
+
+    def evict_from_index(self, index, keep=None):
+
+        # Forget about artifacts that have been deleted by hand
+        for key in [x for x in index if not os.path.isfile(os.path.join(self.objects, x))]:
+            del index[key]
+
+        # Remove the least recently used artifacts until within the quota
+        total = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda x: index[x]['atime']):
+
+            if total <= self.quota:
+                break
+
+            # Never evict the artifact which is being stored
+            if key == keep:
+                continue
+
+            # Windows refuses to delete binaries which are currently running
+            try: os.remove(os.path.join(self.objects, key))
+            except OSError: continue
+
+            print ('Evicting %s from the Cache' % (index[key]['description'] or key))
+            total -= index.pop(key)['size']
+
+class BenchCache(JSONIndex):
+
+    ## Benchmark results, keyed by binary, Network, threads, and machine. Entries
+    ## expire after max_age seconds, and are only trusted while a single-threaded
+    ## bench, rather than several interleaved sets, still reports the recorded nodes
+
+    def __init__(self, path, max_age):
+        super().__init__(path, 'bench')
+        self.max_age = max_age
+
+    def lookup(self, key):
+
+        if self.max_age <= 0:
+            return None
+
+        with file_lock(self.lockfile):
+            entry = self.read_index().get(key)
+
+        if not entry or time.time() - entry['time'] > self.max_age:
+            return None
+
+        return entry
+
+    def matches(self, entry, nodes):
+
+        # Benches are deterministic, so any change in the binary's behaviour shows up here
+        return nodes == entry['bench']
+
+    def store(self, key, nps, nodes):
+
+        if self.max_age <= 0:
+            return
+
+        with file_lock(self.lockfile):
+
+            index = self.read_index()
+            now   = time.time()
+
+            # Drop anything which has expired, so the index stays small
+            for x in [x for x in index if now - index[x]['time'] > self.max_age]:
+                del index[x]
+
+            index[key] = { 'nps' : nps, 'bench' : nodes, 'time' : now }
+            self.write_index(index)
+
+class ProbeCache(JSONIndex):
+
+    ## Results of slow probes of the machine, which rarely change between restarts of
+    ## the worker. Each entry remembers the stamp that it was produced under, and the
+    ## probe is only run again once the stamp differs. Stamps of None are never cached
+
+    def __init__(self, path):
+        super().__init__(path, 'probes')
+
+    def probe(self, name, stamp, function):
+
+        if stamp is None:
+            return function()
+
+        # Compare stamps as they would be stored, since tuples come back as lists
+        stamp = json.loads(json.dumps(stamp))
+
+        with file_lock(self.lockfile):
+            entry = self.read_index().get(name)
+
+        if entry and entry['stamp'] == stamp:
+            return entry['value']
+
+        # Probe without holding the lock, so that probes may run in parallel
+        value = function()
+
+        with file_lock(self.lockfile):
+            index = self.read_index()
+            index[name] = { 'stamp' : stamp, 'value' : value }
+            self.write_index(index)
+
+        return value
@@ -0,0 +1,478 @@
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                           #
+#   OpenBench is a chess engine testing framework by Andrew Grant.          #
+#   <https://github.com/AndyGrant/OpenBench>  <andrew@grantnet.us>          #
+#                                                                           #
+#   OpenBench is free software: you can redistribute it and/or modify       #
+#   it under the terms of the GNU General Public License as published by    #
+#   the Free Software Foundation, either version 3 of the License, or       #
+#   (at your option) any later version.                                     #
+#                                                                           #
+#   OpenBench is distributed in the hope that it will be useful,            #
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+#   GNU General Public License for more details.                            #
+#                                                                           #
+#   You should have received a copy of the GNU General Public License       #
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+#                                                                           #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# The purpose of this module is to provide just enough of the rules of chess
+# for the native match runner to referee games between engines.
+#
+#   - Board.from_fen() accepts FEN, X-FEN, and Shredder-FEN, so that standard,
+#     FRC, and DFRC opening books can all be used.
+#
+#   - Moves are (from, to, promotion) tuples. Castling is always stored as the
+#     King capturing its own Rook, which works for both standard and FRC games.
+#     Board.uci() and Board.parse_uci() convert to and from what engines expect.
+#
+#   - Board.san() and Board.parse_san() are used to write PGNs and to read the
+#     openings out of PGN books. Neither are concerned with speed.
+#
+#   - Board.outcome() reports mates, stalemates, the fifty move rule, and a lack
+#     of mating material. Repetitions are left to the caller, using Board.key().
+
+import copy
+
+## Local imports must only use "import x", never "from x import ..."
+
+STARTPOS = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+KNIGHT_STEPS = [(1, 2), (2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (-1, -2), (-2, -1)]
+KING_STEPS   = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+BISHOP_RAYS  = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+ROOK_RAYS    = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+def square(file, rank):
+    return rank * 8 + file
+
+def square_name(sq):
+    return 'abcdefgh'[sq % 8] + '12345678'[sq // 8]
+
+def parse_square(name):
+    return square('abcdefgh'.index(name[0]), '12345678'.index(name[1]))
+
+def colour_of(piece):
+    return 'w' if piece.isupper() else 'b'
+
+class Board(object):
+
+    def __init__(self):
+        self.squares   = ['.'] * 64
+        self.turn      = 'w'
+        self.castling  = [] # Squares of the Rooks which may still castle
+        self.ep        = None
+        self.halfmove  = 0
+        self.fullmove  = 1
+        self.chess960  = False
+        self.legal     = None # Cached by legal_moves(), until the next push()
+
+    @staticmethod
+    def from_fen(fen, chess960=False):
+
+        board  = Board()
+        fields = fen.split()
+
+        for rank, row in enumerate(fields[0].split('/')[::-1]):
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                else:
+                    board.squares[square(file, rank)] = char
+                    file += 1
+
+        board.turn     = fields[1] if len(fields) > 1 else 'w'
+        board.ep       = parse_square(fields[3]) if len(fields) > 3 and fields[3] != '-' else None
+        board.halfmove = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+        board.fullmove = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+        board.chess960 = chess960
+
+        for char in (fields[2] if len(fields) > 2 else '-'):
+            if (rook := board.castling_rook_from_fen(char)) is not None:
+                board.castling.append(rook)
+
+        return board
+
+    def castling_rook_from_fen(self, char):
+
+        if char == '-':
+            return None
+
+        rank = 0 if char.isupper() else 7
+        rook = 'R' if char.isupper() else 'r'
+        king = self.king_square('w' if char.isupper() else 'b')
+
+        if king is None:
+            return None
+
+        # Shredder-FEN names the file of the Rook directly
+        if char.upper() in 'ABCDEFGH':
+            return square('ABCDEFGH'.index(char.upper()), rank)
+
+        # X-FEN's K and Q refer to the outermost Rook on that side of the King
+        files = range(7, king % 8, -1) if char.upper() == 'K' else range(0, king % 8)
+        for file in files:
+            if self.squares[square(file, rank)] == rook:
+                return square(file, rank)
+
+        return None
+
+    def copy(self):
+
+        board = copy.copy(self)
+        board.squares  = self.squares[:]
+        board.castling = self.castling[:]
+        return board
+
+    def king_square(self, colour):
+
+        king = 'K' if colour == 'w' else 'k'
+        for sq in range(64):
+            if self.squares[sq] == king:
+                return sq
+
+    def fen(self):
+
+        rows = []
+        for rank in range(7, -1, -1):
+            row, empty = '', 0
+            for file in range(8):
+                piece = self.squares[square(file, rank)]
+                if piece == '.':
+                    empty += 1
+                    continue
+                row  += str(empty) if empty else ''
+                row  += piece
+                empty = 0
+            rows.append(row + (str(empty) if empty else ''))
+
+        ep = square_name(self.ep) if self.ep is not None and self.ep_capturable() else '-'
+        return '%s %s %s %s %d %d' % ('/'.join(rows), self.turn, self.castling_fen(), ep, self.halfmove, self.fullmove)
+
+    def castling_fen(self):
+
+        rights = ''
+        for rook in sorted(self.castling, key=lambda x: (x // 8, -(x % 8))):
+
+            colour = 'w' if rook < 8 else 'b'
+            king   = self.king_square(colour)
+            side   = 'K' if rook % 8 > king % 8 else 'Q'
+
+            # Use K and Q when unambiguous, as in X-FEN, otherwise the Rook's file
+            outer = range(rook % 8 + 1, 8) if side == 'K' else range(0, rook % 8)
+            piece = self.squares[rook]
+            char  = side if all(self.squares[square(f, rook // 8)] != piece for f in outer) else 'ABCDEFGH'[rook % 8]
+            rights += char if colour == 'w' else char.lower()
+
+        return rights or '-'
+
+    def key(self):
+
+        # Identifies a position for the purposes of repetition
+        ep = self.ep if self.ep is not None and self.ep_capturable() else None
+        return (''.join(self.squares), self.turn, tuple(sorted(self.castling)), ep)
+
+    def ep_capturable(self):
+        return any(move[1] == self.ep and self.squares[move[0]].upper() == 'P' for move in self.legal_moves())
+
+    ## Move generation
+
+    def attacked(self, sq, by):
+
+        file, rank = sq % 8, sq // 8
+
+        def piece_at(df, dr):
+            f, r = file + df, rank + dr
+            return self.squares[square(f, r)] if 0 <= f < 8 and 0 <= r < 8 else None
+
+        pawn, knight, bishop, rook, queen, king = 'PNBRQK' if by == 'w' else 'pnbrqk'
+
+        # White Pawns attack upwards, so they are found below the square
+        forward = -1 if by == 'w' else 1
+        if piece_at(-1, forward) == pawn or piece_at(1, forward) == pawn:
+            return True
+
+        if any(piece_at(df, dr) == knight for df, dr in KNIGHT_STEPS):
+            return True
+
+        if any(piece_at(df, dr) == king for df, dr in KING_STEPS):
+            return True
+
+        for rays, sliders in [(BISHOP_RAYS, (bishop, queen)), (ROOK_RAYS, (rook, queen))]:
+            for df, dr in rays:
+                f, r = file + df, rank + dr
+                while 0 <= f < 8 and 0 <= r < 8:
+                    piece = self.squares[square(f, r)]
+                    if piece != '.':
+                        if piece in sliders:
+                            return True
+                        break
+                    f, r = f + df, r + dr
+
+        return False
+
+    def in_check(self, colour=None):
+        colour = colour or self.turn
+        king   = self.king_square(colour)
+        return king is not None and self.attacked(king, 'b' if colour == 'w' else 'w')
+
+    def pseudo_legal_moves(self):
+
+        moves, us = [], self.turn
+
+        for sq in range(64):
+
+            piece = self.squares[sq]
+            if piece == '.' or colour_of(piece) != us:
+                continue
+
+            file, rank, kind = sq % 8, sq // 8, piece.upper()
+
+            if kind == 'P':
+                moves.extend(self.pawn_moves(sq))
+
+            elif kind in 'NK':
+                for df, dr in KNIGHT_STEPS if kind == 'N' else KING_STEPS:
+                    f, r = file + df, rank + dr
+                    if 0 <= f < 8 and 0 <= r < 8:
+                        target = self.squares[square(f, r)]
+                        if target == '.' or colour_of(target) != us:
+                            moves.append((sq, square(f, r), None))
+
+            else:
+                rays = { 'B' : BISHOP_RAYS, 'R' : ROOK_RAYS, 'Q' : BISHOP_RAYS + ROOK_RAYS }[kind]
+                for df, dr in rays:
+                    f, r = file + df, rank + dr
+                    while 0 <= f < 8 and 0 <= r < 8:
+                        target = self.squares[square(f, r)]
+                        if target == '.' or colour_of(target) != us:
+                            moves.append((sq, square(f, r), None))
+                        if target != '.':
+                            break
+                        f, r = f + df, r + dr
+
+        return moves + self.castling_moves()
+
+    def pawn_moves(self, sq):
+
+        moves, us   = [], self.turn
+        file, rank  = sq % 8, sq // 8
+        forward     = 1 if us == 'w' else -1
+        start, last = (1, 7) if us == 'w' else (6, 0)
+
+        def add(to):
+            if to // 8 == last:
+                moves.extend((sq, to, promo) for promo in 'qrbn')
+            else:
+                moves.append((sq, to, None))
+
+        one = square(file, rank + forward)
+        if self.squares[one] == '.':
+            add(one)
+            two = square(file, rank + 2 * forward)
+            if rank == start and self.squares[two] == '.':
+                moves.append((sq, two, None))
+
+        for df in (-1, 1):
+            if 0 <= file + df < 8:
+                to     = square(file + df, rank + forward)
+                target = self.squares[to]
+                if (target != '.' and colour_of(target) != us) or to == self.ep:
+                    add(to)
+
+        return moves
+
+    def castling_moves(self):
+
+        moves, us = [], self.turn
+        king      = self.king_square(us)
+        them      = 'b' if us == 'w' else 'w'
+
+        for rook in self.castling:
+
+            if (rook < 8) != (us == 'w') or king is None or self.in_check():
+                continue
+
+            rank       = rook // 8
+            king_to    = square(6 if rook > king else 2, rank)
+            rook_to    = square(5 if rook > king else 3, rank)
+            lo, hi     = min(king, rook, king_to, rook_to), max(king, rook, king_to, rook_to)
+
+            # Every square involved must be empty, besides the King and Rook themselves
+            if any(self.squares[x] != '.' for x in range(lo, hi + 1) if x not in (king, rook)):
+                continue
+
+            # The King may not pass through, nor land on, an attacked square
+            step = 1 if king_to >= king else -1
+            if any(self.attacked(x, them) for x in range(king, king_to + step, step)):
+                continue
+
+            moves.append((king, rook, None))
+
+        return moves
+
+    def legal_moves(self):
+
+        # Referees ask for these several times per ply, so keep them until the next push
+        if self.legal is not None:
+            return self.legal
+
+        self.legal = []
+        for move in self.pseudo_legal_moves():
+            board = self.copy()
+            board.push(move)
+            if not board.in_check(self.turn):
+                self.legal.append(move)
+
+        return self.legal
+
+    def is_castling(self, move):
+        piece = self.squares[move[0]]
+        return piece.upper() == 'K' and self.squares[move[1]] == ('R' if piece == 'K' else 'r')
+
+    def push(self, move):
+
+        self.legal       = None
+        start, to, promo = move
+        piece, captured  = self.squares[start], self.squares[to]
+        us               = self.turn
+        castle           = self.is_castling(move)
+
+        self.squares[start] = '.'
+
+        if castle:
+            rank = start // 8
+            self.squares[to] = '.'
+            self.squares[square(6 if to > start else 2, rank)] = piece
+            self.squares[square(5 if to > start else 3, rank)] = 'R' if us == 'w' else 'r'
+            captured = '.'
+
+        else:
+            # En passant removes the Pawn that is beside us
+            if piece.upper() == 'P' and to == self.ep:
+                self.squares[square(to % 8, start // 8)] = '.'
+                captured = 'p' if us == 'w' else 'P'
+
+            self.squares[to] = (promo.upper() if us == 'w' else promo) if promo else piece
+
+        # Kings moving lose all rights, Rooks moving or being captured lose their own
+        if piece.upper() == 'K':
+            self.castling = [x for x in self.castling if (x < 8) != (us == 'w')]
+        self.castling = [x for x in self.castling if x not in (start, to)]
+
+        double   = piece.upper() == 'P' and abs(to - start) == 16
+        self.ep  = (start + to) // 2 if double else None
+
+        self.halfmove = 0 if piece.upper() == 'P' or captured != '.' else self.halfmove + 1
+        self.fullmove = self.fullmove + (us == 'b')
+        self.turn     = 'b' if us == 'w' else 'w'
+
+    ## Notation
+
+    def uci(self, move):
+
+        start, to, promo = move
+
+        # Engines not in UCI_Chess960 mode expect the King's destination instead
+        if self.is_castling(move) and not self.chess960:
+            to = square(6 if to > start else 2, start // 8)
+
+        return square_name(start) + square_name(to) + (promo or '')
+
+    def parse_uci(self, text):
+
+        # Returns None for anything that is not a legal move
+        for move in self.legal_moves():
+            if self.uci(move) == text.strip():
+                return move
+
+        return None
+
+    def san(self, move):
+
+        start, to, promo = move
+        piece = self.squares[start].upper()
+
+        if self.is_castling(move):
+            text = 'O-O' if to > start else 'O-O-O'
+
+        else:
+            capture = self.squares[to] != '.' or (piece == 'P' and to == self.ep)
+
+            if piece == 'P':
+                text  = square_name(start)[0] + 'x' if capture else ''
+                text += square_name(to) + ('=' + promo.upper() if promo else '')
+
+            else:
+                # Disambiguate by file, then by rank, then by both
+                others = [m[0] for m in self.legal_moves() if m[1] == to and m[0] != start
+                          and self.squares[m[0]].upper() == piece and not self.is_castling(m)]
+                name   = square_name(start)
+                prefix = ''
+
+                if others and all(x % 8 != start % 8 for x in others):
+                    prefix = name[0]
+                elif others and all(x // 8 != start // 8 for x in others):
+                    prefix = name[1]
+                elif others:
+                    prefix = name
+
+                text = piece + prefix + ('x' if capture else '') + square_name(to)
+
+        board = self.copy()
+        board.push(move)
+
+        if board.in_check():
+            text += '#' if not board.legal_moves() else '+'
+
+        return text
+
+    def parse_san(self, text):
+
+        # Compare against every legal move, ignoring annotations
+        text = text.rstrip('+#!?').replace('0', 'O')
+        for move in self.legal_moves():
+            if self.san(move).rstrip('+#') == text:
+                return move
+
+        return None
+
+    ## Game termination
+
+    def insufficient_material(self):
+
+        pieces = [(sq, x) for sq, x in enumerate(self.squares) if x not in '.Kk']
+
+        if not pieces:
+            return True
+
+        # A lone minor piece can never force mate
+        if len(pieces) == 1 and pieces[0][1].upper() in 'NB':
+            return True
+
+        # Nor can any number of Bishops, all on the same colour of square
+        if all(x.upper() == 'B' for sq, x in pieces):
+            return len(set((sq % 8 + sq // 8) % 2 for sq, x in pieces)) == 1
+
+        return False
+
+    def outcome(self):
+
+        # Returns (Result, Reason), or None if the game is not over
+        winner = 'Black' if self.turn == 'w' else 'White'
+
+        if not self.legal_moves():
+            if self.in_check():
+                return ('0-1' if self.turn == 'w' else '1-0', '%s mates' % (winner))
+            return ('1/2-1/2', 'Draw by stalemate')
+
+        if self.insufficient_material():
+            return ('1/2-1/2', 'Draw by insufficient mating material')
+
+        if self.halfmove >= 100:
+            return ('1/2-1/2', 'Draw by fifty moves rule')
+
+        return None
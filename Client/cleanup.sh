@@ -3,6 +3,8 @@ rm -rf Books/
 rm -rf Engines/
 rm -rf PGNS/
 rm -rf Networks/
+rm -rf Cache/
+rm -rf Sources/
 rm -rf __pycache__/
 
 rm machine.txt
\ No newline at end of file
@@ -0,0 +1,340 @@
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                           #
+#   OpenBench is a chess engine testing framework by Andrew Grant.          #
+#   <https://github.com/AndyGrant/OpenBench>  <andrew@grantnet.us>          #
+#                                                                           #
+#   OpenBench is free software: you can redistribute it and/or modify       #
+#   it under the terms of the GNU General Public License as published by    #
+#   the Free Software Foundation, either version 3 of the License, or       #
+#   (at your option) any later version.                                     #
+#                                                                           #
+#   OpenBench is distributed in the hope that it will be useful,            #
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+#   GNU General Public License for more details.                            #
+#                                                                           #
+#   You should have received a copy of the GNU General Public License       #
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+#                                                                           #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# The purpose of this module is to store games as compact binary records, kept
+# alongside the stripped PGNs, so that statistics over many games need not be
+# regex scanned out of the PGN text.
+#
+#   - A records file is a sequence of blocks. Workers upload one block with each
+#     chunk of PGN, compressed with the same codec, and the Server concatenates
+#     them, so any number of blocks may follow one another in a file.
+#
+#   - Each block starts with a fixed 32 byte header, and is followed by a set of
+#     fixed-width, little-endian arrays: the bounds of each game's plies, the
+#     results, and per ply the move, eval, depth, seldepth, time, and nodes. A
+#     table of each game's PGN headers follows last. Each array is aligned to 8
+#     bytes, so that an uncompressed file may be memory mapped with NumPy.
+#
+#   - Moves are SAN packed into 32 bits, which is lossless, and requires neither
+#     move generation to encode on the Worker, nor to export back to PGN.
+#
+#   - Evals are in centipawns, with mates and the book and unknown comments that
+#     the PGN stripping produces given their own values. Exporting to PGN writes
+#     evals in the format that Cutechess uses. Evals in any other format, or out
+#     of range, are stored as unknown, rather than exported altered.
+
+import collections
+import functools
+import io
+import re
+import struct
+
+## Local imports must only use "import x", never "from x import ..."
+
+import pgn_util
+
+## NumPy is optional, and only needed to memory map records for offline statistics
+
+try: import numpy
+except ImportError: numpy = None
+
+RECORDS_MAGIC   = b'OBGR'
+RECORDS_VERSION = 1
+
+# Magic, Version, Games, Plies, Header table bytes, Test ID, Result ID
+BLOCK_HEADER = struct.Struct('<4sIIIQII')
+
+## Arrays following each block header, in order: (Name, Struct format, NumPy dtype, Length).
+## Lengths are per game, per game plus one for the bounds, per ply, or per header table byte
+
+RECORD_SECTIONS = [
+    ('ply_offsets'   , 'Q', '<u8', 'bounds'),
+    ('results'       , 'b', 'i1' , 'games' ),
+    ('header_offsets', 'Q', '<u8', 'bounds'),
+    ('moves'         , 'I', '<u4', 'plies' ),
+    ('evals'         , 'h', '<i2', 'plies' ),
+    ('depths'        , 'H', '<u2', 'plies' ),
+    ('seldepths'     , 'H', '<u2', 'plies' ),
+    ('times'         , 'I', '<u4', 'plies' ),
+    ('nodes'         , 'Q', '<u8', 'plies' ),
+    ('headers'       , 'B', 'u1' , 'bytes' ),
+]
+
+RecordBlock = collections.namedtuple('RecordBlock',
+    ['test_id', 'result_id', 'games', 'plies'] + [name for name, *_ in RECORD_SECTIONS])
+
+EVAL_MAX     =  30000 # Centipawn evals beyond this are stored as unknown
+EVAL_MATE    =  32000 # Mate in N is stored as EVAL_MATE - N, with the sign of the eval
+EVAL_BOOK    = -32768 # {book}
+EVAL_UNKNOWN = -32767 # {unknown}, for moves without a parsable comment, or eval
+PATTERN_EVAL = re.compile(r'^([+-])(?:M(\d+)|(\d+\.\d\d))$')
+
+RESULT_CODES = { '1-0' : 1, '0-1' : -1, '1/2-1/2' : 0, '*' : 2 }
+RESULT_TEXTS = { code : text for text, code in RESULT_CODES.items() }
+
+## Packed moves: bits 0-5 are the destination, 6-8 the piece, or 6 and 7 for O-O and O-O-O,
+## 9-12 and 13-16 the disambiguating file and rank plus one, 17 a capture, 18-20 a promotion,
+## and 21-22 whether the move gives check or mate
+
+SAN_PIECES   = 'PNBRQK'
+SAN_CASTLES  = ['O-O', 'O-O-O']
+SAN_PROMOS   = ' NBRQ'
+SAN_CHECKS   = ' +#'
+PATTERN_SAN  = re.compile(r'^(?:(O-O-O|O-O)|([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=([NBRQ]))?)([+#])?$')
+
+@functools.lru_cache(maxsize=None)
+def pack_san(san):
+
+    if not (match := PATTERN_SAN.match(san)):
+        raise ValueError('Unable to pack move %s' % (san))
+
+    castle, piece, file, rank, capture, to, promo, check = match.groups()
+
+    if castle:
+        return (SAN_CASTLES.index(castle) + 6) << 6 | SAN_CHECKS.index(check or ' ') << 21
+
+    return ('abcdefgh'.index(to[0]) + 8 * '12345678'.index(to[1])
+        | SAN_PIECES.index(piece or 'P') << 6
+        | ('abcdefgh'.index(file) + 1 if file else 0) << 9
+        | ('12345678'.index(rank) + 1 if rank else 0) << 13
+        | bool(capture) << 17
+        | SAN_PROMOS.index(promo or ' ') << 18
+        | SAN_CHECKS.index(check or ' ') << 21)
+
+@functools.lru_cache(maxsize=None)
+def unpack_san(value):
+
+    value = int(value) # NumPy integers are not hashable in the same way
+    to, piece, check = value & 63, value >> 6 & 7, SAN_CHECKS[value >> 21 & 3].strip()
+
+    if piece >= 6:
+        return SAN_CASTLES[piece - 6] + check
+
+    file, rank, promo = value >> 9 & 15, value >> 13 & 15, SAN_PROMOS[value >> 18 & 7].strip()
+
+    return ''.join([
+        SAN_PIECES[piece].replace('P', ''),
+        'abcdefgh'[file - 1] if file else '',
+        '12345678'[rank - 1] if rank else '',
+        'x' if value >> 17 & 1 else '',
+        'abcdefgh'[to % 8] + '12345678'[to // 8],
+        '=' + promo if promo else '',
+        check,
+    ])
+
+def pack_eval(score):
+
+    if score == 'book':
+        return EVAL_BOOK
+
+    if score == '0.00':
+        return 0
+
+    # Anything which would not export exactly as it was written is stored as unknown
+    if not (match := PATTERN_EVAL.match(score)):
+        return EVAL_UNKNOWN
+
+    sign = -1 if match.group(1) == '-' else 1
+
+    if match.group(2):
+        mate = int(match.group(2))
+        return sign * (EVAL_MATE - mate) if mate < EVAL_MATE - EVAL_MAX else EVAL_UNKNOWN
+
+    value = round(float(match.group(3)) * 100)
+    return sign * value if 0 < value <= EVAL_MAX else EVAL_UNKNOWN
+
+def unpack_eval(value):
+
+    if value == EVAL_BOOK:
+        return 'book'
+
+    if value == EVAL_UNKNOWN:
+        return 'unknown'
+
+    if abs(value) > EVAL_MAX:
+        return '%sM%d' % ('-' if value < 0 else '+', EVAL_MATE - abs(value))
+
+    # Cutechess does not sign an even score
+    return '%+.2f' % (value / 100) if value else '0.00'
+
+def pack_comment(comment):
+
+    # Either book, nothing at all, or Score Depth/SelDepth Time Nodes
+    if not comment:
+        return EVAL_UNKNOWN, 0, 0, 0, 0
+
+    if comment == 'book':
+        return EVAL_BOOK, 0, 0, 0, 0
+
+    score, depths, time, nodes = comment.split()
+    depth, seldepth = depths.split('/')
+
+    # Exported as just {unknown}, so nothing else is kept either
+    if (evaluation := pack_eval(score)) == EVAL_UNKNOWN:
+        return EVAL_UNKNOWN, 0, 0, 0, 0
+
+    return evaluation, min(int(depth), 65535), min(int(seldepth), 65535), min(int(time), 2 ** 32 - 1), int(nodes)
+
+def unpack_comment(evaluation, depth, seldepth, time, nodes):
+
+    if evaluation in (EVAL_BOOK, EVAL_UNKNOWN):
+        return unpack_eval(evaluation)
+
+    return '%s %d/%d %d %d' % (unpack_eval(evaluation), depth, seldepth, time, nodes)
+
+def encode_games(games, scale_factor, compact, test_id=0, result_id=0):
+
+    # Games have the same headers and comments as their stripped PGN would
+    ply_regex = pgn_util.PATTERN_PLY_COMPACT if compact else pgn_util.PATTERN_PLY_VERBOSE
+    arrays    = { name : [] for name, *_ in RECORD_SECTIONS }
+    headers   = bytearray()
+    skipped   = 0
+
+    arrays['ply_offsets'   ].append(0)
+    arrays['header_offsets'].append(0)
+
+    for header_dict, move_text in games:
+
+        header_dict['ScaleFactor'] = str(scale_factor)
+        header_items = pgn_util.pgn_stripped_header_items(header_dict, compact)
+
+        try: # Games with moves that cannot be packed are left to the PGN alone
+            plies  = [(pack_san(move), pack_comment(comment)) for move, comment, *_ in ply_regex.findall(move_text)]
+            result = RESULT_CODES[pgn_util.PATTERN_GAME_RESULT.search(move_text).group(1)]
+        except (ValueError, AttributeError):
+            skipped += 1
+            continue
+
+        for move, (evaluation, depth, seldepth, time, nodes) in plies:
+            arrays['moves'    ].append(move)
+            arrays['evals'    ].append(evaluation)
+            arrays['depths'   ].append(depth)
+            arrays['seldepths'].append(seldepth)
+            arrays['times'    ].append(time)
+            arrays['nodes'    ].append(nodes)
+
+        headers += ''.join('%s\t%s\n' % (f, v) for f, v in header_items).encode('utf-8')
+        arrays['results'       ].append(result)
+        arrays['ply_offsets'   ].append(len(arrays['moves']))
+        arrays['header_offsets'].append(len(headers))
+
+    if skipped:
+        print ('[Note] Unable to encode %d games as records' % (skipped))
+
+    games, plies = len(arrays['results']), len(arrays['moves'])
+    block = [BLOCK_HEADER.pack(RECORDS_MAGIC, RECORDS_VERSION, games, plies, len(headers), test_id, result_id)]
+
+    for name, fmt, dtype, length in RECORD_SECTIONS:
+        data = bytes(headers) if name == 'headers' else struct.pack('<%d%s' % (len(arrays[name]), fmt), *arrays[name])
+        block.append(data + b'\0' * (-len(data) % 8))
+
+    return b''.join(block)
+
+def encode_pgn_texts(texts, scale_factor, compact, test_id=0, result_id=0):
+
+    # One block for every game in each of the texts
+    games = (game for text in texts for game in pgn_util.pgn_stream_iterator(io.StringIO(text, newline=None)))
+    return encode_games(games, scale_factor, compact, test_id, result_id)
+
+def compress_pgn_texts(texts, scale_factor, compact, test_id=0, result_id=0, codec=pgn_util.PGN_CODEC_DEFAULT):
+    compressor = pgn_util.pgn_compressor(codec)
+    encoded    = encode_pgn_texts(texts, scale_factor, compact, test_id, result_id)
+    return compressor.compress(encoded) + compressor.flush()
+
+def iter_block_layouts(data):
+
+    # Yields the header of each block, and the (offset, length) of each of its arrays
+    offset = 0
+
+    while offset < len(data):
+
+        magic, version, games, plies, header_bytes, test_id, result_id = BLOCK_HEADER.unpack_from(data, offset)
+
+        if magic != RECORDS_MAGIC or version != RECORDS_VERSION:
+            raise ValueError('Unknown records block at offset %d' % (offset))
+
+        lengths = { 'bounds' : games + 1, 'games' : games, 'plies' : plies, 'bytes' : header_bytes }
+        offset += BLOCK_HEADER.size
+        layout  = {}
+
+        for name, fmt, dtype, length in RECORD_SECTIONS:
+            layout[name] = (offset, lengths[length])
+            size    = lengths[length] * struct.calcsize(fmt)
+            offset += size + (-size % 8)
+
+        yield (test_id, result_id, games, plies), layout
+
+def iter_record_blocks(data):
+
+    # Decodes each block of a records file, without needing NumPy
+    for fields, layout in iter_block_layouts(data):
+
+        arrays = {
+            name : struct.unpack_from('<%d%s' % (layout[name][1], fmt), data, layout[name][0])
+                for name, fmt, dtype, length in RECORD_SECTIONS if name != 'headers'
+        }
+
+        start, length = layout['headers']
+        yield RecordBlock(*fields, **arrays, headers=bytes(data[start:start+length]))
+
+def load_records(path):
+
+    # Views of each block's arrays, over a read-only memory map of an uncompressed file
+    if numpy is None:
+        raise RuntimeError('NumPy is needed to memory map game records')
+
+    mapped = numpy.memmap(path, dtype='u1', mode='r')
+
+    return [
+        RecordBlock(*fields, **{
+            name : numpy.frombuffer(mapped, dtype=dtype, count=layout[name][1], offset=layout[name][0])
+                for name, fmt, dtype, length in RECORD_SECTIONS
+        }) for fields, layout in iter_block_layouts(mapped)
+    ]
+
+def game_headers(block, index):
+
+    # PGN headers for one game, as a list of (Header, Value)
+    start, end = int(block.header_offsets[index]), int(block.header_offsets[index+1])
+    text       = bytes(block.headers[start:end]).decode('utf-8')
+    return [tuple(line.split('\t', 1)) for line in text.splitlines()]
+
+def export_game(block, index):
+
+    start, end = int(block.ply_offsets[index]), int(block.ply_offsets[index+1])
+
+    plies = ['%s {%s}' % (unpack_san(block.moves[x]), unpack_comment(
+        int(block.evals[x]), int(block.depths[x]), int(block.seldepths[x]), int(block.times[x]), int(block.nodes[x])))
+            for x in range(start, end)]
+
+    headers = '\n'.join('[%s "%s"]' % (f, v) for f, v in game_headers(block, index))
+    return '%s\n\n%s\n\n' % (headers, ' '.join(plies + [RESULT_TEXTS[int(block.results[index])]]))
+
+def export_pgn(data):
+
+    # Stripped PGN for every game of every block, with evals written as Cutechess would
+    return ''.join(export_game(block, x) for block in iter_record_blocks(data) for x in range(block.games))
+
+def iter_archive_records(tar):
+
+    # Yields (name, decompressed records) for each Workload in an OpenBench .records.tar
+    for name, content in pgn_util.iter_archive_members(tar):
+        if '.records.' in name:
+            yield name, content
@@ -0,0 +1,630 @@
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                           #
+#   OpenBench is a chess engine testing framework by Andrew Grant.          #
+#   <https://github.com/AndyGrant/OpenBench>  <andrew@grantnet.us>          #
+#                                                                           #
+#   OpenBench is free software: you can redistribute it and/or modify       #
+#   it under the terms of the GNU General Public License as published by    #
+#   the Free Software Foundation, either version 3 of the License, or       #
+#   (at your option) any later version.                                     #
+#                                                                           #
+#   OpenBench is distributed in the hope that it will be useful,            #
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+#   GNU General Public License for more details.                            #
+#                                                                           #
+#   You should have received a copy of the GNU General Public License       #
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+#                                                                           #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# The purpose of this module is to play games between two UCI engines, in place
+# of Cutechess, with one asyncio event loop driving every game of a Match.
+#
+#   - A Match plays games-per-cutechess games, with up to concurrency games in
+#     flight at once. Each concurrent slot keeps its own pair of engines, which
+#     are reused between games, and restarted if they crash or stall. Engines
+#     which cannot be restarted forfeit the game, as with Cutechess' -recover.
+#
+#   - play_match() runs a Match in a process of its own, so that the referees of
+#     each copy of the runner never compete for the same interpreter.
+#
+#   - Game N is played from opening (N-1) / 2, with the dev engine as White in
+#     odd games, mirroring Cutechess' -repeat. Without repeats, every game gets
+#     its own opening instead.
+#
+#   - Clocks follow Cutechess' conventions: increments are added after a move,
+#     moves-to-go controls are refilled, and a timemargin is allowed before the
+#     game is lost on time. Resign and draw adjudication use the same settings.
+#
+#   - Each finished game is handed to on_game(number, players, result, reason),
+#     with the result from White's point of view, and the reason worded as
+#     Cutechess would word it, so that results are accounted for identically.
+#     Games are also appended to a PGN, which matches Cutechess' format.
+#
+#   - Tablebase adjudication is not performed. Engines are still given Syzygy.
+
+import asyncio
+import random
+import re
+import subprocess
+import time
+
+## Local imports must only use "import x", never "from x import ..."
+
+import chessboard
+import topology
+
+STARTUP_TIMEOUT = 30      # Seconds for an engine to respond to uci and isready
+STALL_TIMEOUT   = 60      # Seconds for an untimed search before the engine has stalled
+STOP_TIMEOUT    = 5       # Seconds for an engine to respond to stop, after losing on time
+MATE_SCORE      = 100000  # Centipawns, beyond any adjudication threshold
+READ_LIMIT      = 1 << 20 # Longest line of engine output, as info lines may carry a long PV
+
+class TimeControl(object):
+
+    ## Parses the strings produced by worker.py's scale_time_control(), which are the
+    ## Cutechess forms: tc=inf nodes=N, tc=inf depth=D, st=X, and tc=[M/]B[+I]
+
+    def __init__(self, text):
+
+        fields = dict(x.split('=', 1) for x in text.split() if '=' in x)
+
+        self.nodes    = int(fields['nodes']) if 'nodes' in fields else None
+        self.depth    = int(fields['depth']) if 'depth' in fields else None
+        self.movetime = int(float(fields['st']) * 1000) if 'st' in fields else None
+        self.margin   = int(fields.get('timemargin', 0))
+        self.moves    = None
+        self.base     = None
+        self.inc      = 0
+
+        if (tc := fields.get('tc', 'inf')) != 'inf':
+            match      = re.match(r'(?:(\d+)/)?([\d.]+)(?:\+([\d.]+))?', tc)
+            self.moves = int(match.group(1)) if match.group(1) else None
+            self.base  = int(float(match.group(2)) * 1000)
+            self.inc   = int(float(match.group(3) or 0) * 1000)
+
+    def timed(self):
+        return self.base is not None or self.movetime is not None
+
+    def pgn_string(self):
+
+        if self.movetime is not None:
+            return '%g/move' % (self.movetime / 1000)
+
+        if self.base is None:
+            return 'inf'
+
+        control = '%g+%g' % (self.base / 1000, self.inc / 1000)
+        return '%d/%s' % (self.moves, control) if self.moves else control
+
+class EngineSpec(object):
+
+    def __init__(self, name, path, cwd, options, time_control):
+        self.name         = name
+        self.path         = path
+        self.cwd          = cwd
+        self.options      = options      # List of (Name, Value) for setoption
+        self.time_control = time_control # TimeControl
+
+class UCIEngine(object):
+
+    def __init__(self, spec, chess960, cpus):
+        self.spec     = spec
+        self.chess960 = chess960
+        self.cpus     = cpus
+        self.process  = None
+
+    async def start(self):
+
+        self.process = await asyncio.create_subprocess_exec(
+            self.spec.path, cwd=self.spec.cwd,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, limit=READ_LIMIT)
+
+        topology.apply_affinity(self.process.pid, self.cpus)
+
+        self.send('uci')
+        await self.wait_for('uciok', STARTUP_TIMEOUT)
+
+        for name, value in self.spec.options:
+            self.send('setoption name %s value %s' % (name, value))
+
+        if self.chess960:
+            self.send('setoption name UCI_Chess960 value true')
+
+        await self.ready()
+
+    def alive(self):
+        return self.process is not None and self.process.returncode is None
+
+    def send(self, line):
+
+        try:
+            self.process.stdin.write((line + '\n').encode())
+        except (BrokenPipeError, ConnectionResetError):
+            pass # Discovered when reading, as a disconnect
+
+    async def readline(self, timeout):
+
+        line = await asyncio.wait_for(self.process.stdout.readline(), timeout)
+
+        if not line:
+            raise EOFError()
+
+        return line.decode('utf-8', errors='replace').strip()
+
+    async def wait_for(self, token, timeout):
+
+        deadline = time.monotonic() + timeout
+        while await self.readline(max(0, deadline - time.monotonic())) != token:
+            pass
+
+    async def ready(self):
+        self.send('isready')
+        await self.wait_for('readyok', STARTUP_TIMEOUT)
+
+    async def new_game(self):
+        self.send('ucinewgame')
+        await self.ready()
+
+    async def search(self, position, go, timeout):
+
+        # Returns the bestmove, the last info line that had a score, and the time taken
+        self.send(position)
+        self.send(go)
+
+        start, info = time.monotonic(), ''
+        deadline    = start + timeout
+
+        while True:
+
+            line = await self.readline(max(0, deadline - time.monotonic()))
+
+            # Only the bestmove is timed, so parsing is left until after it arrives
+            if line.startswith('bestmove'):
+                elapsed, parts = time.monotonic() - start, line.split()
+                return (parts[1] if len(parts) > 1 else ''), parse_info(info), elapsed
+
+            if line.startswith('info') and ' score ' in line:
+                info = line
+
+    async def stop(self):
+
+        # Give the engine one last chance to produce a move, after it ran out of time
+        self.send('stop')
+
+        try:
+            deadline = time.monotonic() + STOP_TIMEOUT
+            while not (await self.readline(max(0, deadline - time.monotonic()))).startswith('bestmove'):
+                pass
+            return True
+
+        except (asyncio.TimeoutError, EOFError):
+            return False
+
+    async def quit(self):
+
+        if not self.alive():
+            return
+
+        self.send('quit')
+
+        try: await asyncio.wait_for(self.process.wait(), 1)
+        except asyncio.TimeoutError: await self.kill()
+
+    async def kill(self):
+
+        if self.process is None:
+            return
+
+        try: self.process.kill()
+        except ProcessLookupError: pass
+
+        # Reap the process, so that alive() sees that it has gone
+        await self.process.wait()
+
+def parse_info(line):
+
+    tokens, info = line.split(), {}
+
+    # Malformed values are ignored, just as a missing info line would be
+    try:
+        for key in ['depth', 'seldepth', 'nodes', 'time']:
+            if key in tokens and tokens.index(key) + 1 < len(tokens):
+                info[key] = int(tokens[tokens.index(key) + 1])
+
+        if 'cp' in tokens:
+            info['cp'] = int(tokens[tokens.index('cp') + 1])
+
+        elif 'mate' in tokens:
+            info['mate'] = int(tokens[tokens.index('mate') + 1])
+
+    except (ValueError, IndexError):
+        return {}
+
+    return info
+
+def info_score(info):
+
+    # Centipawns, with mates pushed far beyond any adjudication threshold
+    if 'mate' in info:
+        return MATE_SCORE if info['mate'] > 0 else -MATE_SCORE
+
+    return info.get('cp')
+
+def info_comment(info, elapsed):
+
+    # Cutechess' verbose format: <Score> <Depth>/<SelDepth> <Time> <Nodes>
+    if 'mate' in info:
+        plies = 2 * info['mate'] - 1 if info['mate'] > 0 else -2 * info['mate']
+        score = '%sM%d' % ('+' if info['mate'] > 0 else '-', plies)
+
+    elif 'cp' in info:
+        score = '%+.2f' % (info['cp'] / 100)
+
+    else:
+        score = '+0.00'
+
+    depth = info.get('depth', 0)
+    return '%s %d/%d %d %d' % (score, depth, info.get('seldepth', depth), elapsed * 1000, info.get('nodes', 0))
+
+def parse_adjudication(text):
+
+    # Cutechess style: key=value pairs, or 'None' when disabled
+    if not text or text == 'None':
+        return None
+
+    return dict(x.split('=', 1) for x in text.split() if '=' in x)
+
+class OpeningBook(object):
+
+    ## Reads EPD or PGN books, and selects openings just like Cutechess' -openings, using
+    ## order=sequential, or order=random with a seeded permutation, starting at start
+
+    def __init__(self, path, fmt, order, start, seed, chess960):
+
+        with open(path) as fin:
+            text = fin.read()
+
+        if fmt == 'pgn':
+            self.entries = [x for x in re.split(r'\n\s*\n(?=\[)', text) if x.strip()]
+        else:
+            self.entries = [x for x in text.splitlines() if x.strip()]
+
+        self.fmt      = fmt
+        self.start    = start - 1
+        self.chess960 = chess960
+
+        # An affine permutation, seeded, avoids shuffling a very large book
+        count = len(self.entries)
+        rng   = random.Random(seed)
+        self.scale, self.shift = 1, 0
+
+        if order == 'random' and count > 1:
+            self.scale = rng.randrange(1, count)
+            while gcd(self.scale, count) != 1:
+                self.scale = rng.randrange(1, count)
+            self.shift = rng.randrange(count)
+
+    def opening(self, index):
+
+        # Returns the starting Board, and the book moves played from it
+        count = len(self.entries)
+        entry = self.entries[(self.scale * (self.start + index) + self.shift) % count]
+
+        if self.fmt != 'pgn':
+            fields = entry.split(';')[0].split()
+            return chessboard.Board.from_fen(' '.join(fields[:4]) + ' 0 1', self.chess960), []
+
+        headers = dict(re.findall(r'\[(\w+)\s+"([^"]*)"\]', entry))
+        board   = chessboard.Board.from_fen(headers.get('FEN', chessboard.STARTPOS), self.chess960)
+        start   = board.copy()
+
+        # Drop comments, variations, move numbers, and the result
+        movetext = re.sub(r'\[[^\]]*\]|\{[^}]*\}|\([^)]*\)|\$\d+', ' ', entry)
+        moves    = []
+
+        for token in movetext.split():
+
+            token = re.sub(r'^\d+\.+', '', token)
+            if not token or token in ['1-0', '0-1', '1/2-1/2', '*']:
+                continue
+
+            if not (move := board.parse_san(token)):
+                break
+
+            moves.append(move)
+            board.push(move)
+
+        return start, moves
+
+def gcd(a, b):
+
+    while b:
+        a, b = b, a % b
+
+    return a
+
+class Match(object):
+
+    def __init__(self, engines, games, concurrency, book, repeat, chess960,
+                 win_adj, draw_adj, pgn_path, on_game, abort_flag, cpus=None):
+
+        self.engines     = engines     # { 'dev' : EngineSpec, 'base' : EngineSpec }
+        self.games       = games
+        self.concurrency = concurrency
+        self.book        = book        # OpeningBook
+        self.repeat      = repeat
+        self.chess960    = chess960
+        self.win_adj     = parse_adjudication(win_adj)
+        self.draw_adj    = parse_adjudication(draw_adj)
+        self.pgn_path    = pgn_path
+        self.on_game     = on_game
+        self.abort_flag  = abort_flag
+        self.cpus        = cpus
+        self.next_game   = 1
+
+    def play(self):
+
+        # Each Match owns its own event loop, and so its own thread
+        asyncio.run(self.run())
+
+    async def run(self):
+        await asyncio.gather(*[self.slot() for x in range(min(self.concurrency, self.games))])
+
+    async def slot(self):
+
+        engines = {}
+
+        try:
+            while self.next_game <= self.games and not self.abort_flag.is_set():
+
+                number, self.next_game = self.next_game, self.next_game + 1
+                await self.play_game(engines, number)
+
+        finally:
+            for engine in engines.values():
+                await engine.quit()
+
+    async def prepare(self, engines, branch):
+
+        # Replace any engine that crashed or stalled in the previous game
+        if branch not in engines or not engines[branch].alive():
+            engines[branch] = UCIEngine(self.engines[branch], self.chess960, self.cpus)
+            await engines[branch].start()
+
+        await engines[branch].new_game()
+
+    async def play_game(self, engines, number):
+
+        opening = (number - 1) // 2 if self.repeat else number - 1
+        board, book_moves = self.book.opening(opening)
+
+        # Dev plays White in odd games, and Black in even games
+        white, black = ('dev', 'base') if number % 2 else ('base', 'dev')
+        players      = { 'w' : white, 'b' : black }
+        names        = { 'w' : self.engines[white].name, 'b' : self.engines[black].name }
+
+        start_fen    = board.fen()
+        started      = time.time()
+        record       = [] # (SAN, Comment), for the PGN
+        uci_moves    = []
+        positions    = {}
+        outcome      = None
+
+        for move in book_moves:
+            record.append((board.san(move), 'book'))
+            uci_moves.append(board.uci(move))
+            board.push(move)
+
+        clocks = {
+            colour : {
+                'time'  : self.engines[players[colour]].time_control.base,
+                'moves' : self.engines[players[colour]].time_control.moves,
+                'inc'   : self.engines[players[colour]].time_control.inc,
+            } for colour in 'wb'
+        }
+
+        adjudicator = Adjudicator(self.win_adj, self.draw_adj)
+
+        # Engines which fail to start, or to reset, forfeit the game and are replaced
+        for colour, name in [('w', 'White'), ('b', 'Black')]:
+            try:
+                await self.prepare(engines, players[colour])
+
+            except (asyncio.TimeoutError, EOFError, OSError):
+                if players[colour] in engines:
+                    await engines[players[colour]].kill()
+                outcome = ('0-1' if colour == 'w' else '1-0', '%s disconnects' % (name), 'abandoned')
+                break
+
+        while not outcome:
+
+            if self.abort_flag.is_set():
+                return
+
+            positions[board.key()] = positions.get(board.key(), 0) + 1
+
+            if positions[board.key()] >= 3:
+                outcome = ('1/2-1/2', 'Draw by 3-fold repetition', None)
+
+            elif (result := board.outcome()):
+                outcome = (*result, None)
+
+            else:
+                outcome = await self.play_move(
+                    engines[players[board.turn]], board, clocks, start_fen,
+                    uci_moves, record, names, adjudicator)
+
+        result, reason, termination = outcome
+        self.write_pgn(number, names, start_fen, record, result, termination, started)
+        self.on_game(number, '%s vs %s' % (names['w'], names['b']), result, reason)
+
+    async def play_move(self, engine, board, clocks, start_fen, uci_moves, record, names, adjudicator):
+
+        tc     = engine.spec.time_control
+        us     = board.turn
+        name   = 'White' if us == 'w' else 'Black'
+        winner = '0-1' if us == 'w' else '1-0'
+
+        position = 'position fen %s' % (start_fen)
+        if uci_moves:
+            position += ' moves ' + ' '.join(uci_moves)
+
+        if tc.nodes is not None:
+            go, timeout = 'go nodes %d' % (tc.nodes), STALL_TIMEOUT
+
+        elif tc.depth is not None:
+            go, timeout = 'go depth %d' % (tc.depth), STALL_TIMEOUT
+
+        elif tc.movetime is not None:
+            go, timeout = 'go movetime %d' % (tc.movetime), (tc.movetime + tc.margin) / 1000
+
+        else:
+            go = 'go wtime %d btime %d winc %d binc %d' % (
+                max(1, clocks['w']['time']), max(1, clocks['b']['time']), clocks['w']['inc'], clocks['b']['inc'])
+            if clocks[us]['moves']:
+                go += ' movestogo %d' % (clocks[us]['moves'])
+            timeout = (clocks[us]['time'] + tc.margin) / 1000
+
+        try:
+            text, info, elapsed = await engine.search(position, go, timeout)
+
+        except asyncio.TimeoutError:
+
+            if not tc.timed():
+                await engine.kill()
+                return (winner, "%s's connection stalls" % (name), 'stalled connection')
+
+            # Engines which ignore stop are replaced before the next game
+            if not await engine.stop():
+                await engine.kill()
+
+            return (winner, '%s loses on time' % (name), 'time forfeit')
+
+        except EOFError:
+            await engine.kill()
+            return (winner, '%s disconnects' % (name), 'abandoned')
+
+        if not (move := board.parse_uci(text)):
+            return (winner, '%s makes an illegal move: %s' % (name, text), 'illegal move')
+
+        # Update the clock, allowing it to dip into the margin
+        if tc.base is not None:
+            clocks[us]['time'] = max(0, clocks[us]['time'] - int(elapsed * 1000)) + tc.inc
+            if clocks[us]['moves']:
+                clocks[us]['moves'] -= 1
+                if not clocks[us]['moves']:
+                    clocks[us]['time' ] += tc.base
+                    clocks[us]['moves']  = tc.moves
+
+        record.append((board.san(move), info_comment(info, elapsed)))
+        uci_moves.append(board.uci(move))
+        board.push(move)
+
+        return adjudicator.update(us, info_score(info), board.fullmove)
+
+    def write_pgn(self, number, names, start_fen, record, result, termination, started):
+
+        finished = time.time()
+        board    = chessboard.Board.from_fen(start_fen, self.chess960)
+        duration = int(finished - started)
+
+        headers = [
+            ('Event'         , '?'),
+            ('Site'          , '?'),
+            ('Date'          , time.strftime('%Y.%m.%d', time.localtime(started))),
+            ('Round'         , str(number)),
+            ('White'         , names['w']),
+            ('Black'         , names['b']),
+            ('Result'        , result),
+            ('FEN'           , start_fen),
+            ('GameDuration'  , '%02d:%02d:%02d' % (duration // 3600, duration // 60 % 60, duration % 60)),
+            ('GameEndTime'   , pgn_timestamp(finished)),
+            ('GameStartTime' , pgn_timestamp(started)),
+            ('PlyCount'      , str(len(record))),
+            ('SetUp'         , '1'),
+            ('TimeControl'   , self.engines['dev'].time_control.pgn_string()),
+        ]
+
+        if self.chess960:
+            headers.append(('Variant', 'fischerandom'))
+
+        if termination:
+            headers.append(('Termination', termination))
+
+        # Move numbers are included before White's moves, and for Black's first move
+        words, number, turn = [], board.fullmove, board.turn
+        for ply, (san, comment) in enumerate(record):
+            prefix = '%d. ' % (number) if turn == 'w' else '%d... ' % (number) if ply == 0 else ''
+            words.append('%s%s {%s}' % (prefix, san, comment))
+            number, turn = number + (turn == 'b'), 'b' if turn == 'w' else 'w'
+
+        words.append(result)
+
+        # Cutechess-like line wrapping, keeping each move and its comment together
+        lines, line = [], ''
+        for word in words:
+            if line and len(line) + len(word) + 1 > 80:
+                lines.append(line)
+                line = ''
+            line = word if not line else line + ' ' + word
+        lines.append(line)
+
+        with open(self.pgn_path, 'a') as pgn:
+            pgn.write('\n'.join('[%s "%s"]' % x for x in headers))
+            pgn.write('\n\n' + '\n'.join(lines) + '\n\n')
+
+def play_match(settings, games, stop):
+
+    # Entry point for a Match in its own process. Finished games are passed back through
+    # the games Queue, followed by None once the Match is over. Aborts are signalled by
+    # the stop Event, and the OpeningBook is loaded here, rather than pickled
+    try:
+        settings = dict(settings, book=OpeningBook(*settings['book']))
+        Match(**settings, on_game=lambda *game: games.put(game), abort_flag=stop).play()
+
+    finally:
+        games.put(None)
+
+class Adjudicator(object):
+
+    ## Cutechess' -resign movecount=N score=S, where a side resigns after N consecutive
+    ## moves of its own at or below -S, and -draw movenumber=M movecount=N score=S, where
+    ## the game is drawn after N consecutive moves by both sides within S, past move M
+
+    def __init__(self, win_adj, draw_adj):
+        self.win_adj  = win_adj
+        self.draw_adj = draw_adj
+        self.resign   = { 'w' : 0, 'b' : 0 }
+        self.draws    = 0
+
+    def update(self, colour, score, fullmove):
+
+        if score is None:
+            self.resign[colour], self.draws = 0, 0
+            return None
+
+        if self.win_adj:
+
+            losing = score <= -int(self.win_adj.get('score', MATE_SCORE))
+            self.resign[colour] = self.resign[colour] + 1 if losing else 0
+
+            if self.resign[colour] >= int(self.win_adj.get('movecount', 1)):
+                winner = 'White' if colour == 'b' else 'Black'
+                return ('0-1' if colour == 'w' else '1-0', '%s wins by adjudication' % (winner), 'adjudication')
+
+        if self.draw_adj:
+
+            started = fullmove >= int(self.draw_adj.get('movenumber', 0))
+            drawish = abs(score) <= int(self.draw_adj.get('score', 0))
+            self.draws = self.draws + 1 if started and drawish else 0
+
+            if self.draws >= 2 * int(self.draw_adj.get('movecount', 1)):
+                return ('1/2-1/2', 'Draw by adjudication', 'adjudication')
+
+        return None
+
+def pgn_timestamp(when):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(when)) + '.%03d %s' % (
+        (when % 1) * 1000, time.strftime('%Z', time.localtime(when)))
@@ -19,32 +19,84 @@
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 import bz2
+import collections
+import io
+import lzma
+import multiprocessing
 import re
+import struct
 import sys
 import os
 
+from concurrent.futures import ProcessPoolExecutor
+
 ## Local imports must only use "import x", never "from x import ..."
 
+## zstd is optional, and is only negotiated when the zstandard package is installed
+
+try: import zstandard
+except ImportError: zstandard = None
+
 # For use externally
 REGEX_COMMENT_VERBOSE  = r'(book|[+-]?M?\d+(?:\.\d+)? \d+/\d+ \d+ \d+)'
 REGEX_COMMENT_COMPACT  = r'(book|[+-]?M?\d+(?:\.\d+)?) \d+/\d+ \d+ \d+'
 REGEX_MOVE_AND_COMMENT = r'\s*(?:\d+\. )?([a-zA-Z0-9+=#-]+) (?:\s*\{\s*([^}]*)\s*\})?'
 REGEX_GAME_RESULT      = r'\s*(1-0|0-1|1/2-1/2|\*)'
+REGEX_GAME_END         = rb'(?:1-0|0-1|1/2-1/2|\*)\r?\n\r?\n'
+REGEX_HEADER_VALUE     = r'"([^"]*)"'
+
+def ply_pattern(comment_regex):
+
+    # A move, and the first match of comment_regex within its comment, if there is one.
+    # Scanning within the comment, rather than calling search() on it, avoids a call per ply
+    return re.compile(r'\s*(?:\d+\. )?([a-zA-Z0-9+=#-]+) (?:\s*\{\s*(?:[^}]*?(%s)[^}]*|[^}]*)\s*\})?' % (comment_regex))
+
+# Compiled once, as they are applied to every game
+PATTERN_PLY_VERBOSE  = ply_pattern(REGEX_COMMENT_VERBOSE)
+PATTERN_PLY_COMPACT  = ply_pattern(REGEX_COMMENT_COMPACT)
+PATTERN_GAME_END     = re.compile(REGEX_GAME_END)
+PATTERN_HEADER_VALUE = re.compile(REGEX_HEADER_VALUE)
+
+# REGEX_GAME_RESULT finds the same result without its leading \s*, which slows the scan
+PATTERN_GAME_RESULT  = re.compile(r'(1-0|0-1|1/2-1/2|\*)')
+
+COMPRESSED_PGN_LIMIT = 64 * 1024 * 1024 # Games beyond this many compressed bytes are dropped
+PGN_BATCH_BYTES      =  8 * 1024 * 1024 # Uncompressed bytes of games per parallel stream
+
+## Codecs for PGN payloads. Each is identified by the magic bytes of its streams, which
+## may be concatenated, so payloads and archive members never need to be labelled
+
+PGNCodec = collections.namedtuple('PGNCodec', ['name', 'level', 'dictionary'])
+
+PGN_CODEC_SUFFIXES = { 'bz2' : 'bz2', 'xz' : 'xz', 'zstd' : 'zst' }
+PGN_CODEC_MAGICS   = { b'BZh' : 'bz2', b'\xfd7zXZ\x00' : 'xz', b'\x28\xb5\x2f\xfd' : 'zstd' }
+PGN_CODEC_DEFAULT  = PGNCodec('bz2', 9, None)
+
+ZSTD_DICT_MAGIC = b'\x37\xa4\x30\xec' # Starts trained dictionaries, followed by their 32-bit id
 
 def pgn_iterator(fname):
     with open(fname) as pgn:
-        while True:
-            headers   = pgn_header_list(iter(lambda: pgn.readline().rstrip(), ''))
-            move_list = ' '.join(iter(lambda: pgn.readline().rstrip(), ''))
-            if not headers or not move_list:
-                break
-            yield (headers, move_list)
+        yield from pgn_stream_iterator(pgn)
+
+def pgn_stream_iterator(pgn):
+    while True:
+        headers   = pgn_header_list(iter(lambda: pgn.readline().rstrip(), ''))
+        move_list = ' '.join(iter(lambda: pgn.readline().rstrip(), ''))
+        if not headers or not move_list:
+            break
+        yield (headers, move_list)
+
+def complete_games_length(data):
+
+    # Games are only complete once the blank line after the result has been written
+    ends = [match.end() for match in PATTERN_GAME_END.finditer(data)]
+    return ends[-1] if ends else 0
 
 def pgn_header_list(lines):
     # PGN Format: [<Header> "<Value>"]
-    return { f.split()[0][1:] : re.search(r'"([^"]*)"', f).group(1) for f in lines }
+    return { f.split()[0][1:] : PATTERN_HEADER_VALUE.search(f).group(1) for f in lines }
 
-def pgn_strip_headers(headers, compact):
+def pgn_stripped_header_items(headers, compact):
 
     # 7-Tag Roster that is required to be a legal PGN
     desired = [
@@ -64,47 +116,189 @@ def pgn_strip_headers(headers, compact):
     if not compact: # Useful to reconstruct time events
         desired += ['GameEndTime']
 
+    return [(f, headers[f]) for f in desired if f in headers]
+
+def pgn_strip_headers(headers, compact):
+
     # PGN Format: [<Header> "<Value>"]
-    return '\n'.join('[%s "%s"]' % (f, headers[f]) for f in desired if f in headers)
+    return '\n'.join('[%s "%s"]' % (f, v) for f, v in pgn_stripped_header_items(headers, compact))
 
 def pgn_strip_movelist(move_text, compact):
 
     # May parse book, otherwise Score for Compact, Score Depth/SelDepth Time Nodes for Verbose
-    comment_regex = re.compile(REGEX_COMMENT_COMPACT if compact else REGEX_COMMENT_VERBOSE)
+    ply_regex = PATTERN_PLY_COMPACT if compact else PATTERN_PLY_VERBOSE
 
-    # Parses the move number, the SAN, and an optional comment
-    one_ply_regex = re.compile(r'\s*(?:\d+\. )?([a-zA-Z0-9+=#-]+) (?:\s*\{\s*([^}]*)\s*\})?')
+    # Each: <Move> {<Comment>}, followed by the trailing game result text that PGNs expect
+    plies  = ['%s {%s}' % (x[0], x[1] or 'unknown') for x in ply_regex.findall(move_text)]
+    result = PATTERN_GAME_RESULT.search(move_text).group(1)
 
-    # Captures the trailing game result
-    result_regex  = re.compile(r'\s*(1-0|0-1|1/2-1/2|\*)')
+    return ' '.join(plies + [result])
 
-    stripped = '' # Add each: <Move> {<Comment>}
-    for move, comment in re.compile(REGEX_MOVE_AND_COMMENT).findall(move_text):
-        match = re.search(comment_regex, comment)
-        stripped += '%s {%s} ' % (move, match.group() if match else 'unknown')
+def iter_stripped_games(games, scale_factor, compact):
+
+    for header_dict, move_text in games:
+        header_dict['ScaleFactor'] = str(scale_factor)
+        yield '%s\n\n%s\n\n' % (pgn_strip_headers(header_dict, compact), pgn_strip_movelist(move_text, compact))
 
-    # PGNs expect trailing game result text
-    return stripped + re.compile(REGEX_GAME_RESULT).search(move_text).group(1)
+def strip_games(games, scale_factor, compact):
+    return ''.join(iter_stripped_games(games, scale_factor, compact))
 
 def strip_entire_pgn(file_name, scale_factor, compact):
+    return strip_games(pgn_iterator(file_name), scale_factor, compact)
 
-    stripped = ''
-    for header_dict, move_text in pgn_iterator(file_name):
-        header_dict['ScaleFactor'] = str(scale_factor)
-        stripped += pgn_strip_headers(header_dict, compact) + '\n\n'
-        stripped += pgn_strip_movelist(move_text, compact) + '\n\n'
+def strip_pgn_text(text, scale_factor, compact):
+    return strip_games(pgn_stream_iterator(io.StringIO(text, newline=None)), scale_factor, compact)
 
-    return stripped
+def supported_pgn_codecs():
+    return [codec for codec in ['zstd', 'xz', 'bz2'] if codec != 'zstd' or zstandard]
 
-def compress_list_of_pgns(file_names, scale_factor, compact):
+def select_pgn_codec(preferences):
 
-    text = ''
-    for fname in file_names:
-        print ('Compressing %s...' % (fname))
-        text += strip_entire_pgn(fname, scale_factor, compact)
+    # First of the Server's preferences that we can produce, or bz2, which all Servers accept
+    return next((codec for codec in preferences if codec in supported_pgn_codecs()), 'bz2')
+
+def zstd_dictionary_id(dictionary):
+
+    # Raw content dictionaries have no id; the Server can only advertise trained ones
+    if not dictionary or not dictionary.startswith(ZSTD_DICT_MAGIC):
+        return 0
+
+    return struct.unpack('<I', dictionary[4:8])[0]
+
+def pgn_compressor(codec):
+
+    if codec.name == 'xz':
+        return lzma.LZMACompressor(preset=codec.level)
+
+    if codec.name == 'zstd':
+        dictionary = zstandard.ZstdCompressionDict(codec.dictionary) if codec.dictionary else None
+        return zstandard.ZstdCompressor(level=codec.level, dict_data=dictionary).compressobj()
+
+    return bz2.BZ2Compressor(codec.level)
+
+def detect_pgn_codec(data):
+    return next((codec for magic, codec in PGN_CODEC_MAGICS.items() if data.startswith(magic)), None)
+
+def decompress_pgn_payload(data, dictionaries=None):
+
+    # Dictionaries are keyed by their id, which zstd records in every frame
+    dictionaries = dictionaries if dictionaries else {}
+    codec        = detect_pgn_codec(data)
+
+    if codec == 'xz':
+        return lzma.decompress(data)
+
+    if codec == 'zstd':
+
+        if not zstandard:
+            raise RuntimeError('The zstandard package is needed to read zstd compressed PGNs')
+
+        dict_id    = zstandard.get_frame_parameters(data).dict_id
+        dictionary = zstandard.ZstdCompressionDict(dictionaries[dict_id]) if dict_id else None
+        reader     = zstandard.ZstdDecompressor(dict_data=dictionary).stream_reader(io.BytesIO(data), read_across_frames=True)
+        return reader.read()
+
+    return bz2.decompress(data)
+
+def iter_archive_members(tar):
+
+    # Dictionaries are small, so load them all before reading any of the members
+    members      = [member for member in tar.getmembers() if member.isfile()]
+    dictionaries = {
+        int(member.name.split('.')[1]) : tar.extractfile(member).read()
+            for member in members if member.name.endswith('.dict')
+    }
+
+    # Yields (name, decompressed content) for each Workload in an OpenBench archive
+    for member in members:
+        if not member.name.endswith('.dict'):
+            yield member.name, decompress_pgn_payload(tar.extractfile(member).read(), dictionaries)
+
+def iter_archive_pgns(tar):
+
+    # Game records are archived separately, and are read through game_records.py
+    for name, content in iter_archive_members(tar):
+        if '.records.' not in name:
+            yield name, content
+
+def compress_stripped_games(stripped_games, limit=COMPRESSED_PGN_LIMIT, codec=PGN_CODEC_DEFAULT, quiet=False):
+
+    # Games are fed to the compressor one at a time, so only the output is ever held
+    compressor = pgn_compressor(codec)
+    output     = io.BytesIO()
+    dropped    = False
+
+    for game in stripped_games:
+
+        # Output is produced a block at a time, so the limit may be passed by one block
+        if (dropped := output.tell() > limit):
+            break
+
+        output.write(compressor.compress(game.encode()))
+
+    output.write(compressor.flush())
+
+    # Quiet callers are told instead, to note the drop once for all of their sources
+    if quiet:
+        return output.getvalue(), dropped
+
+    if dropped:
+        print ('[Note] Compressed PGN exceeded %d bytes. Dropping the remaining games' % (limit))
+
+    return output.getvalue()
+
+def compress_pgn_file(fname, scale_factor, compact, limit=COMPRESSED_PGN_LIMIT, codec=PGN_CODEC_DEFAULT, quiet=False):
+    print ('Compressing %s...' % (fname))
+    games = pgn_iterator(fname)
+    return compress_stripped_games(iter_stripped_games(games, scale_factor, compact), limit, codec, quiet)
+
+def compress_pgn_text(text, scale_factor, compact, limit=COMPRESSED_PGN_LIMIT, codec=PGN_CODEC_DEFAULT, quiet=False):
+    games = pgn_stream_iterator(io.StringIO(text, newline=None))
+    return compress_stripped_games(iter_stripped_games(games, scale_factor, compact), limit, codec, quiet)
+
+def compress_in_parallel(function, sources, scale_factor, compact, processes, limit, codec):
+
+    # Each source is its own stream, and concatenated streams are valid for every codec
+    count = len(sources)
+    args  = [sources, [scale_factor] * count, [compact] * count, [limit // max(1, count)] * count, [codec] * count, [True] * count]
+
+    if processes <= 1 or count <= 1:
+        results = list(map(function, *args))
+
+    # Spawn, rather than fork, since the Worker calls this from one of its many threads
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(processes, count), mp_context=context) as executor:
+            results = list(executor.map(function, *args))
+
+    if any(dropped for output, dropped in results):
+        print ('[Note] Compressed PGN exceeded %d bytes. Dropping the remaining games' % (limit))
+
+    return b''.join(output for output, dropped in results)
+
+def compress_list_of_pgns(file_names, scale_factor, compact, processes=None, limit=COMPRESSED_PGN_LIMIT, codec=PGN_CODEC_DEFAULT):
+    processes = processes or os.cpu_count() or 1
+    return compress_in_parallel(compress_pgn_file, file_names, scale_factor, compact, processes, limit, codec)
+
+def compress_list_of_pgn_texts(texts, scale_factor, compact, processes=None, limit=COMPRESSED_PGN_LIMIT, codec=PGN_CODEC_DEFAULT):
+    processes = processes or os.cpu_count() or 1
+    return compress_in_parallel(compress_pgn_text, texts, scale_factor, compact, processes, limit, codec)
+
+def batch_pgn_texts(texts, batch_bytes=PGN_BATCH_BYTES):
+
+    # Contiguous runs of complete games, of about batch_bytes, each becoming its own stream.
+    # Each text is ended by exactly one blank line, as a stray one would end the stream early
+    batches, batch, length = [], [], 0
+
+    for text in filter(str.strip, texts):
+        batch.append(text.strip() + '\n\n')
+        length += len(text)
+        if length >= batch_bytes:
+            batches.append(''.join(batch))
+            batch, length = [], 0
 
-    return bz2.compress(text.encode())
+    return batches + ([''.join(batch)] if batch else [])
 
 def delete_list_of_pgns(file_names):
     for fname in file_names:
-        os.remove(fname)
\ No newline at end of file
+        os.remove(fname)
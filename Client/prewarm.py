@@ -0,0 +1,100 @@
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                           #
+#   OpenBench is a chess engine testing framework by Andrew Grant.          #
+#   <https://github.com/AndyGrant/OpenBench>  <andrew@grantnet.us>          #
+#                                                                           #
+#   OpenBench is free software: you can redistribute it and/or modify       #
+#   it under the terms of the GNU General Public License as published by    #
+#   the Free Software Foundation, either version 3 of the License, or       #
+#   (at your option) any later version.                                     #
+#                                                                           #
+#   OpenBench is distributed in the hope that it will be useful,            #
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+#   GNU General Public License for more details.                            #
+#                                                                           #
+#   You should have received a copy of the GNU General Public License       #
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+#                                                                           #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# The purpose of this module is to pull the files that a Workload reads during its
+# games into the page cache, before the games, and any benchmarks, have started.
+#
+#   - prewarm_files() memory maps each file and touches every page, in parallel,
+#     so that the first games are not slowed by engines faulting in Networks, the
+#     opening book, or Syzygy tables from disk. Files are taken in the order that
+#     they were given, and any file that would exceed the budget is skipped.
+#
+#   - syzygy_files() lists the tables within some Syzygy paths, up to a number
+#     of pieces. WDL tables come before DTZ tables, smallest first, as those are
+#     probed most often during search.
+
+import mmap
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+## Local imports must only use "import x", never "from x import ..."
+
+PREWARM_THREADS = 8 # Files to read at once, which may be on different disks
+
+def touch_file(path):
+
+    try:
+        with open(path, 'rb') as fin, mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+
+            # Start readahead of the entire file, where supported, before touching it
+            if hasattr(mmap, 'MADV_WILLNEED'):
+                mapped.madvise(mmap.MADV_WILLNEED)
+
+            for offset in range(0, len(mapped), mmap.PAGESIZE):
+                mapped[offset]
+
+    # Empty files cannot be mapped, and nothing here is worth failing a Workload
+    except (OSError, ValueError):
+        pass
+
+def select_files(paths, budget):
+
+    selected, total = [], 0
+
+    # Each file once, in order, for as long as the budget allows
+    for path in dict.fromkeys(filter(None, paths)):
+
+        try: size = os.path.getsize(path)
+        except OSError: continue
+
+        if total + size <= budget:
+            selected.append(path)
+            total += size
+
+    return selected, total
+
+def prewarm_files(paths, budget):
+
+    start           = time.time()
+    selected, total = select_files(paths, budget)
+
+    with ThreadPoolExecutor(max_workers=PREWARM_THREADS) as executor:
+        list(executor.map(touch_file, selected))
+
+    return len(selected), total, time.time() - start
+
+def syzygy_files(paths, max_pieces):
+
+    tables = []
+
+    for path in paths:
+
+        try: entries = list(os.scandir(path))
+        except OSError: continue
+
+        # Tables are named by their pieces, such as KRPvKR, with one letter per piece
+        for entry in entries:
+            name, ext = os.path.splitext(entry.name)
+            if ext in ('.rtbw', '.rtbz') and len(name) - 1 <= max_pieces:
+                tables.append((ext != '.rtbw', entry.stat().st_size, entry.path))
+
+    return [path for is_dtz, size, path in sorted(tables)]
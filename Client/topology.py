@@ -0,0 +1,156 @@
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                           #
+#   OpenBench is a chess engine testing framework by Andrew Grant.          #
+#   <https://github.com/AndyGrant/OpenBench>  <andrew@grantnet.us>          #
+#                                                                           #
+#   OpenBench is free software: you can redistribute it and/or modify       #
+#   it under the terms of the GNU General Public License as published by    #
+#   the Free Software Foundation, either version 3 of the License, or       #
+#   (at your option) any later version.                                     #
+#                                                                           #
+#   OpenBench is distributed in the hope that it will be useful,            #
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+#   GNU General Public License for more details.                            #
+#                                                                           #
+#   You should have received a copy of the GNU General Public License       #
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+#                                                                           #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# The purpose of this module is to place Cutechess copies, their engines, and
+# benchmarks onto the machine's cores, such that they never migrate between them.
+#
+#   - discover_topology() returns a list of NUMA nodes, each a list of physical
+#     cores, each a list of the logical CPUs on that core. Linux reads sysfs,
+#     while other platforms assume a single node with adjacent hyperthreads.
+#
+#   - plan_placement() gives each Cutechess copy a dedicated set of CPUs within
+#     a single NUMA node. Physical cores are used one CPU apiece if possible, or
+#     else whole cores, hyperthreads included, are handed out. None is returned
+#     if no such placement exists, in which case nothing is pinned at all.
+#
+#   - pinned_popen() launches a process which, along with all of its children,
+#     is restricted to the given CPUs. apply_affinity() does the same for those
+#     processes which are launched by other means, like asyncio. Processes are
+#     pinned just after they start, as the Worker is threaded, which rules out
+#     running anything between fork and exec.
+
+import collections
+import glob
+import os
+import platform
+import psutil
+import re
+import subprocess
+
+## Local imports must only use "import x", never "from x import ..."
+
+IS_WINDOWS = platform.system() == 'Windows' # Don't touch this
+IS_LINUX   = platform.system() != 'Windows' # Don't touch this
+
+## Linux sets affinity with the os module, others with psutil, if at all
+
+HAS_SCHED_AFFINITY  = hasattr(os, 'sched_setaffinity')
+HAS_PSUTIL_AFFINITY = hasattr(psutil.Process, 'cpu_affinity')
+
+def read_sysfs_int(path):
+
+    try:
+        with open(path) as fin:
+            return int(fin.read().strip())
+
+    except (OSError, ValueError):
+        return None
+
+def allowed_cpus():
+
+    if HAS_SCHED_AFFINITY:
+        return sorted(os.sched_getaffinity(0))
+
+    if HAS_PSUTIL_AFFINITY:
+        return sorted(psutil.Process().cpu_affinity())
+
+    return list(range(psutil.cpu_count(logical=True) or 1))
+
+def discover_sysfs_topology(cpus):
+
+    nodes = collections.defaultdict(lambda: collections.defaultdict(list))
+
+    for cpu in cpus:
+
+        base    = '/sys/devices/system/cpu/cpu%d' % (cpu)
+        package = read_sysfs_int(os.path.join(base, 'topology', 'physical_package_id'))
+        core    = read_sysfs_int(os.path.join(base, 'topology', 'core_id'))
+
+        if core is None:
+            return None
+
+        # The node is only exposed as a link named nodeN, on NUMA kernels
+        links = [re.search(r'node(\d+)$', x) for x in glob.glob(os.path.join(base, 'node*'))]
+        node  = min([int(x.group(1)) for x in links if x] or [0])
+
+        nodes[node][(package, core)].append(cpu)
+
+    return [[sorted(cores[x]) for x in sorted(cores)] for node, cores in sorted(nodes.items())]
+
+def discover_topology():
+
+    cpus = allowed_cpus()
+
+    if IS_LINUX and os.path.isdir('/sys/devices/system/cpu') and (nodes := discover_sysfs_topology(cpus)):
+        return nodes
+
+    # Assume one node, with hyperthreads numbered adjacently, as on Windows
+    physical = psutil.cpu_count(logical=False) or len(cpus)
+    smt      = max(1, len(cpus) // physical)
+    return [[cpus[x:x+smt] for x in range(0, len(cpus), smt)]]
+
+def plan_placement(copies, cpus_each):
+
+    if not (HAS_SCHED_AFFINITY or HAS_PSUTIL_AFFINITY) or copies <= 0 or cpus_each <= 0:
+        return None
+
+    nodes, placement = discover_topology(), []
+
+    for ii in range(copies):
+
+        # Fill the node with the most free cores, to spread the copies evenly
+        node = max(nodes, key=len)
+
+        # One CPU on each of a dedicated set of physical cores
+        if len(node) >= cpus_each:
+            placement.append(sorted(core[0] for core in node[:cpus_each]))
+            del node[:cpus_each]
+            continue
+
+        # Otherwise whole cores, using their hyperthreads, if they will suffice
+        taken, cpus = 0, []
+        while taken < len(node) and len(cpus) < cpus_each:
+            cpus.extend(node[taken]); taken += 1
+
+        if len(cpus) < cpus_each:
+            return None
+
+        placement.append(sorted(cpus))
+        del node[:taken]
+
+    return placement
+
+def apply_affinity(pid, cpus):
+
+    # Pin a process which has just started, before it has launched any engines
+    if cpus and HAS_SCHED_AFFINITY:
+        try: os.sched_setaffinity(pid, cpus)
+        except OSError: pass
+
+    elif cpus and HAS_PSUTIL_AFFINITY:
+        try: psutil.Process(pid).cpu_affinity(list(cpus))
+        except psutil.Error: pass
+
+def pinned_popen(command, cpus, **kwargs):
+
+    # Children inherit the affinity of their parent, so engines are pinned as well
+    process = subprocess.Popen(command, **kwargs)
+    apply_affinity(process.pid, cpus)
+    return process
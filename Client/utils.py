@@ -20,19 +20,41 @@
 
 import argparse
 import hashlib
+import json
 import os
 import platform
 import requests
 import shutil
 import subprocess
 import tempfile
+import threading
+import time
 import zipfile
 
+from requests.adapters import HTTPAdapter
+
 ## Local imports must only use "import x", never "from x import ..."
 
+import pgn_util
+
 IS_WINDOWS = platform.system() == 'Windows' # Don't touch this
 IS_LINUX   = platform.system() != 'Windows' # Don't touch this
 
+## (Connect, Read) timeouts for HTTP requests. The first matching endpoint is used,
+## otherwise falling back to the default. Uploads and large downloads get more leeway
+
+HTTP_TIMEOUTS = [
+    ('clientSubmitPGN', (10, 120)),
+    ('api/networks'   , (10, 120)),
+    ('archive'        , (10, 120)),
+]
+
+HTTP_TIMEOUT_DEFAULT = (10, 30) # Default (Connect, Read) timeouts
+HTTP_POOL_SIZE       = 16       # Maximum number of kept-alive connections per host
+
+DOWNLOAD_CHUNK_SIZE  = 1024 * 1024 # Bytes read and written at a time when streaming files
+SIDECAR_MAX_AGE      = 60 * 60 * 24 # Seconds to trust a .sha256 sidecar before rehashing
+
 
 class OpenBenchFatalWorkerException(Exception):
     def __init__(self, message):
@@ -87,6 +109,63 @@ class OpenBenchMisssingPGNException(Exception):
         super().__init__(self.message)
 
 
+class OpenBenchSession(requests.Session):
+
+    ## A single keep-alive Session, shared by everything the Worker sends to the server or
+    ## to Github. Connections are pooled per host, and timeouts are picked per endpoint,
+    ## unless one is provided. client.py uses requests directly, as it may outlive utils.py
+
+    def __init__(self):
+
+        super().__init__()
+
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+        self.mount('http://' , self.adapter)
+        self.mount('https://', self.adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', http_timeout(url))
+        return super().request(method, url, **kwargs)
+
+    def connection_stats(self):
+
+        # Summed over every pool that urllib3 still has alive
+        stats = { 'requests' : 0, 'connections' : 0, 'reused' : 0 }
+
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+
+            try: pool = pools[key]
+            except KeyError: continue # Evicted since calling keys()
+
+            stats['requests'   ] += pool.num_requests
+            stats['connections'] += pool.num_connections
+
+        stats['reused'] = max(0, stats['requests'] - stats['connections'])
+        return stats
+
+SESSION      = None
+SESSION_LOCK = threading.Lock()
+
+def http_session():
+
+    global SESSION
+
+    # Created lazily, once per import of utils.py
+    with SESSION_LOCK:
+        if SESSION is None:
+            SESSION = OpenBenchSession()
+        return SESSION
+
+def http_timeout(url):
+
+    for endpoint, timeout in HTTP_TIMEOUTS:
+        if endpoint in url:
+            return timeout
+
+    return HTTP_TIMEOUT_DEFAULT
+
+
 def kill_process_by_name(process_name):
 
     process_name = os.path.basename(process_name)
@@ -140,7 +219,108 @@ def credentialed_request(server, username, password, endpoint):
     target  = url_join(server, *endpoint.split('/'))
     payload = { 'username' : username, 'password' : password }
 
-    return requests.post(data=payload, url=target)
+    return http_session().post(data=payload, url=target)
+
+def download_file(url, out_path, headers=None, data=None):
+
+    # Streams to <out_path>.part, hashing as it goes, and then moves it to out_path.
+    # A .part left behind by an interrupted download is resumed with an HTTP Range.
+    # Returns the sha256 of the entire file, as a hex string
+
+    part_path = out_path + '.part'
+    offset    = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    sha256    = hashlib.sha256()
+
+    # Ranges refer to the encoded bytes, so never let the transfer be compressed
+    request_headers = { **(headers or {}), 'Accept-Encoding' : 'identity' }
+    if offset:
+        request_headers['Range'] = 'bytes=%d-' % (offset)
+
+    method = 'POST' if data else 'GET'
+    with http_session().request(method, url, headers=request_headers, data=data, stream=True) as response:
+
+        # The .part was already complete, or is otherwise unusable
+        if offset and response.status_code == 416:
+            os.remove(part_path)
+            return download_file(url, out_path, headers, data)
+
+        response.raise_for_status()
+
+        # Servers which ignore the Range header will send the entire file again
+        resuming = offset and response.status_code == 206
+        if resuming:
+            print ('Resuming %s from %d bytes' % (os.path.basename(out_path), offset))
+            file_sha256(part_path, sha256)
+
+        with open(part_path, 'ab' if resuming else 'wb') as fout:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                sha256.update(chunk)
+                fout.write(chunk)
+
+    os.replace(part_path, out_path)
+    return sha256.hexdigest()
+
+def file_sha256(path, sha256=None):
+
+    # Hash in chunks, to avoid reading entire files into memory
+    sha256 = sha256 if sha256 else hashlib.sha256()
+
+    with open(path, 'rb') as fin:
+        for chunk in iter(lambda: fin.read(DOWNLOAD_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+def text_sha256(path):
+
+    # Hash as UTF-8 text in chunks, which normalizes line endings across systems
+    sha256 = hashlib.sha256()
+
+    with open(path) as fin:
+        for chunk in iter(lambda: fin.read(DOWNLOAD_CHUNK_SIZE), ''):
+            sha256.update(chunk.encode('utf-8'))
+
+    return sha256.hexdigest()
+
+def write_sha256_sidecar(path, digest, text=False):
+
+    # Records what the file looked like when it was hashed
+    stat    = os.stat(path)
+    sidecar = {
+        'size'     : stat.st_size,
+        'mtime_ns' : stat.st_mtime_ns,
+        'text'     : text,
+        'sha256'   : digest,
+        'verified' : time.time(),
+    }
+
+    with open(path + '.sha256', 'w') as fout:
+        json.dump(sidecar, fout)
+
+def verified_sha256(path, text=False):
+
+    # Reuse the sidecar's digest if the file is unchanged, and was hashed recently
+    try:
+        stat = os.stat(path)
+        with open(path + '.sha256') as fin:
+            sidecar = json.load(fin)
+
+        unchanged = (sidecar['size'], sidecar['mtime_ns']) == (stat.st_size, stat.st_mtime_ns)
+        if unchanged and sidecar['text'] == text and time.time() - sidecar['verified'] < SIDECAR_MAX_AGE:
+            return sidecar['sha256']
+
+    except (OSError, ValueError, KeyError):
+        pass # Missing or malformed sidecars force a full verification
+
+    digest = text_sha256(path) if text else file_sha256(path)
+    write_sha256_sidecar(path, digest, text)
+    return digest
+
+def remove_with_sidecar(path):
+
+    for fname in [path, path + '.sha256']:
+        if os.path.isfile(fname):
+            os.remove(fname)
 
 def read_git_credentials(engine):
     fname = 'credentials.%s' % (engine.replace(' ', '').lower())
@@ -174,15 +354,15 @@ def check_for_engine_binary(out_path):
         os.rename(out_path, '%s.exe' % (out_path))
         return '%s.exe' % (out_path)
 
-def makefile_command(net_path, make_path, out_path, compiler):
+def makefile_command(net_path, make_path, out_path, compiler, ccache=False, jobs=None):
 
-    # Build with -j, and EXE= to contol the output location
-    command = ['make', '-j', 'EXE=%s' % (out_path)]
+    # Build with -j, limited to some number of jobs if needed, and EXE= to contol the output location
+    command = ['make', '-j%d' % (jobs) if jobs else '-j', 'EXE=%s' % (out_path)]
 
-    # Build with CC/CXX= when using a custom compiler
+    # Build with CC/CXX= when using a custom compiler, possibly behind ccache
     if compiler:
         comp_flag = ['CC', 'CXX']['++' in compiler]
-        command  += ['%s=%s' % (comp_flag, compiler)]
+        command  += ['%s=%s%s' % (comp_flag, ['', 'ccache '][ccache], compiler)]
 
     # Build with EVALFILE= to embed NNUE files
     if net_path:
@@ -249,14 +429,13 @@ def download_opening_book(book_sha, book_source, book_name):
 
         print ('Fetching Opening Book [%s]' % (book_name))
 
+        # Download the zip file from Github, which can be resumed if interrupted
+        zip_path = '%s.zip' % (book_path)
+        download_file(book_source, zip_path)
+
         # Work with temp files and directories until finished extracting
         with tempfile.TemporaryDirectory() as temp_dir:
 
-            # Download the zip file from Github
-            zip_path = os.path.join(temp_dir, '%s.zip' % (book_name))
-            with open(zip_path, 'wb') as zip_file:
-                zip_file.write(requests.get(book_source).content)
-
             # Unzip the book to a directory
             unzip_path = os.path.join(temp_dir, book_name)
             with zipfile.ZipFile(zip_path, 'r') as zip_file:
@@ -266,10 +445,10 @@ def download_opening_book(book_sha, book_source, book_name):
             unzip_root = os.path.join(unzip_path, os.listdir(unzip_path)[0])
             shutil.move(unzip_root, book_path)
 
-    # Verify SHAs match with the server
-    with open(book_path) as fin:
-        content = fin.read().encode('utf-8')
-        sha256  = hashlib.sha256(content).hexdigest()
+        os.remove(zip_path)
+
+    # Verify SHAs match with the server, rehashing only if the book has changed
+    sha256 = verified_sha256(book_path, text=True)
 
     # Log SHAs on every workload
     print ('Correct  %s' % (book_sha.upper()))
@@ -277,7 +456,7 @@ def download_opening_book(book_sha, book_source, book_name):
 
     # We have to have the correct SHA to continue
     if book_sha.upper() != sha256.upper():
-        os.remove(book_path)
+        remove_with_sidecar(book_path)
         raise OpenBenchCorruptedBookException('Invalid sha for %s' % (book_name))
 
 def download_network(server, username, password, engine, net_name, net_sha, net_path):
@@ -287,29 +466,90 @@ def download_network(server, username, password, engine, net_name, net_sha, net_
 
         # Format the API request, including credentials
         print ('Fetching %s (%s) for %s' % (net_name, net_sha, engine))
-        endpoint = 'api/networks/%s/%s' % (engine, net_sha)
-        request  = credentialed_request(server, username, password, endpoint)
+        target  = url_join(server, 'api', 'networks', engine, net_sha)
+        payload = { 'username' : username, 'password' : password }
 
-        # Write the content out to the net_path in kb chunks
-        with open(net_path, 'wb') as fout:
-            for chunk in request.iter_content(chunk_size=1024):
-                if chunk: fout.write(chunk)
-            fout.flush()
+        # Stream the content out to the net_path, hashing along the way
+        sha256 = download_file(target, net_path, data=payload)
+        write_sha256_sidecar(net_path, sha256)
+        sha256 = sha256[:8]
 
-    else:
+    else: # Rehash only if the Network has changed since last verified
         print ('Found %s (%s) for %s' % (net_name, net_sha, engine))
+        sha256 = verified_sha256(net_path)[:8]
 
     # Check for the first 8 characters of the sha256
     print ('Verifying %s (%s) for %s\n' % (net_name, net_sha, engine))
-    with open(net_path, 'rb') as network:
-        sha256 = hashlib.sha256(network.read()).hexdigest()[:8]
 
     # Verify the download and delete partial or corrupted ones
     if net_sha.upper() != sha256.upper():
-        os.remove(net_path)
+        remove_with_sidecar(net_path)
         raise OpenBenchCorruptedNetworkException('Invalid SHA for %s' % (net_name))
 
-def download_public_engine(engine, net_path, branch, source, make_path, out_path, compiler=None):
+def download_pgn_dictionary(server, username, password, dictionary_id, dict_path):
+
+    # Dictionaries never change, so their id is enough to avoid redownloading
+    if not os.path.isfile(dict_path):
+        print ('Fetching PGN dictionary %d' % (dictionary_id))
+        target  = url_join(server, 'api', 'pgn_dictionary', str(dictionary_id))
+        payload = { 'username' : username, 'password' : password }
+        download_file(target, dict_path, data=payload)
+
+    with open(dict_path, 'rb') as fin:
+        dictionary = fin.read()
+
+    # Errors are served as JSON, which must not be mistaken for a dictionary
+    if pgn_util.zstd_dictionary_id(dictionary) != dictionary_id:
+        os.remove(dict_path)
+        raise Exception('Invalid PGN dictionary %d' % (dictionary_id))
+
+    return dictionary
+
+def makefile_environment(build_dir, ccache):
+
+    # ccache must ignore the build directory, since each build gets a fresh copy
+    if not ccache:
+        return None
+
+    return dict(os.environ, CCACHE_BASEDIR=os.path.abspath(build_dir), CCACHE_NOHASHDIR='1')
+
+def download_source_tree(engine, source, tree_path):
+
+    # Download the zip file from Github, which can be resumed if interrupted
+    zip_path = '%s.zip' % (tree_path)
+    download_file(source, zip_path)
+
+    # Work with temp files and directories until finished extracting
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(tree_path)) as temp_dir:
+
+        # Unzip the engine to a directory called <engine>
+        unzip_path = os.path.join(temp_dir, engine)
+        with zipfile.ZipFile(zip_path, 'r') as zip_file:
+            zip_file.extractall(unzip_path)
+
+        # Move the Root folder into place, unless someone else beat us to it
+        unzip_root = os.path.join(unzip_path, os.listdir(unzip_path)[0])
+        try: os.rename(unzip_root, tree_path)
+        except OSError:
+            if not os.path.isdir(tree_path): raise
+
+    os.remove(zip_path)
+
+def cached_source_tree(engine, source):
+
+    # Sources are immutable, since they are addressed by their Git tree sha
+    digest    = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+    tree_path = os.path.join('Sources', '%s-%s' % (engine.replace(' ', ''), digest))
+
+    if not os.path.isdir(tree_path):
+        os.makedirs('Sources', exist_ok=True)
+        download_source_tree(engine, source, tree_path)
+
+    # Refresh the mtime, which is used to cleanup stale trees
+    os.utime(tree_path)
+    return tree_path
+
+def download_public_engine(engine, net_path, branch, source, make_path, out_path, compiler=None, cache_source=False, ccache=False, jobs=None):
 
     # Check to see if we already have the binary
     if check_for_engine_binary(out_path):
@@ -321,28 +561,23 @@ def download_public_engine(engine, net_path, branch, source, make_path, out_path
 
         print('Building [%s-%s]' % (engine, branch))
 
-        # Download the zip file from Github
-        zip_path = os.path.join(temp_dir, '%s-tmp' % (engine))
-        with open(zip_path, 'wb') as zip_file:
-            zip_file.write(requests.get(source).content)
+        src_path = os.path.join(temp_dir, '%s-tmp' % (engine))
 
-        # Unzip the engine to a directory called <engine>
-        unzip_path = os.path.join(temp_dir, engine)
-        with zipfile.ZipFile(zip_path, 'r') as zip_file:
-            zip_file.extractall(unzip_path)
+        # Build from a fresh copy of the cached sources, to never reuse stale objects
+        if cache_source:
+            shutil.copytree(cached_source_tree(engine, source), src_path)
 
-        # Rename the Root folder for ease of conventions
-        unzip_root = os.path.join(unzip_path, os.listdir(unzip_path)[0])
-        src_path   = os.path.join(unzip_path, '%s-tmp' % (engine))
-        os.rename(unzip_root, src_path)
+        else: # Download and unzip the sources directly into the build directory
+            download_source_tree(engine, source, src_path)
 
         # Prepare the MAKEFILE command
         make_path = os.path.join(src_path, make_path)
         bin_path  = os.path.join(make_path, os.path.basename(out_path))
-        make_cmd  = makefile_command(net_path, make_path, os.path.basename(out_path), compiler)
+        make_cmd  = makefile_command(net_path, make_path, os.path.basename(out_path), compiler, ccache, jobs)
+        make_env  = makefile_environment(temp_dir, ccache)
 
         # Build the engine, which will produce a binary to bin_path, to be moved after
-        process     = subprocess.Popen(make_cmd, cwd=make_path, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        process     = subprocess.Popen(make_cmd, cwd=make_path, env=make_env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
         comp_output = process.communicate()[0].decode('utf-8')
 
         # Verify that the compilation subprocess did not exit with errors
@@ -371,19 +606,18 @@ def download_private_engine(engine, branch, source, out_path, cpu_name, cpu_flag
 
     # Pick the best artifact to match this machine
     headers   = read_git_credentials(engine)
-    artifacts = requests.get(url=source, headers=headers).json()['artifacts']
+    artifacts = http_session().get(url=source, headers=headers).json()['artifacts']
     options   = { artifact['name'] : artifact for artifact in artifacts }
     best      = select_best_artifact(options, cpu_name, cpu_flags)
 
-    # Work with temp files and directories until finished extracting
-    with tempfile.TemporaryDirectory() as temp_dir:
+    print('Fetching [%s-%s]' % (engine, branch))
 
-        print('Fetching [%s-%s]' % (engine, branch))
+    # Download the zip file from Github, which can be resumed if interrupted
+    zip_path = '%s.zip' % (out_path)
+    download_file(best['archive_download_url'], zip_path, headers=headers)
 
-        # Download the zip file from Github
-        zip_path = os.path.join(temp_dir, '%s-tmp' % (engine))
-        with open(zip_path, 'wb') as zip_file:
-            zip_file.write(requests.get(best['archive_download_url'], headers=headers).content)
+    # Work with temp files and directories until finished extracting
+    with tempfile.TemporaryDirectory() as temp_dir:
 
         # Unzip the engine to a directory called <engine>
         unzip_path = os.path.join(temp_dir, engine)
@@ -394,6 +628,8 @@ def download_private_engine(engine, branch, source, out_path, cpu_name, cpu_flag
         unzip_root = os.path.join(unzip_path, os.listdir(unzip_path)[0])
         shutil.move(unzip_root, out_path)
 
+    os.remove(zip_path)
+
     # Might not have execution permissions set
     if platform.system() != 'Windows':
         os.system('chmod 777 %s\n' % (out_path))
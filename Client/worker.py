@@ -19,6 +19,9 @@
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 import argparse
+import bz2
+import collections
+import copy
 import cpuinfo
 import importlib
 import json
@@ -28,7 +31,8 @@ import platform
 import psutil
 import queue
 import re
-import requests
+import selectors
+import shutil
 import subprocess
 import sys
 import threading
@@ -39,14 +43,19 @@ import zipfile
 
 from subprocess import PIPE, Popen, call, STDOUT
 from itertools import combinations_with_replacement
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait
 
 ## Local imports must only use "import x", never "from x import ..."
 ## Local imports must also be done in reload_local_imports()
 
 import bench
+import cache
+import game_records
 import genfens
+import native_runner
 import pgn_util
+import prewarm
+import topology
 import utils
 
 ## Local imports from client are an exception
@@ -58,14 +67,47 @@ from client import try_forever
 ## Basic configuration of the Client. These timeouts can be changed at will
 
 CLIENT_VERSION   = 39 # Client version to send to the Server
-TIMEOUT_HTTP     = 30 # Timeout in seconds for HTTP requests
 TIMEOUT_ERROR    = 10 # Timeout in seconds when any errors are thrown
 TIMEOUT_WORKLOAD = 30 # Timeout in seconds between workload requests
 REPORT_INTERVAL  = 30 # Seconds between reports to the Server
 
+## The Server may advise other values for the above, within these bounds
+
+PACING_BOUNDS = {
+    'report_interval' : (5, 120), # Stay well within the Server's window for active Machines
+    'retry_after'     : (1, 300),
+    'poll_delay'      : (5, 600),
+}
+
+JOURNAL_FILE     = 'results.journal' # Results not yet acknowledged by the Server
+JOURNAL_MAX_AGE  = 60 * 60 * 24      # Seconds before giving up on replaying a Result
+
+PREFETCH_FRACTION = 0.90 # Portion of games played before preparing the next Workload
+
+PREWARM_RAM_FRACTION = 0.25 # Portion of RAM which may be spent prewarming a Workload's files
+
+PGN_UPLOAD_INTERVAL = 60      # Seconds between uploads of finished games, while playing
+PGN_POLL_INTERVAL   = 1       # Seconds between reads of PGN files, or checks of named pipes
+PGN_PIPE_READ_SIZE  = 1 << 16 # Bytes read at a time from a named pipe
+PGN_ERROR_DELAY     = 5       # Seconds to gather further engine errors, before reporting
+
+BENCH_MIN_SETS   = 1    # Interleaved sets of Benchmarks before checking for convergence
+BENCH_MAX_SETS   = 4    # Interleaved sets of Benchmarks, even if not yet converged
+BENCH_PRECISION  = 0.01 # Stop once the 95% confidence interval is within 1% of the mean
+
 IS_WINDOWS = platform.system() == 'Windows' # Don't touch this
 IS_LINUX   = platform.system() != 'Windows' # Don't touch this
 
+## Precompiled parsing of Cutechess output, and the scoring of game results
+
+REGEX_FINISHED_GAME = re.compile(r'Finished game (\d+) \(.*?\): (\S+) (.*)')
+REGEX_CRASH_REASON  = re.compile(r'disconnect|stalls')
+GAME_RESULT_INDEX   = { '0-1' : 0, '1/2-1/2' : 1, '1-0' : 2 }
+
+## Fastchess move comments, as {Score/Depth Time, key=value, ...}
+
+REGEX_FASTCHESS_COMMENT = re.compile(r'\{([+-]?M?\d+(?:\.\d+)?)/(\d+) (\d+(?:\.\d+)?)s([^}]*)\}')
+
 
 class Configuration:
 
@@ -92,6 +134,14 @@ class Configuration:
         self.secret_token   = 'None'
         self.syzygy_max     = 2
         self.blacklist      = []
+        self.prefetching    = False
+
+        # Advisory pacing, updated by hints in the Server's responses
+        self.pacing = {
+            'report_interval' : REPORT_INTERVAL,
+            'retry_after'     : TIMEOUT_ERROR,
+            'poll_delay'      : TIMEOUT_WORKLOAD,
+        }
 
         self.process_args(args) # Rest of the command line settings
         self.init_client()      # Create folder structure and verify Syzygy
@@ -110,24 +160,51 @@ class Configuration:
         self.fleet       = args.fleet    if args.fleet    else False
         self.noisy       = args.noisy    if args.noisy    else False
         self.focus       = args.focus    if args.focus    else []
+        self.cache_dir   = args.cache_dir if args.cache_dir else 'Cache'
+        self.cache_mb    = int(args.cache_mb)
+        self.ccache      = args.ccache   if args.ccache   else False
+        self.bench_age   = int(args.bench_cache_age)
+        self.affinity    = args.affinity if args.affinity else False
+        self.prefetch    = args.prefetch if args.prefetch else False
+        self.runner      = args.runner   if args.runner   else 'cutechess'
+        self.runner_set  = args.runner is not None # Overrides the runner requested by Tests
+        self.pgn_fifo    = args.pgn_fifo if args.pgn_fifo else False
+        self.prewarm     = args.prewarm  if args.prewarm  else False
 
     def init_client(self):
 
-        # Verify that we have make installed
-        print('\nLooking for Make... [v%s]' % locate_utility('make'))
-
         # Use Client.py's path as the base pathway
         os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
+        # Versions of tools, and CPU flags, are remembered between restarts
+        self.probes = cache.ProbeCache(self.cache_dir)
+
+        # Verify that we have make installed
+        print('\nLooking for Make... [v%s]' % locate_utility('make', probes=self.probes))
+
+        # Only use ccache if requested, and actually installed
+        if self.ccache:
+            self.ccache = bool(version := locate_utility('ccache', force_exit=False, probes=self.probes))
+            print('Looking for ccache... [v%s]' % (version))
+
         # Ensure the folder structure for ease of coding
-        for folder in ['PGNs', 'Engines', 'Networks', 'Books']:
+        for folder in ['PGNs', 'Engines', 'Networks', 'Books', 'Sources']:
             if not os.path.isdir(folder):
                 os.mkdir(folder)
 
-        # Check until we stop finding valid N-man tables
+        # Tests may still ask for other runners, but ours must always be present
+        if not MATCH_RUNNERS[self.runner].available():
+            print('[Error] Unable to locate %s' % (MATCH_RUNNERS[self.runner].executables[IS_LINUX]))
+            sys.exit()
+
+        # Engines and Networks may be shared with other workers on this machine
+        self.cache       = cache.ArtifactCache(self.cache_dir, self.cache_mb)
+        self.bench_cache = cache.BenchCache(self.cache_dir, self.bench_age)
+
+        # Find the largest complete set of tables, unless the paths are unchanged
         if self.syzygy_path:
-            while validate_syzygy_exists(self, self.syzygy_max+1):
-                self.syzygy_max = self.syzygy_max + 1
+            paths = syzygy_paths(self)
+            self.syzygy_max = self.probes.probe('syzygy', syzygy_stamp(paths), lambda: find_syzygy_max(paths))
 
         # 1-man and 2-man tables are not a thing
         if self.syzygy_max < 3:
@@ -142,10 +219,27 @@ class Configuration:
         assert self.threads % self.sockets == 0
         assert min(self.threads, self.sockets) >= 1
 
+    def update_pacing(self, hints):
+
+        # Hints are advisory, so ignore anything unknown, and clamp everything else
+        for key, value in hints.items():
+            if key in PACING_BOUNDS and isinstance(value, (int, float)):
+                lower, upper = PACING_BOUNDS[key]
+                self.pacing[key] = min(upper, max(lower, value))
+
     def scan_for_compilers(self, data):
 
         print ('\nScanning for Compilers...')
 
+        # Probe every compiler that any public engine might want, all at once
+        names = set(
+            compiler.split('>=')[0] for build_info in data.values()
+                if not build_info['private'] for compiler in build_info['compilers']
+        )
+
+        with ThreadPoolExecutor(max_workers=max(1, len(names))) as executor:
+            versions = dict(zip(names, executor.map(lambda x: probe_version(self.probes, x, False), names)))
+
         # For each engine, attempt to find a valid compiler
         for engine, build_info in data.items():
 
@@ -163,7 +257,7 @@ class Configuration:
 
                 # Try to confirm this compiler is present, and new enough
                 try:
-                    match = get_version(compiler)
+                    match = versions[compiler]
                     if tuple(map(int, match.split('.'))) >= version:
                         print('%-16s | %-8s (%s)' % (engine, compiler, match))
                         self.compilers[engine] = (compiler, match)
@@ -194,11 +288,11 @@ class Configuration:
         print('\nScanning for CPU Flags...')
 
         # Get all flags, and for sanity uppercase them
-        info   = cpuinfo.get_cpu_info()
-        actual = [x.replace("_", "").replace(".", "").upper() for x in info.get('flags', [])]
+        info   = self.probes.probe('cpuinfo', cpu_stamp(self), probe_cpu_info)
+        actual = [x.replace("_", "").replace(".", "").upper() for x in info['flags']]
 
         # Set the CPU name which has to be done via global
-        self.cpu_name = info.get('brand_raw', info.get('brand', 'Unknown'))
+        self.cpu_name = info['brand']
 
         # This should cover virtually all compiler flags that we would care about
         desired  = ['POPCNT', 'BMI2']
@@ -223,11 +317,16 @@ class ServerReporter:
     @staticmethod
     def report(config, endpoint, payload, files=None):
 
+        # Problems found while prefetching are reported if the Workload is assigned
+        if config.prefetching:
+            return None
+
         payload['machine_id'] = config.machine_id
         payload['secret']     = config.secret_token
 
         target   = utils.url_join(config.server, endpoint)
-        response = requests.post(target, data=payload, files=files, timeout=TIMEOUT_HTTP)
+        response = utils.http_session().post(target, data=payload, files=files)
+        ServerReporter.read_pacing(config, response)
 
         # Check for a json repsone, to look for Client Version Errors
         try: as_json = response.json()
@@ -243,6 +342,20 @@ class ServerReporter:
 
         return response
 
+    @staticmethod
+    def read_pacing(config, response):
+
+        # An overloaded Server, or its proxy, may ask us to back off
+        if response.status_code in (429, 503) and 'Retry-After' in response.headers:
+            try: config.update_pacing({ 'retry_after' : float(response.headers['Retry-After']) })
+            except ValueError: pass
+
+        try: hints = response.json().get('pacing', {})
+        except: return
+
+        if isinstance(hints, dict):
+            config.update_pacing(hints)
+
     @staticmethod
     def report_nps(config, dev_nps, base_nps):
 
@@ -291,6 +404,24 @@ class ServerReporter:
 
         return ServerReporter.report(config, 'clientSubmitError', payload)
 
+    @staticmethod
+    def report_engine_errors(config, counts, logs=None, batch_id=None):
+
+        payload = {
+            'test_id'    : config.workload['test']['id'],
+            'result_id'  : config.workload['result']['id'],
+            'errors'     : json.dumps(counts),
+        }
+
+        # The batch id lets the Server ignore a batch that it already applied
+        if batch_id:
+            payload['batch_id'] = batch_id
+
+        # Only signatures not seen before in the Workload come with an example game
+        files = { 'logs' : ('errors.log.bz2', logs) } if logs else None
+
+        return ServerReporter.report(config, 'clientSubmitErrors', payload, files)
+
     @staticmethod
     def report_bad_bench(config, error):
 
@@ -302,7 +433,7 @@ class ServerReporter:
         return ServerReporter.report(config, 'clientBenchError', payload)
 
     @staticmethod
-    def report_results(config, batches):
+    def results_payload(config, batches):
 
         payload = {
 
@@ -340,8 +471,16 @@ class ServerReporter:
         payload['trinomial'  ] = ' '.join(map(str, payload['trinomial'  ]))
         payload['pentanomial'] = ' '.join(map(str, payload['pentanomial']))
 
+        return payload
+
+    @staticmethod
+    def report_results(config, payload, entry_id=None):
+
         print (payload)
 
+        # Don't pollute the caller's payload with the machine_id and secret. The journal's
+        # entry id lets the Server ignore a report that it already applied
+        payload = dict(payload, **({ 'entry_id' : entry_id } if entry_id else {}))
         return ServerReporter.report(config, 'clientSubmitResults', payload)
 
     @staticmethod
@@ -354,12 +493,16 @@ class ServerReporter:
         return ServerReporter.report(config, 'clientHeartbeat', payload)
 
     @staticmethod
-    def report_pgn(config, compressed_pgn_text):
+    def report_pgn(config, compressed_pgn_text, sequence=0, final=True, codec=pgn_util.PGN_CODEC_DEFAULT, records=None):
 
         payload = {
             'test_id'      : config.workload['test']['id'],
             'result_id'    : config.workload['result']['id'],
             'book_index'   : config.workload['test']['book_index'],
+            'sequence'     : sequence,
+            'final'        : int(final),
+            'codec'        : codec.name,
+            'dictionary'   : pgn_util.zstd_dictionary_id(codec.dictionary),
             'Content-Type' : 'application/octet-stream',
         }
 
@@ -367,28 +510,207 @@ class ServerReporter:
             'file' : ('games.pgn', compressed_pgn_text)
         }
 
+        # Game records, when requested, are compressed with the same codec
+        if records is not None:
+            files['records'] = ('games.records', records)
+
         return ServerReporter.report(config, 'clientSubmitPGN', payload, files)
 
-class Cutechess:
+class MatchRunner:
 
-    ## Handles building the very long string of arguments that need to be passed
-    ## to cutechess in order to launch a set of games. Operates on the Configuration,
-    ## and a small number of secondary arguments that are not housed in the Configuration
+    ## Interface for the programs which play a Workload's games. Each backend builds the
+    ## command for one copy of itself, parses its output into the shared accounting of
+    ## results, names the PGN that it writes, and tears down anything left behind. The
+    ## helpers which interpret the Workload, common to every backend, also live here.
+
+    name        = None # Value for --runner, and for the runner setting of a Test
+    executables = ()   # (Windows, Linux) file names, for backends that launch a binary
+
+    @classmethod
+    def binary(cls):
+
+        # Prefer a copy placed alongside the Client, as is done for cutechess-ob
+        local = cls.executables[IS_LINUX]
+        if not os.path.isfile(local) and shutil.which(local):
+            return shutil.which(local)
+
+        return ['%s', './%s'][IS_LINUX] % (local)
+
+    @classmethod
+    def available(cls):
+
+        if not cls.executables:
+            return True
+
+        local = cls.executables[IS_LINUX]
+        return os.path.isfile(local) or shutil.which(local) is not None
+
+    @classmethod
+    def command(cls, config, dev_cmd, base_cmd, scale_factor, timestamp, cutechess_idx):
+
+        # Abstract. Backends which launch a binary build its command line here, while
+        # the others override play() instead, as NativeRunner does
+        raise NotImplementedError('%s must implement command() or play()' % (cls.__name__))
+
+    @classmethod
+    def play(cls, config, dev_name, base_name, scale_factor, timestamp, cutechess_idx, pipeline, abort_flag, cpus=None):
+
+        # Launches one copy of the runner, and blocks until all of its games are played
+        command = cls.command(config, dev_name, base_name, scale_factor, timestamp, cutechess_idx)
+        run_and_parse_match(config, cls, command, cutechess_idx, pipeline, abort_flag, cpus)
 
     @staticmethod
-    def basic_settings(config):
+    def pgn_text(text):
+        return text # Games are written in the Cutechess format, so there is nothing to do
+
+    @classmethod
+    def kill_everything(cls, dev_process, base_process):
+
+        if cls.executables:
+            utils.kill_process_by_name(cls.executables[IS_LINUX])
+
+        utils.kill_process_by_name(dev_process)
+        utils.kill_process_by_name(base_process)
+
+    @staticmethod
+    def is_frc(config):
 
         # Assume Fischer if FRC, 960, or FISCHER appears in the Opening Book
         book_name = config.workload['test']['book']['name'].upper()
-        is_frc    = 'FRC' in book_name or '960' in book_name or 'FISCHER' in book_name
-        variant   = ['standard', 'fischerandom'][is_frc]
+        return 'FRC' in book_name or '960' in book_name or 'FISCHER' in book_name
+
+    @staticmethod
+    def plays_reverses(config):
 
-        # Only include -repeat if not skipping the reverses in DATAGEN
+        # Openings are repeated, unless skipping the reverses in DATAGEN
         is_datagen = config.workload['test']['type'] == 'DATAGEN'
-        no_reverse = is_datagen and not config.workload['test']['play_reverses']
+        return not is_datagen or config.workload['test']['play_reverses']
+
+    @staticmethod
+    def opening_book(config, cutechess_idx):
+
+        # Returns the file, format, order, starting index, and seed for the openings
+        pairs = config.workload['distribution']['games-per-cutechess'] // 2
+
+        # DATAGEN creates their own book
+        if config.workload['test']['type'] == 'DATAGEN':
+
+            # -repeat might not be applied, so handle the book offsets
+            no_reverse = not config.workload['test']['play_reverses']
+            start      = 1 + (cutechess_idx * pairs * (1 + no_reverse))
+            return ('Books/openbench.genfens.epd', 'epd', 'sequential', start, None)
+
+        # Can handle EPD and PGN Books, which must be specified
+        book_name   = config.workload['test']['book']['name']
+        book_suffix = book_name.split('.')[-1]
+
+        # Start position is determined partially by cutechess index
+        start = config.workload['test']['book_index'] + cutechess_idx * pairs
+
+        return ('Books/%s' % (book_name), book_suffix, 'random', start, config.workload['test']['book_seed'])
+
+    @staticmethod
+    def engine_options(config, branch, cutechess_idx, escape=True):
+
+        # Extract configuration from the Workload
+        options = config.workload['test'][branch]['options']
+        network = config.workload['test'][branch]['network']
+        private = config.workload['test'][branch]['private']
+        syzygy  = config.workload['test']['syzygy_wdl']
+
+        # Private engines, when using Networks, must set them via UCI
+        if private and network and network != 'None':
+            options += ' EvalFile=%s' % (os.path.join('../Networks', network))
+
+        # Set the SyzygyPath if we have them, and are allowed to use them
+        if syzygy != 'DISABLED' and config.syzygy_max:
+            path     = config.syzygy_path.replace('\\', '\\\\') if escape else config.syzygy_path
+            options += ' SyzygyPath=%s' % (path)
+
+        # Set a SyzygyProbeLimit if we may only use up-to N-Man
+        if syzygy != 'DISABLED' and syzygy != 'OPTIONAL':
+            options += ' SyzygyProbeLimit=%s' % (syzygy.split('-')[0])
+
+        # Add any of the custom SPSA settings
+        if config.workload['test']['type'] == 'SPSA':
+            for param, data in config.workload['spsa'].items():
+                options += ' %s=%s' % (param, str(data[branch][cutechess_idx]))
+
+        # Split into Name=Value pairs, which may be quoted
+        return re.findall(r'"[^"]*"|\S+', options)
+
+    @staticmethod
+    def update_results(results, line):
+
+        # Parse Game # and result, or ignore anything that is not a finished game
+        if not (match := REGEX_FINISHED_GAME.search(line)):
+            return
+
+        MatchRunner.record_game(results, int(match.group(1)), match.group(2), match.group(3))
+
+    @staticmethod
+    def record_game(results, game, result, reason):
+
+        # Parse for errors resulting in adjudication
+        results['crashes'   ] += bool(REGEX_CRASH_REASON.search(reason))
+        results['timelosses'] += 'on time' in reason
+        results['illegals'  ] += 'illegal' in reason
+
+        # Save the result until the other game in the pair has finished
+        results['games'][game] = result
+
+        # Given any game #, find the other in the pair
+        first, second = (game, game + 1) if game % 2 else (game - 1, game)
+        if first not in results['games'] or second not in results['games']:
+            return
+
+        # Lookup the results from our POV, for the first and second game of the pair
+        r1 = GAME_RESULT_INDEX[results['games'].pop(first )]
+        r2 = GAME_RESULT_INDEX[results['games'].pop(second)]
+
+        # Update the Pentanomial, and the two entries for the Trinomial
+        results['trinomial'  ][r1         ] += 1
+        results['trinomial'  ][2 - r2     ] += 1
+        results['pentanomial'][r1 + 2 - r2] += 1
+
+    @staticmethod
+    def pgn_name(config, timestamp, cutechess_idx):
+
+        test_id   = int(config.workload['test']['id'])
+        result_id = int(config.workload['result']['id'])
+
+        # Format: <Test>-<Result>-<Time>-<Index>.pgn
+        return 'PGNs/%d.%d.%d.%d.pgn' % (test_id, result_id, timestamp, cutechess_idx)
+
+class Cutechess(MatchRunner):
+
+    ## Handles building the very long string of arguments that need to be passed
+    ## to cutechess in order to launch a set of games. Operates on the Configuration,
+    ## and a small number of secondary arguments that are not housed in the Configuration
+
+    name        = 'cutechess'
+    executables = ('cutechess-ob.exe', 'cutechess-ob')
+
+    @classmethod
+    def command(cls, config, dev_cmd, base_cmd, scale_factor, timestamp, cutechess_idx):
+
+        flags  = ' ' + cls.basic_settings(config)
+        flags += ' ' + cls.concurrency_settings(config)
+        flags += ' ' + cls.adjudication_settings(config)
+        flags += ' ' + cls.engine_settings(config, dev_cmd, 'dev', scale_factor, cutechess_idx)
+        flags += ' ' + cls.engine_settings(config, base_cmd, 'base', scale_factor, cutechess_idx)
+        flags += ' ' + cls.book_settings(config, cutechess_idx)
+        flags += ' ' + cls.pgnout_settings(config, timestamp, cutechess_idx)
+
+        return cls.binary() + flags
+
+    @staticmethod
+    def basic_settings(config):
+
+        variant = ['standard', 'fischerandom'][Cutechess.is_frc(config)]
 
         # Always include -recover and -variant
-        return ['-repeat', ''][no_reverse] + ' -recover -variant %s' % (variant)
+        return ['', '-repeat'][Cutechess.plays_reverses(config)] + ' -recover -variant %s' % (variant)
 
     @staticmethod
     def concurrency_settings(config):
@@ -425,282 +747,769 @@ class Cutechess:
     @staticmethod
     def book_settings(config, cutechess_idx):
 
-        # DATAGEN creates their own book
-        if config.workload['test']['type'] == 'DATAGEN':
+        fname, fmt, order, start, seed = Cutechess.opening_book(config, cutechess_idx)
+        settings = '-openings file=%s format=%s order=%s start=%d' % (fname, fmt, order, start)
 
-            # -repeat might not be applied, so handle the book offsets
-            no_reverse = not config.workload['test']['play_reverses']
-            pairs      = config.workload['distribution']['games-per-cutechess'] // 2
-            start      = 1 + (cutechess_idx * pairs * (1 + no_reverse))
-            return '-openings file=Books/openbench.genfens.epd format=epd order=sequential start=%d' % (start)
+        return settings if seed is None else settings + ' -srand %d' % (seed)
 
-        # Can handle EPD and PGN Books, which must be specified
-        book_name   = config.workload['test']['book']['name']
-        book_suffix = book_name.split('.')[-1]
+    @staticmethod
+    def time_control(config, branch, scale_factor):
+        return scale_time_control(config.workload, scale_factor, branch)
 
-        # Start position is determined partially by cutechess index
-        pairs = config.workload['distribution']['games-per-cutechess'] // 2
-        start = config.workload['test']['book_index'] + cutechess_idx * pairs
+    @classmethod
+    def engine_settings(cls, config, command, branch, scale_factor, cutechess_idx):
+
+        engine  = config.workload['test'][branch]['engine']
+        control = cls.time_control(config, branch, scale_factor)
+        options = cls.engine_options(config, branch, cutechess_idx)
+
+        # Join options together in the Cutechess format
+        options = ' option.'.join([''] + options)
+        return '-engine dir=Engines/ cmd=./%s proto=uci %s%s name=%s-%s' % (command, control, options, engine, branch)
 
-        return '-openings file=Books/%s format=%s order=random start=%d -srand %d' % (
-            book_name, book_suffix, start, config.workload['test']['book_seed'])
+    @staticmethod
+    def pgnout_settings(config, timestamp, cutechess_idx):
+        return '-pgnout %s' % (Cutechess.pgn_name(config, timestamp, cutechess_idx))
+
+class Fastchess(Cutechess):
+
+    ## Fastchess accepts nearly all of Cutechess' arguments, and is asked to print its
+    ## progress in the Cutechess format, so only the settings which differ are replaced.
+    ## Games read from its PGNs are given Cutechess style move comments before uploading.
+
+    name        = 'fastchess'
+    executables = ('fastchess.exe', 'fastchess')
 
     @staticmethod
-    def engine_settings(config, command, branch, scale_factor, cutechess_idx):
+    def basic_settings(config):
 
-        # Extract configuration from the Workload
-        options = config.workload['test'][branch]['options']
-        network = config.workload['test'][branch]['network']
-        private = config.workload['test'][branch]['private']
-        engine  = config.workload['test'][branch]['engine']
-        syzygy  = config.workload['test']['syzygy_wdl']
+        variant = ['standard', 'fischerandom'][Fastchess.is_frc(config)]
 
-        # Human-readable name, and scale the time control
-        name    = command.replace('.exe', '')
-        control = scale_time_control(config.workload, scale_factor, branch)
+        # Cutechess compatible output, and no config.json left behind by autosaving
+        return '-recover -variant %s -output format=cutechess -autosaveinterval 0' % (variant)
 
-        # Private engines, when using Networks, must set them via UCI
-        if private and network and network != 'None':
-            options += ' EvalFile=%s' % (os.path.join('../Networks', network))
-            name    += '-%s' % (network)
+    @staticmethod
+    def concurrency_settings(config):
+
+        concurrency = config.workload['distribution']['concurrency-per']
+        games       = config.workload['distribution']['games-per-cutechess']
+
+        # Games are scheduled in rounds, which are a pair of games when repeating
+        if Fastchess.plays_reverses(config):
+            return '-concurrency %d -rounds %d -repeat' % (concurrency, games // 2)
+
+        return '-concurrency %d -rounds %d -games 1' % (concurrency, games)
+
+    @staticmethod
+    def time_control(config, branch, scale_factor):
+
+        # Fixed nodes and depth need no clock at all
+        return scale_time_control(config.workload, scale_factor, branch).replace('tc=inf ', '')
+
+    @staticmethod
+    def pgnout_settings(config, timestamp, cutechess_idx):
+        fname = Fastchess.pgn_name(config, timestamp, cutechess_idx)
+        return '-pgnout file=%s nodes=true seldepth=true' % (fname)
+
+    @staticmethod
+    def convert_comment(match):
+
+        # Score/Depth Time, n=Nodes, sd=SelDepth => Score Depth/SelDepth Milliseconds Nodes
+        score, depth, seconds, extras = match.groups()
+        nodes    = re.search(r'\bn=(\d+)', extras)
+        seldepth = re.search(r'\bsd=(\d+)', extras)
+
+        return '{%s %s/%s %d %s}' % (
+            score, depth, seldepth.group(1) if seldepth else depth,
+            round(float(seconds) * 1000), nodes.group(1) if nodes else 0)
+
+    @staticmethod
+    def pgn_text(text):
+        return REGEX_FASTCHESS_COMMENT.sub(Fastchess.convert_comment, text)
+
+class NativeRunner(MatchRunner):
+
+    ## Plays the games from within the Client, see native_runner.py
+
+    name = 'native'
+
+    @classmethod
+    def play(cls, config, dev_name, base_name, scale_factor, timestamp, cutechess_idx, pipeline, abort_flag, cpus=None):
+        run_native_match(config, dev_name, base_name, scale_factor, timestamp, cutechess_idx, pipeline, abort_flag, cpus)
+
+## Every backend which may be selected by the Worker, or by a Test
+
+MATCH_RUNNERS = { runner.name : runner for runner in [Cutechess, Fastchess, NativeRunner] }
+
+class PGNHelper:
+
+    @staticmethod
+    def slice_pgn_text(text):
+
+        lines = iter(text.splitlines())
+
+        while True:
+
+            headers = list(iter(lambda: next(lines, '').rstrip(), ''))
+            moves   = list(iter(lambda: next(lines, '').rstrip(), ''))
+
+            if not headers or not moves:
+                break
+
+            yield (headers, moves)
+
+    @staticmethod
+    def get_pgn_header(sliced_headers, header):
+        for line in sliced_headers:
+            if line.startswith('[%s ' % header):
+                return line.split('"')[1]
+
+    @staticmethod
+    def get_error_reason(sliced_headers):
+
+        reason = PGNHelper.get_pgn_header(sliced_headers, 'Termination')
+
+        if reason and 'abandoned' in reason:
+            return 'Disconnect'
+
+        if reason and 'stalled' in reason:
+            return 'Stalled'
+
+        if reason and 'illegal' in reason:
+            return 'Illegal Move'
+
+    @staticmethod
+    def get_error_signature(sliced_headers, reason):
+
+        # Blame whichever engine lost the game, when there was a loser
+        result = PGNHelper.get_pgn_header(sliced_headers, 'Result')
+        player = { '1-0' : 'Black', '0-1' : 'White' }.get(result)
+
+        if not player:
+            return reason
+
+        return '%s by %s' % (reason, PGNHelper.get_pgn_header(sliced_headers, player))
+
+    @staticmethod
+    def pretty_format(headers, moves):
+        return '\n'.join(headers + [''] + moves)
+
+class ResultsJournal(object):
+
+    ## Append-only log of every result payload handed to the ResultsUploader, and of every
+    ## acknowledgement from the server. Payloads still lacking an acknowledgement when the
+    ## worker dies are replayed after a restart, via replay_results_journal()
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write_entry(self, entry):
+
+        # Lead with a newline, so that a torn write can only ever corrupt itself
+        with self.lock, open(self.path, 'a') as fout:
+            fout.write('\n' + json.dumps(entry))
+            fout.flush()
+            os.fsync(fout.fileno())
+
+    def append(self, payload):
+        entry_id = uuid.uuid4().hex
+        self.write_entry({ 'id' : entry_id, 'time' : time.time(), 'payload' : payload })
+        return entry_id
+
+    def acknowledge(self, entry_id):
+        self.write_entry({ 'ack' : entry_id })
+
+    def pending(self):
+
+        entries = {}
+
+        if not os.path.isfile(self.path):
+            return []
+
+        with self.lock, open(self.path) as fin:
+            for line in filter(str.strip, fin):
+
+                try: entry = json.loads(line)
+                except json.decoder.JSONDecodeError:
+                    continue # Torn write from a crash
+
+                if 'ack' in entry:
+                    entries.pop(entry['ack'], None)
+                else:
+                    entries[entry['id']] = entry
+
+        return list(entries.values())
+
+    def compact(self):
+
+        # Rewrite the journal to contain only the pending entries, or nothing at all
+        pending = self.pending()
+
+        with self.lock:
+
+            if not pending and os.path.isfile(self.path):
+                os.remove(self.path)
+
+            elif pending:
+                with open(self.path + '.tmp', 'w') as fout:
+                    fout.writelines(json.dumps(entry) + '\n' for entry in pending)
+                os.replace(self.path + '.tmp', self.path)
+
+class ResultsUploader(threading.Thread):
+
+    ## Sends results and heartbeats to the server, without ever blocking the thread that
+    ## drains the results Queue. Every payload is journaled before being queued for upload,
+    ## and only acknowledged in the journal once the server has accepted it
+
+    def __init__(self, config, abort_flag):
+
+        self.config     = config
+        self.abort_flag = abort_flag
+        self.journal    = ResultsJournal()
+        self.outbox     = queue.Queue()
+        self.deadline   = float('inf')
+        self.error      = None
+
+        super().__init__(daemon=True)
+
+    def submit_results(self, payload):
+        self.outbox.put((self.journal.append(payload), payload))
+
+    def submit_heartbeat(self):
+
+        # Heartbeats are redundant if anything else is waiting to be sent
+        if self.outbox.empty():
+            self.outbox.put((None, None))
+
+    def finish(self, timeout):
+
+        # Give the uploader a chance to flush everything, anything else stays journaled
+        self.deadline = time.time() + timeout
+        self.outbox.put(False)
+        self.join()
+
+        if self.error:
+            raise self.error
+
+    def send(self, entry_id, payload):
+
+        if entry_id is None:
+            response = ServerReporter.report_heartbeat(self.config)
+
+        else:
+            response = ServerReporter.report_results(self.config, payload, entry_id)
+            response.raise_for_status()
+            self.journal.acknowledge(entry_id)
+
+        # If the test ended, kill all tasks
+        if 'stop' in response.json():
+            self.abort_flag.set()
+
+    def run(self):
+
+        while (item := self.outbox.get()) is not False:
+
+            # Once aborted, leave everything else in the journal to be replayed
+            if self.abort_flag.is_set():
+                continue
+
+            while True:
+
+                try:
+                    self.send(*item)
+                    break
+
+                except (BadVersionException, utils.OpenBenchFatalWorkerException) as error:
+                    self.error = error
+                    self.abort_flag.set()
+                    return
+
+                except Exception:
+                    traceback.print_exc()
+                    print ('[Note] Failed to upload results to server...')
+
+                # Heartbeats are not retried, and Results only until aborted or out of time
+                if item[0] is None or time.time() > self.deadline:
+                    break
+
+                if self.abort_flag.wait(timeout=self.config.pacing['retry_after']):
+                    break
+
+class ResultsPipeline(object):
+
+    ## Thread-safe hand-off of results from the Cutechess threads to the ResultsReporter.
+    ## Producers notify a Condition, so the reporter wakes up the moment a result arrives,
+    ## or the moment a Cutechess thread exits, instead of polling on a timeout
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.results   = []
+        self.signalled = False
+
+    def put(self, result):
+        with self.condition:
+            self.results.append(result)
+            self.condition.notify()
+
+    def signal(self):
+        with self.condition:
+            self.signalled = True
+            self.condition.notify()
+
+    def wait(self, timeout):
+
+        # Block until there are results, or a signal, or the timeout expires
+        with self.condition:
+            self.condition.wait_for(lambda: self.results or self.signalled, timeout=timeout)
+            results, self.results, self.signalled = self.results, [], False
+            return results
+
+class ResultsReporter(object):
+
+    ## Handles idle looping while waiting on the ResultsPipeline that the Cutechess
+    ## workers place results into. Results are handed off to a ResultsUploader. Errors
+    ## found in the PGNs are reported separately, by the PGNUploader, as games finish.
+
+    def __init__(self, config, tasks, pipeline, abort_flag, prefetcher=None):
+        self.config     = config
+        self.tasks      = tasks
+        self.pipeline   = pipeline
+        self.abort_flag = abort_flag
+        self.prefetcher = prefetcher
+        self.uploader   = ResultsUploader(config, abort_flag)
+
+    def process_until_finished(self):
+
+        self.last_report = 0
+        self.pending     = []
+        self.games       = 0
+
+        # Prefetching begins after most games, or once any copy of Cutechess is idle
+        distribution     = self.config.workload['distribution']
+        self.total_games = distribution['cutechess-count'] * distribution['games-per-cutechess']
+
+        # Don't report until finished, for BULK SPSA tests
+        self.bulk = self.config.workload['test']['type'] == 'SPSA'
+        self.bulk = self.bulk and self.config.workload['reporting_type'] == 'BULK'
+
+        # Sleep until the next report is due, but wake up to check for openbench.exit
+        def time_until_report():
+            report_interval = self.config.pacing['report_interval']
+            return max(0, min(5, self.last_report + report_interval - time.time()))
+
+        self.uploader.start()
+
+        # Collect results until all Tasks are done
+        while any(not task.done() for task in self.tasks):
+
+            results = self.pipeline.wait(timeout=time_until_report())
+            self.pending.extend(results)
+            self.games += sum(sum(x['trinomial']) for x in results)
+
+            if self.prefetcher and (self.games >= PREFETCH_FRACTION * self.total_games
+                                    or any(task.done() for task in self.tasks)):
+                self.prefetcher.trigger()
+
+            # Send results, or a heartbeat, as often as the Server asks until done
+            self.send_results(report_interval=self.config.pacing['report_interval'])
+
+            # Test was stopped by the server, or the uploader hit a fatal error
+            if self.abort_flag.is_set():
+                return self.uploader.finish(timeout=0)
+
+            # Kill everything if openbench.exit is created
+            if os.path.isfile('openbench.exit'):
+                self.abort_flag.set()
+                return self.uploader.finish(timeout=0)
+
+        # Exhaust the Results Pipeline completely since Tasks are done
+        self.pending.extend(self.pipeline.wait(timeout=0))
+
+        # Send any remaining results immediately, allowing some time to finish uploads
+        self.send_results(report_interval=0, final_report=True)
+        self.uploader.finish(timeout=REPORT_INTERVAL)
+
+    def send_results(self, report_interval, final_report=False):
+
+        # Do not send more often than report_interval dictates
+        if self.last_report + report_interval > time.time():
+            return
+
+        # Heartbeat when no results, or still awaiting bulk results
+        if not self.pending or (self.bulk and not final_report):
+            self.uploader.submit_heartbeat()
+
+        else: # Send all of the queued Results at once
+            self.uploader.submit_results(ServerReporter.results_payload(self.config, self.pending))
+            self.pending = []
 
-        # Set the SyzygyPath if we have them, and are allowed to use them
-        if syzygy != 'DISABLED' and config.syzygy_max:
-            options += ' SyzygyPath=%s' % (config.syzygy_path.replace('\\', '\\\\'))
+        self.last_report = time.time()
 
-        # Set a SyzygyProbeLimit if we may only use up-to N-Man
-        if syzygy != 'DISABLED' and syzygy != 'OPTIONAL':
-            options += ' SyzygyProbeLimit=%s' % (syzygy.split('-')[0])
+def select_pgn_codec(config):
 
-        # Add any of the custom SPSA settings
-        if config.workload['test']['type'] == 'SPSA':
-            for param, data in config.workload['spsa'].items():
-                options += ' %s=%s' % (param, str(data[branch][cutechess_idx]))
+    # Older Servers do not negotiate, and only accept bz2
+    offer = config.workload.get('pgn', { 'codecs' : ['bz2'], 'levels' : {}, 'dictionary' : 0 })
+    name  = pgn_util.select_pgn_codec(offer['codecs'])
+    level = offer['levels'].get(name, pgn_util.PGN_CODEC_DEFAULT.level)
 
-        # Join options together in the Cutechess format
-        options = ' option.'.join([''] + re.findall(r'"[^"]*"|\S+', options))
-        return '-engine dir=Engines/ cmd=./%s proto=uci %s%s name=%s-%s' % (command, control, options, engine, branch)
+    if name != 'zstd' or not offer['dictionary']:
+        return pgn_util.PGNCodec(name, level, None)
 
-    @staticmethod
-    def pgnout_settings(config, timestamp, cutechess_idx):
-        return '-pgnout %s' % (Cutechess.pgn_name(config, timestamp, cutechess_idx))
+    try: # Compressing without the dictionary is always acceptable to the Server
+        credentials = (config.server, config.username, config.password)
+        dict_path   = os.path.join(config.cache_dir, 'pgn.%d.dict' % (offer['dictionary']))
+        dictionary  = utils.download_pgn_dictionary(*credentials, offer['dictionary'], dict_path)
 
-    @staticmethod
-    def update_results(results, line):
+    except Exception:
+        print ('[Note] Unable to fetch PGN dictionary %d' % (offer['dictionary']))
+        dictionary = None
 
-        # Given any game #, find the other in the pair
-        def game_to_pair(g):
-            return (g, g+1) if g % 2 else (g-1, g)
+    return pgn_util.PGNCodec(name, level, dictionary)
 
-        # Find the Pentanomial index given a game pair
-        def pair_to_penta(r1, r2):
-            lookup = { '0-1' : 0, '1/2-1/2' : 1, '1-0' : 2 }
-            return lookup[r1] + 2 - lookup[r2]
+class PGNStream(threading.Thread):
 
-        # Find the Trinomial indices, from our POV, for a give game pair
-        def pair_to_trinomial(r1, r2):
-            lookup = { '0-1' : 0, '1/2-1/2' : 1, '1-0' : 2 }
-            return lookup[r1], 2 - lookup[r2]
+    ## Reads the PGN written by each copy of the runner while its games are being played,
+    ## and hands each batch of complete games to a callback, exactly once. With --pgn-fifo
+    ## on Linux, each PGN is a named pipe, so games never touch the disk at all. Otherwise,
+    ## the files are tailed from where the previous read ended. We hold the write end of
+    ## each pipe open ourselves, so that runners opening the PGN once per game never cause
+    ## an early EOF, and only release them once every runner has exited. A runner blocks
+    ## whenever its pipe is full, so the callback is never allowed to end this thread.
 
-        # Extract the game # and result str from a Cutechess line
-        def parse_finished_game(line):
-            tokens = line.split()
-            return int(tokens[2]), tokens[6]
+    def __init__(self, runner, pgn_files, on_games, use_fifo):
+        threading.Thread.__init__(self, daemon=True)
+        self.runner     = runner
+        self.pgn_files  = pgn_files
+        self.on_games   = on_games
+        self.use_fifo   = use_fifo and IS_LINUX
+        self.buffers    = { fname : b'' for fname in pgn_files }
+        self.received   = { fname : 0 for fname in pgn_files }
+        self.stop_event = threading.Event()
+        self.writers    = []
 
-        # Parse for errors resulting in adjudication
-        reason = line.split(':')[1]
-        results['crashes'   ] += 'disconnect' in reason or 'stalls' in reason
-        results['timelosses'] += 'on time' in reason
-        results['illegals'  ] += 'illegal' in reason
+        if self.use_fifo:
+            self.open_fifos()
 
-        # Parse Game # and result, and save
-        game, result = parse_finished_game(line)
-        results['games'][game] = result
+    def open_fifos(self):
 
-        # Check to see if the Pair has finished
-        first, second = game_to_pair(game)
-        if first not in results['games'] or second not in results['games']:
-            return
+        self.selector = selectors.DefaultSelector()
 
-        # Get the indices for the Pentanomial, and the two for Trinomial
-        p = pair_to_penta(results['games'][first], results['games'][second])
-        t1, t2 = pair_to_trinomial(results['games'][first], results['games'][second])
+        for fname in self.pgn_files:
 
-        # Update everything
-        results['trinomial'  ][t1] += 1
-        results['trinomial'  ][t2] += 1
-        results['pentanomial'][p ] += 1
+            if os.path.exists(fname):
+                os.remove(fname)
+            os.mkfifo(fname)
 
-        # Clean up results['games']
-        del results['games'][first]
-        del results['games'][second]
+            # The read end must exist before a non-blocking write end can be opened
+            reader = os.open(fname, os.O_RDONLY | os.O_NONBLOCK)
+            self.writers.append(os.open(fname, os.O_WRONLY | os.O_NONBLOCK))
+            self.selector.register(reader, selectors.EVENT_READ, fname)
 
-    @staticmethod
-    def kill_everything(dev_process, base_process):
+    def feed(self, fname, data, final=False):
 
-        if IS_LINUX:
-            utils.kill_process_by_name('cutechess-ob')
+        # Once the runners have exited, anything left is a complete game
+        buffer = self.buffers[fname] + data
+        length = len(buffer) if final else pgn_util.complete_games_length(buffer)
 
-        if IS_WINDOWS:
-            utils.kill_process_by_name('cutechess-ob.exe')
+        self.buffers[fname]   = buffer[length:]
+        self.received[fname] += len(data)
 
-        utils.kill_process_by_name(dev_process)
-        utils.kill_process_by_name(base_process)
+        if not length:
+            return
 
-    @staticmethod
-    def pgn_name(config, timestamp, cutechess_idx):
+        try: self.on_games(buffer[:length].decode('utf-8'))
+        except Exception: traceback.print_exc()
 
-        test_id   = int(config.workload['test']['id'])
-        result_id = int(config.workload['result']['id'])
+    def read_files(self, final=False):
 
-        # Format: <Test>-<Result>-<Time>-<Index>.pgn
-        return 'PGNs/%d.%d.%d.%d.pgn' % (test_id, result_id, timestamp, cutechess_idx)
+        for fname in filter(os.path.isfile, self.pgn_files):
+            with open(fname, 'rb') as fin:
+                fin.seek(self.received[fname])
+                self.feed(fname, fin.read(), final)
+
+    def read_fifos(self):
+
+        # Pipes only report EOF once both the runner and stop() have closed the write end
+        while self.selector.get_map():
+            for key, mask in self.selector.select(timeout=PGN_POLL_INTERVAL):
+
+                if data := os.read(key.fd, PGN_PIPE_READ_SIZE):
+                    self.feed(key.data, data)
+                    continue
+
+                self.selector.unregister(key.fd)
+                os.close(key.fd)
+                self.feed(key.data, b'', final=True)
+
+        self.selector.close()
+
+    def run(self):
+
+        if self.use_fifo:
+            return self.read_fifos()
+
+        # Keep reading until stopped, and then once more for anything written since
+        while not self.stop_event.wait(PGN_POLL_INTERVAL):
+            self.read_files()
+        self.read_files(final=True)
+
+    def stop(self):
+
+        # Called once every runner has exited, to drain whatever is left
+        self.stop_event.set()
+        for fd in self.writers:
+            os.close(fd)
+
+        self.writers = []
+        self.join()
+
+        # Named pipes hold nothing once drained
+        if self.use_fifo:
+            pgn_util.delete_list_of_pgns(self.pgn_files)
+
+    def missing(self):
+        return [fname for fname in self.pgn_files if not self.received[fname]]
+
+class PGNChunk(object):
+
+    ## Games destined for one upload, kept as text until the chunk is finished. They are then
+    ## compressed in batches with pgn_util.compress_list_of_pgn_texts(), which drops games
+    ## beyond the limit on compressed bytes. When the Server asks for them, the games are
+    ## also encoded as binary game records.
+
+    def __init__(self, uploader):
+        self.uploader = uploader
+        self.texts    = []
+
+    def add(self, text):
+        self.texts.append(text)
+
+    def finish(self, processes=1):
+
+        # Batches are only compressed in parallel once the games are over, see PGNUploader
+        batches    = pgn_util.batch_pgn_texts(self.texts) or ['']
+        compressed = pgn_util.compress_list_of_pgn_texts(batches,
+            self.uploader.scale_factor, self.uploader.compact, processes, codec=self.uploader.codec)
+
+        records = self.uploader.compress_records(self.texts) if self.uploader.records else None
+        return compressed, records
+
+class PGNUploader(threading.Thread):
+
+    ## Receives the games of a Workload from a PGNStream, as they are finished. Games with
+    ## an abnormal Termination are reported to the Server within seconds, rather than after
+    ## the Workload, in batches counted by failure signature. Only the first game with each
+    ## signature is logged in full. A batch keeps its id until the Server accepts it, so that
+    ## a retried batch is never counted twice. When the Test wants PGNs, every game is
+    ## compressed into the current chunk, and the chunks are uploaded every
+    ## PGN_UPLOAD_INTERVAL seconds, each with a sequence number so that the Server can
+    ## reassemble them in order. Chunks that fail to upload are retried, in order, before any
+    ## newer one. Every chunk of a Workload uses the same codec, negotiated with the Server
+    ## when the uploader is created. When the Server asks for them, each chunk carries a
+    ## block of binary game records as well.
+
+    def __init__(self, config, runner, pgn_files, scale_factor):
+        threading.Thread.__init__(self, daemon=True)
+        self.config       = config
+        self.runner       = runner
+        self.pgn_files    = pgn_files
+        self.scale_factor = scale_factor
+        self.upload_pgns  = config.workload['test']['upload_pgns'] != 'FALSE'
+        self.compact      = config.workload['test']['upload_pgns'] == 'COMPACT'
+        self.codec        = select_pgn_codec(config) if self.upload_pgns else None
+        self.records      = config.workload.get('pgn', {}).get('records', False)
+        self.sequence     = 0
+        self.lock         = threading.Lock()
+        self.errors       = []
+        self.error_batch  = None
+        self.signatures   = set()
+        self.pending      = []
+        self.chunk        = PGNChunk(self) if self.upload_pgns else None
+        self.wake         = threading.Event()
+        self.stop_event   = threading.Event()
+        self.stream       = PGNStream(runner, pgn_files, self.add_games, config.pgn_fifo)
+
+    def add_games(self, text):
+
+        # Called by the PGNStream, so this must never wait on the Server
+        errors = [
+            (PGNHelper.get_error_signature(headers, reason), PGNHelper.pretty_format(headers, moves))
+                for headers, moves in PGNHelper.slice_pgn_text(text)
+                    if (reason := PGNHelper.get_error_reason(headers))
+        ]
+
+        with self.lock:
+            self.errors += errors
+            if self.chunk:
+                self.chunk.add(self.runner.pgn_text(text))
+
+        if errors:
+            self.wake.set()
+
+    def report_errors(self):
+
+        # A batch which failed to send is retried as it was, before any newer errors
+        while True:
 
+            self.error_batch = self.error_batch or self.build_error_batch()
+            if not self.error_batch:
+                break
 
-class PGNHelper:
+            batch_id, counts, logs, signatures = self.error_batch
+            response = ServerReporter.report_engine_errors(self.config, counts, logs, batch_id)
 
-    @staticmethod
-    def slice_pgn_file(file):
+            # Signatures only count as logged once the Server has them, else the batch is retried
+            if response is None or not response.ok:
+                break
 
-        if not os.path.isfile(file):
-            reason = 'Unable to find %s. Cutechess exited with no finished games.' % (file)
-            raise utils.OpenBenchMisssingPGNException(reason)
+            self.signatures |= signatures
+            self.error_batch = None
 
-        with open(file) as pgn:
+    def build_error_batch(self):
 
-            while True:
+        with self.lock:
+            errors, self.errors = self.errors, []
 
-                headers = list(iter(lambda: pgn.readline().rstrip(), ''))
-                moves   = list(iter(lambda: pgn.readline().rstrip(), ''))
+        if not errors:
+            return None
 
-                if not headers or not moves:
-                    break
+        # Identical failures are counted, and only the first of each is logged in full
+        counts, logs, signatures = collections.Counter(), [], set()
+        for signature, game in errors:
+            counts[signature] += 1
+            if signature not in self.signatures | signatures:
+                signatures.add(signature)
+                logs.append('[%s]\n%s\n\n' % (signature, game))
 
-                yield (headers, moves)
+        logs = bz2.compress(''.join(logs).encode()) if logs else None
+        return uuid.uuid4().hex, dict(counts), logs, signatures
 
-    @staticmethod
-    def get_pgn_header(sliced_headers, header):
-        for line in sliced_headers:
-            if line.startswith('[%s ' % header):
-                return line.split('"')[1]
+    def upload(self, final=False):
 
-    @staticmethod
-    def get_error_reason(sliced_headers):
+        with self.lock:
+            chunk, self.chunk = self.chunk, PGNChunk(self)
 
-        reason = PGNHelper.get_pgn_header(sliced_headers, 'Termination')
+        # Always send the final chunk, so the Server knows how many to expect. Chunks made
+        # while playing are compressed on one core, and the final chunk on all of them
+        if chunk.texts or final:
+            self.pending.append(chunk.finish(None if final else 1))
 
-        if reason and 'abandoned' in reason:
-            return 'Disconnect'
+        while self.pending:
 
-        if reason and 'stalled' in reason:
-            return 'Stalled'
+            compressed, records = self.pending[0]
+            last     = final and len(self.pending) == 1
+            response = ServerReporter.report_pgn(self.config, compressed, self.sequence, last, self.codec, records)
 
-        if reason and 'illegal' in reason:
-            return 'Illegal Move'
+            if response is None or not response.ok:
+                break
 
-    @staticmethod
-    def pretty_format(headers, moves):
-        return '\n'.join(headers + [''] + moves)
+            self.pending.pop(0)
+            self.sequence += 1
 
-class ResultsReporter(object):
+    def compress_records(self, texts):
+        test_id, result_id = self.config.workload['test']['id'], self.config.workload['result']['id']
+        return game_records.compress_pgn_texts(texts, self.scale_factor, self.compact, test_id, result_id, self.codec)
 
-    ## Handles idle looping while reading from the results Queue that the Cutechess
-    ## workers place results into. Once finished, this class can be used to collect
-    ## all of the errors in the PGN, and send htem back to the server.
+    def start(self):
+        self.stream.start()
+        threading.Thread.start(self)
 
-    def __init__(self, config, tasks, results_queue, abort_flag):
-        self.config        = config
-        self.tasks         = tasks
-        self.results_queue = results_queue
-        self.abort_flag    = abort_flag
+    def run(self):
 
-    def process_until_finished(self):
+        last_upload = time.time()
 
-        self.last_report = 0
-        self.pending     = []
+        # Woken early only to report errors; PGNs are uploaded on their own schedule
+        while not self.stop_event.is_set():
 
-        # Don't report until finished, for BULK SPSA tests
-        self.bulk = self.config.workload['test']['type'] == 'SPSA'
-        self.bulk = self.bulk and self.config.workload['reporting_type'] == 'BULK'
+            # A broken engine fails many games at once, so gather them into one report
+            if self.wake.wait(PGN_UPLOAD_INTERVAL):
+                self.stop_event.wait(PGN_ERROR_DELAY)
+            self.wake.clear()
 
-        # Block up-to 5 seconds to get a new result
-        def get_next_result():
-            try: return self.results_queue.get(timeout=5)
-            except queue.Empty: return False
+            try:
+                self.report_errors()
+                if self.upload_pgns and time.time() - last_upload >= PGN_UPLOAD_INTERVAL:
+                    self.upload()
+                    last_upload = time.time()
 
-        # Collect results until all Tasks are done
-        while any(not task.done() for task in self.tasks):
+            except Exception: print('[Note] Unable to upload PGNs, retrying later')
 
-            result = get_next_result()
-            if result:
-                self.pending.append(result)
+    def stop(self):
+        self.stream.stop()
+        self.stop_event.set()
+        self.wake.set()
+        self.join()
 
-            # Send results, or a heartbeat, every REPORT_INTERVAL seconds until done
-            if self.send_results(report_interval=REPORT_INTERVAL):
-                return
+    def finish(self):
 
-            # Kill everything if openbench.exit is created
-            if os.path.isfile('openbench.exit'):
-                return self.abort_flag.set()
+        # No more games are coming, so report any last errors, and send the final chunk
+        self.stop()
+        self.report_errors()
+        if self.upload_pgns:
+            self.upload(final=True)
 
-        # Exhaust the Results Queue completely since Tasks are done
-        while True:
-            result = get_next_result()
-            if result:
-                self.pending.append(result)
-            else:
-                break
+        # PGN files are left on disk, unless every chunk was uploaded
+        missing = self.stream.missing()
+        if self.upload_pgns and self.pending:
+            print('[Note] Unable to upload %d PGN chunks, keeping %s' % (len(self.pending), ', '.join(self.pgn_files)))
 
-        # Send any remaining results immediately
-        self.send_results(report_interval=0, final_report=True)
+        elif self.upload_pgns and not self.stream.use_fifo:
+            pgn_util.delete_list_of_pgns(filter(os.path.isfile, self.pgn_files))
 
-    def send_results(self, report_interval, final_report=False):
+        if missing:
+            reason = 'Unable to find %s. %s exited with no finished games.' % (missing[0], self.runner.name)
+            raise utils.OpenBenchMisssingPGNException(reason)
 
-        # Do not send more often than report_interval dictates
-        if self.last_report + report_interval > time.time():
-            return False
+class WorkloadPrefetcher(threading.Thread):
 
-        try:
+    ## Peeks at the next Workload the server would assign, and acquires its book, Networks,
+    ## and Engines in the background, while the current Workload plays its final games.
+    ## Artifacts land in the Cache, Books/, Networks/, and Engines/, so that setup of the
+    ## next Workload is nearly instant. Failures are quiet, and will simply reoccur, and
+    ## be reported, if and when the Workload is actually assigned to us.
 
-            # Heartbeat when no results, or still awaiting bulk results
-            if not self.pending or (self.bulk and not final_report):
-                response = ServerReporter.report_heartbeat(self.config).json()
-                self.last_report = time.time()
+    def __init__(self, config):
+        threading.Thread.__init__(self, daemon=True)
+        self.config    = config
+        self.triggered = False
 
-            else: # Send all of the queued Results at once
-                response = ServerReporter.report_results(self.config, self.pending).json()
-                self.last_report = time.time()
-                self.pending = []
+    def trigger(self):
 
-            # If the test ended, kill all tasks
-            if 'stop' in response:
-                self.abort_flag.set()
+        if not self.triggered:
+            self.triggered = True
+            self.start()
 
-            # Signal an exit if the test ended
-            return 'stop' in response
+    def finish(self):
 
-        except (BadVersionException, utils.OpenBenchFatalWorkerException):
-            raise
+        # Never allow two setups of the same artifacts to overlap
+        if self.triggered:
+            self.join()
 
-        except Exception:
-            traceback.print_exc()
-            print ('[Note] Failed to upload results to server...')
-            self.last_report = time.time()
+    def run(self):
 
-    def send_errors(self, timestamp, cutechess_cnt):
+        try:
+            workload = server_peek_workload(self.config)
 
-        for x in range(cutechess_cnt):
+            # Artifacts for a repeated assignment are already in place
+            if not workload or workload['test']['id'] == self.config.workload['test']['id']:
+                return
 
-            # Reuse logic that was given to Cutechess to decide the PGN name
-            fname = Cutechess.pgn_name(self.config, timestamp, x)
+            print('\nPrefetching Workload [%s] %s vs [%s] %s' % (
+                workload['test']['dev' ]['engine'], workload['test']['dev' ]['name'],
+                workload['test']['base']['engine'], workload['test']['base']['name']))
 
-            # For any game with weird Termination, report it
-            for header, moves in PGNHelper.slice_pgn_file(fname):
-                error = PGNHelper.get_error_reason(header)
-                if error:
-                    as_str = PGNHelper.pretty_format(header, moves)
-                    ServerReporter.report_engine_error(self.config, error, as_str)
+            # Shares the Cache, but must not report, nor blacklist, on our behalf
+            config             = copy.copy(self.config)
+            config.workload    = workload
+            config.prefetching = True
+            config.blacklist   = list(self.config.blacklist)
 
+            # Games are still being played, so only build with a single thread
+            safe_setup_workload(config, jobs=1)
+
+        except Exception:
+            print('[Note] Unable to prefetch the next Workload')
 
 def get_version(program):
 
@@ -717,30 +1526,99 @@ def get_version(program):
         stdout  = process.communicate()[0].decode('utf-8')
         return re.search(r'\d+\.\d+(\.\d+)?', stdout).group()
 
-def locate_utility(util, force_exit=True, report_error=True):
+def program_stamp(program):
+
+    # Resolve links too, so that changing the target of a link changes the stamp
+    if not (path := shutil.which(program)):
+        return None
+
+    stat = os.stat(os.path.realpath(path))
+    return [path, os.path.realpath(path), stat.st_size, stat.st_mtime_ns]
+
+def probe_version(probes, program, strict=True):
+
+    # Versions only change with the binary, so probe each binary once
+    def version():
+        try: return get_version(program)
+        except Exception: return None
+
+    stamp = program_stamp(program)
+    found = probes.probe('version %s' % (program), stamp, version) if stamp else None
 
-    try: return get_version(util)
+    if found is None and strict:
+        raise OSError('Unable to find a version for %s' % (program))
+
+    return found
+
+def cpu_stamp(config):
+
+    # The CPU can only change across a reboot, or a move to another machine
+    boot_time = int(round(psutil.boot_time() / 60))
+    return [config.mac_address, config.os_ver, config.logical_cores, boot_time, cpuinfo.CPUINFO_VERSION_STRING]
+
+def probe_cpu_info():
+
+    info = cpuinfo.get_cpu_info()
+    return { 'flags' : info.get('flags', []), 'brand' : info.get('brand_raw', info.get('brand', 'Unknown')) }
+
+def locate_utility(util, force_exit=True, report_error=True, probes=None):
+
+    try: return probe_version(probes, util) if probes else get_version(util)
 
     except Exception:
         if report_error: print('[Error] Unable to locate %s' % (util))
         if force_exit: sys.exit()
 
-def set_cutechess_permissions():
+def set_runner_permissions(runner='cutechess-ob'):
 
-    status = os.system('sudo -n chmod 777 cutechess-ob > /dev/null 2>&1')
+    status = os.system('sudo -n chmod 777 %s > /dev/null 2>&1' % (runner))
 
     if status != 0:
-        status = os.system('chmod 777 cutechess-ob > /dev/null 2>&1')
+        status = os.system('chmod 777 %s > /dev/null 2>&1' % (runner))
 
     if status != 0:
-        print ('[ERROR] Unable to set execute permissions on cutechess-ob')
+        print ('[ERROR] Unable to set execute permissions on %s' % (runner))
+
+def replay_results_journal(config):
+
+    # Results from a previous session, which the server never acknowledged
+    journal = ResultsJournal()
+    pending = journal.pending()
+
+    if pending:
+        print ('\nReplaying %d unacknowledged Result(s)...' % (len(pending)))
+
+    for entry in pending:
+
+        # Stale results are not worth sending, since the test has likely moved on
+        if time.time() - entry['time'] > JOURNAL_MAX_AGE:
+            journal.acknowledge(entry['id'])
+            continue
+
+        try:
+            response = ServerReporter.report_results(config, entry['payload'], entry['id'])
+            response.raise_for_status()
+            journal.acknowledge(entry['id'])
+
+        except BadVersionException:
+            raise
+
+        # Rejected outright, so retrying would only block every later Workload
+        except utils.OpenBenchFatalWorkerException as error:
+            print ('[Note] Discarding results rejected by the server: %s' % (error))
+            journal.acknowledge(entry['id'])
+
+        except Exception: # Left in the journal, to try again later
+            traceback.print_exc()
+            print ('[Note] Failed to replay results to server...')
 
+    journal.compact()
 
-def cleanup_client():
+
+def cleanup_client(config):
 
     SECONDS_PER_DAY   = 60 * 60 * 24
     SECONDS_PER_WEEK  = SECONDS_PER_DAY * 7
-    SECONDS_PER_MONTH = SECONDS_PER_WEEK * 4
 
     file_age = lambda x: time.time() - os.path.getmtime(x)
 
@@ -748,15 +1626,52 @@ def cleanup_client():
         if file_age(os.path.join('PGNs', file)) > SECONDS_PER_DAY:
             os.remove(os.path.join('PGNs', file))
 
-    for file in os.listdir('Engines'):
-        if file_age(os.path.join('Engines', file)) > SECONDS_PER_WEEK:
-            os.remove(os.path.join('Engines', file))
+    # Unpacked sources are refreshed each time they are used to build
+    for tree in os.listdir('Sources'):
+        if file_age(os.path.join('Sources', tree)) > SECONDS_PER_WEEK:
+            shutil.rmtree(os.path.join('Sources', tree), ignore_errors=True)
+
+    # Engines and Networks are links into the Cache, touched whenever fetched
+    for folder in ['Engines', 'Networks']:
+        for file in os.listdir(folder):
+            if file_age(os.path.join(folder, file)) > SECONDS_PER_WEEK:
+                os.remove(os.path.join(folder, file))
+
+    # The Cache itself is limited by size, keeping the most recently used files
+    config.cache.evict()
+
+def syzygy_paths(config):
 
-    for file in os.listdir('Networks'):
-        if file_age(os.path.join('Networks', file)) > SECONDS_PER_MONTH:
-            os.remove(os.path.join('Networks', file))
+    # Split paths, using ":" on Unix, and ";" on Windows
+    return config.syzygy_path.split(':' if IS_LINUX else ';')
+
+def syzygy_stamp(paths):
+
+    # Adding or removing a table changes the mtime of the folder holding it
+    stamp = []
+    for path in paths:
+        try: stamp.append([os.path.abspath(path), os.stat(path).st_mtime_ns])
+        except OSError: stamp.append([os.path.abspath(path), None])
+    return stamp
+
+def syzygy_tables(paths):
 
-def validate_syzygy_exists(config, K):
+    # One listing per path, rather than a check for every possible table
+    tables = set()
+    for path in paths:
+        try: tables.update(x.name for x in os.scandir(path) if x.name.endswith(('.rtbw', '.rtbz')))
+        except OSError: continue
+    return tables
+
+def find_syzygy_max(paths):
+
+    # Check until we stop finding valid N-man tables
+    tables, syzygy_max = syzygy_tables(paths), 2
+    while validate_syzygy_exists(tables, syzygy_max+1):
+        syzygy_max = syzygy_max + 1
+    return syzygy_max
+
+def validate_syzygy_exists(tables, K):
 
     letters = ['', 'Q', 'R', 'B', 'N', 'P']
 
@@ -773,19 +1688,9 @@ def validate_syzygy_exists(config, K):
         lhs, rhs = name.replace('K', '9').split('v')
         return int(lhs) >= int(rhs) and name != 'KvK'
 
-    # See if file exists in (any of) the paths
-    def has_filename(paths, name):
-        for path in paths:
-            if os.path.isfile(os.path.join(path, name + '.rtbw')):
-                return True
-        return False
-
-    # Split paths, using ":" on Unix, and ";" on Windows
-    paths = config.syzygy_path.split(':' if IS_LINUX else ';')
-
-    # Check to see if each Syzygy File exists as desired
+    # Check to see if each Syzygy WDL File exists, in (any of) the paths
     for filename in list(filter(valid_filename, set(candidates))):
-        if not has_filename(paths, filename):
+        if filename + '.rtbw' not in tables:
             return False
 
     return True
@@ -850,11 +1755,17 @@ def find_pgn_error(reason, command):
     return data[ii] + pgn
 
 
-def determine_scale_factor(config, dev_name, dev_network, base_name, base_network):
+def engine_threads(config, branch):
+
+    # Threads set in the engine's options, which the Server used to size concurrency
+    match = re.search(r'\bThreads=(\d+)', config.workload['test'][branch]['options'])
+    return int(match.group(1)) if match else 1
 
-    # Run the benchmarks and compute the scaling NPS value
-    dev_nps  = safe_run_benchmarks(config, 'dev' , dev_name , dev_network )
-    base_nps = safe_run_benchmarks(config, 'base', base_name, base_network)
+def determine_scale_factor(config, dev_name, dev_network, base_name, base_network, placement=None):
+
+    # Run the benchmarks, interleaved, and compute the scaling NPS value
+    dev_nps, base_nps = safe_run_benchmarks(config, [
+        ('dev' , dev_name , dev_network ), ('base', base_name, base_network)], placement)
     ServerReporter.report_nps(config, dev_nps, base_nps)
 
     dev_factor = base_factor = None
@@ -887,7 +1798,7 @@ def server_configure_worker(config):
 
     # Server tells us how to build or obtain binaries
     target = utils.url_join(config.server, 'clientGetBuildInfo')
-    data   = requests.get(target, timeout=TIMEOUT_HTTP).json()
+    data   = utils.http_session().get(target).json()
 
     config.scan_for_compilers(data)      # Public engine build tools
     config.scan_for_private_tokens(data) # Private engine access tokens
@@ -924,7 +1835,7 @@ def server_configure_worker(config):
 
     # Send all of this to the server, and get a Machine Id + Secret Token
     target   = utils.url_join(config.server, 'clientWorkerInfo')
-    response = requests.post(target, data=payload, timeout=TIMEOUT_HTTP).json()
+    response = utils.http_session().post(target, data=payload).json()
 
     # Throw all the way back to the client.py
     if 'Bad Client Version' in response.get('error', ''):
@@ -940,11 +1851,14 @@ def server_configure_worker(config):
 
 def server_request_workload(config):
 
-    print('\nRequesting Workload from Server...')
+    stats = utils.http_session().connection_stats()
+    print('\nRequesting Workload from Server... [%d Requests, %d Connections]' % (
+        stats['requests'], stats['connections']))
 
     payload  = { 'machine_id' : config.machine_id, 'secret' : config.secret_token, 'blacklist' : config.blacklist }
     target   = utils.url_join(config.server, 'clientGetWorkload')
-    response = requests.post(target, data=payload, timeout=TIMEOUT_HTTP)
+    response = utils.http_session().post(target, data=payload)
+    ServerReporter.read_pacing(config, response)
 
     # Server errors produce garbage back, which we should not alarm a user with
     try: response = response.json()
@@ -970,71 +1884,197 @@ def server_request_workload(config):
     config.workload = response.get('workload', None)
 
 
-def complete_workload(config):
+def server_peek_workload(config):
 
-    # Download the opening book, throws an exception on corruption
-    utils.download_opening_book(
-        config.workload['test']['book']['sha'   ],
-        config.workload['test']['book']['source'],
-        config.workload['test']['book']['name'  ],
-    )
+    payload  = { 'machine_id' : config.machine_id, 'secret' : config.secret_token, 'blacklist' : config.blacklist }
+    target   = utils.url_join(config.server, 'clientPeekWorkload')
+    response = utils.http_session().post(target, data=payload)
+
+    # Older servers do not offer peeking, which is never an error worth raising
+    try: response = response.json()
+    except json.decoder.JSONDecodeError:
+        return None
+
+    return response.get('workload', None)
+
+def select_match_runner(config):
+
+    # A runner chosen with --runner is always used, whatever the Test requested
+    if config.runner_set:
+        return MATCH_RUNNERS[config.runner]
+
+    # Older Servers will not send a runner, which is the same as DEFAULT
+    requested = config.workload['test'].get('runner', 'DEFAULT').lower()
+    runner    = MATCH_RUNNERS.get(requested)
 
-    # Download each NNUE file, throws an exception on corruption
-    dev_network  = safe_download_network_weights(config, 'dev' )
-    base_network = safe_download_network_weights(config, 'base')
+    if runner and runner.available():
+        return runner
 
-    # Build or download each engine, or exit if an error occured
-    dev_name  = safe_download_engine(config, 'dev' , dev_network )
-    base_name = safe_download_engine(config, 'base', base_network)
+    # Results are accounted for identically, so any runner may play any Test
+    if runner:
+        print('[Note] Test requested %s, which is unavailable. Using %s' % (runner.name, config.runner))
+
+    return MATCH_RUNNERS[config.runner]
+
+def prewarm_workload(config, dev_name, dev_network, base_name, base_network):
+
+    # Engines, which may embed their Networks, followed by the Networks and the book
+    files  = [os.path.join('Engines', dev_name), os.path.join('Engines', base_name)]
+    files += [dev_network, base_network, MatchRunner.opening_book(config, 0)[0]]
+
+    # Syzygy tables, only as large as the Test would ever use, if at all
+    settings = [config.workload['test']['syzygy_wdl'], config.workload['test']['syzygy_adj']]
+    limits   = [config.syzygy_max if x == 'OPTIONAL' else int(x.split('-')[0]) for x in settings if x != 'DISABLED']
+
+    if config.syzygy_max and limits:
+        files += prewarm.syzygy_files(syzygy_paths(config), min(config.syzygy_max, max(limits)))
+
+    budget = config.ram_total_mb * PREWARM_RAM_FRACTION * 1024 ** 2
+    count, size, elapsed = prewarm.prewarm_files(files, budget)
+    print ('\nPrewarmed %d files, %.1f MB, in %.2f seconds' % (count, size / 1024 ** 2, elapsed))
+
+def complete_workload(config):
+
+    # Download the book and Networks, and build or download each Engine, concurrently
+    dev_network, base_network, dev_name, base_name = safe_setup_workload(config)
 
     # Datagen creates a book on-the-fly
     if config.workload['test']['type'] == 'DATAGEN':
         safe_create_genfens_opening_book(config, dev_name, dev_network)
 
-    # Scale time control based on the Engine's local NPS
-    scale_factor = determine_scale_factor(config, dev_name, dev_network, base_name, base_network)
+    # Pull the files read during games into memory, before any benchmarks, if enabled
+    if config.prewarm:
+        prewarm_workload(config, dev_name, dev_network, base_name, base_network)
 
     # Server knows how many copies of Cutechess we should run
     cutechess_cnt   = config.workload['distribution']['cutechess-count']
     concurrency_per = config.workload['distribution']['concurrency-per']
     games_per       = config.workload['distribution']['games-per-cutechess']
 
+    # Each copy of Cutechess gets its own cores, on one NUMA node, if possible, with
+    # enough CPUs for every thread of every engine in its concurrent games
+    placement = None
+    if config.affinity:
+        threads_per = max(engine_threads(config, 'dev'), engine_threads(config, 'base'))
+        placement   = topology.plan_placement(cutechess_cnt, concurrency_per * threads_per)
+
+    # Scale time control based on the Engine's local NPS, benching on those same cores
+    scale_factor = determine_scale_factor(config, dev_name, dev_network, base_name, base_network, placement)
+
+    # Tests may request a runner, unless the Worker was given one with --runner
+    runner = select_match_runner(config)
+
     print () # Record this information
-    print ('%d cutechess copies' % (cutechess_cnt))
+    print ('%d %s copies' % (cutechess_cnt, runner.name))
     print ('%d concurrent games per copy' % (concurrency_per))
-    print ('%d total games per cutechess copy\n' % (games_per))
+    print ('%d total games per cutechess copy' % (games_per))
+    print ('%s CPU affinity\n' % ('Using' if placement else 'No'))
 
-    # Launch and manage all of the Cutechess workers
+    # Prepares the next Workload while this one finishes, if enabled
+    prefetcher = WorkloadPrefetcher(config) if config.prefetch else None
+
+    # Launch and manage all of the copies of the runner
     with ThreadPoolExecutor(max_workers=cutechess_cnt) as executor:
 
         timestamp  = time.time()
-        results    = multiprocessing.Queue()
+        pipeline   = ResultsPipeline()
         abort_flag = threading.Event()
 
-        tasks = [] # Create each of the Cutechess workers
+        # Read games as they finish, reporting errors, and uploading them if requested
+        pgn_files = [runner.pgn_name(config, timestamp, x) for x in range(cutechess_cnt)]
+        uploader  = PGNUploader(config, runner, pgn_files, scale_factor)
+        uploader.start()
+
+        tasks = [] # Create each of the runner's copies, which signal the Pipeline when done
         for x in range(cutechess_cnt):
-            cmd = build_cutechess_command(config, dev_name, base_name, scale_factor, timestamp, x)
-            tasks.append(executor.submit(run_and_parse_cutechess, config, cmd, x, results, abort_flag))
 
-        # Process the Queue until we exit, finish, or are told to stop by the server
+            cpus = placement[x] if placement else None
+            args = (config, dev_name, base_name, scale_factor, timestamp, x, pipeline, abort_flag, cpus)
+
+            tasks.append(executor.submit(runner.play, *args))
+            tasks[-1].add_done_callback(lambda task: pipeline.signal())
+
+        # Process the Pipeline until we exit, finish, or are told to stop by the server
         try:
-            rr = ResultsReporter(config, tasks, results, abort_flag)
+            rr = ResultsReporter(config, tasks, pipeline, abort_flag, prefetcher)
             rr.process_until_finished()
-            rr.send_errors(timestamp, cutechess_cnt)
-            Cutechess.kill_everything(dev_name, base_name)
+            runner.kill_everything(dev_name, base_name)
 
         # Kill everything during an Exception, but print it
         except (Exception, KeyboardInterrupt):
             abort_flag.set()
-            Cutechess.kill_everything(dev_name, base_name)
+            runner.kill_everything(dev_name, base_name)
+            if prefetcher: prefetcher.finish()
+            uploader.stop()
             raise
 
-        # Upload the PGN if requested
-        if config.workload['test']['upload_pgns'] != 'FALSE':
-            compact    = config.workload['test']['upload_pgns'] == 'COMPACT'
-            pgn_files  = [Cutechess.pgn_name(config, timestamp, x) for x in range(cutechess_cnt)]
-            ServerReporter.report_pgn(config, pgn_util.compress_list_of_pgns(pgn_files, scale_factor, compact))
-            pgn_util.delete_list_of_pgns(pgn_files)
+        # Report and upload the remaining games, as the final chunk
+        uploader.finish()
+
+    # Wait for the prefetch, so that it never races the next Workload's setup
+    if prefetcher:
+        prefetcher.finish()
+
+def safe_setup_workload(config, jobs=None):
+
+    # Fetches the book, Networks, and Engines, all at once. Engines must wait on their
+    # Network, which may be embedded into the binary, but fetch sources in the meantime.
+    # Two Engines might build at once, so they must share the available threads
+
+    branches = ['dev', 'base']
+    jobs     = jobs if jobs else max(1, config.threads // len(branches))
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+
+        # Download the opening book, throws an exception on corruption
+        book = executor.submit(utils.download_opening_book,
+            config.workload['test']['book']['sha'   ],
+            config.workload['test']['book']['source'],
+            config.workload['test']['book']['name'  ],
+        )
+
+        # Download each NNUE file, throws an exception on corruption
+        networks = {
+            branch : executor.submit(safe_download_network_weights, config, branch)
+            for branch in branches
+        }
+
+        # Prefetch sources for any Engine we will have to build, at most once each
+        sources = {}
+        for branch in filter(lambda x: engine_needs_sources(config, x), branches):
+            engine = config.workload['test'][branch]['engine']
+            source = config.workload['test'][branch]['source']
+            if source not in sources:
+                sources[source] = executor.submit(utils.cached_source_tree, engine, source)
+
+        # Build or download each engine, after obtaining the sources and Network
+        def engine_task(branch):
+            if (prefetch := sources.get(config.workload['test'][branch]['source'])):
+                wait([prefetch])
+            return safe_download_engine(config, branch, networks[branch].result(), jobs)
+
+        engines = { branch : executor.submit(engine_task, branch) for branch in branches }
+
+        book.result()
+        return (networks['dev'].result(), networks['base'].result(),
+                engines['dev'].result(), engines['base'].result())
+
+def engine_needs_sources(config, branch):
+
+    net_sha  = config.workload['test'][branch]['network']
+    net_path = os.path.join('Networks', net_sha) if net_sha and net_sha != 'None' else None
+
+    # Private engines are never built, and cached engines don't need to be
+    if config.workload['test'][branch]['private']:
+        return False
+
+    bin_name = utils.engine_binary_name(config.workload['test'][branch]['engine'],
+        config.workload['test'][branch]['sha'], net_path, False)
+
+    if utils.check_for_engine_binary(os.path.join('Engines', bin_name)):
+        return False
+
+    return not config.cache.contains(engine_cache_key(config, branch, net_path))
 
 def safe_download_network_weights(config, branch):
 
@@ -1050,23 +2090,63 @@ def safe_download_network_weights(config, branch):
     if not net_sha or net_sha == 'None':
         return None
 
-    credentials = (config.server, config.username, config.password)
-    utils.download_network(*credentials, engine, net_name, net_sha, net_path)
+    # Networks are already content addressed, by their sha256
+    cache_key = cache.artifact_key('network', engine, net_sha)
+
+    with config.cache.lock(cache_key):
+
+        config.cache.fetch(cache_key, net_path)
+
+        credentials = (config.server, config.username, config.password)
+        utils.download_network(*credentials, engine, net_name, net_sha, net_path)
+
+        config.cache.store(cache_key, net_path, '%s (%s)' % (net_name, net_sha))
 
     return net_path
 
-def safe_download_engine(config, branch, net_path):
+def engine_cache_key(config, branch, net_path):
+
+    engine     = config.workload['test'][branch]['engine']
+    commit_sha = config.workload['test'][branch]['sha']
+    private    = config.workload['test'][branch]['private']
+
+    # Private engines select artifacts by CPU flags, and set Networks via UCI
+    compiler = None if private else config.compilers[engine][0]
+    network  = None if private else net_path and os.path.basename(net_path)
+    flags    = ' '.join(config.cpu_flags)
+
+    return cache.artifact_key('engine', engine, commit_sha, compiler, flags, network)
+
+def safe_download_engine(config, branch, net_path, jobs=None):
 
     # Wraps utils.py:download_public_engine() and utils.py:download_private_engine()
+    # Binaries are shared via the Cache, keyed by everything that affects the build
 
     engine      = config.workload['test'][branch]['engine']
     branch_name = config.workload['test'][branch]['name']
     commit_sha  = config.workload['test'][branch]['sha']
-    source      = config.workload['test'][branch]['source']
     private     = config.workload['test'][branch]['private']
 
-    bin_name = utils.engine_binary_name(engine, commit_sha, net_path, private)
-    out_path = os.path.join('Engines', bin_name)
+    bin_name  = utils.engine_binary_name(engine, commit_sha, net_path, private)
+    out_path  = os.path.join('Engines', bin_name)
+    cache_key = engine_cache_key(config, branch, net_path)
+
+    with config.cache.lock(cache_key):
+
+        config.cache.fetch(cache_key, out_path + ['', '.exe'][IS_WINDOWS])
+
+        name = acquire_engine_binary(config, branch, net_path, out_path, jobs)
+
+        config.cache.store(cache_key, os.path.join('Engines', name), '%s (%s)' % (bin_name, branch_name))
+
+    return name
+
+def acquire_engine_binary(config, branch, net_path, out_path, jobs=None):
+
+    engine      = config.workload['test'][branch]['engine']
+    branch_name = config.workload['test'][branch]['name']
+    source      = config.workload['test'][branch]['source']
+    private     = config.workload['test'][branch]['private']
 
     if private:
 
@@ -1075,7 +2155,7 @@ def safe_download_engine(config, branch, net_path):
                 engine, branch_name, source, out_path, config.cpu_name, config.cpu_flags)
 
         except utils.OpenBenchMissingArtifactException as error:
-            ServerReporter.report_missing_artifact(config, branch, error.name, error.logs)
+            ServerReporter.report_missing_artifact(config, error.name, error.logs)
             raise
 
     else:
@@ -1085,7 +2165,8 @@ def safe_download_engine(config, branch, net_path):
 
         try:
             return utils.download_public_engine(
-                engine, net_path, branch_name, source, make_path, out_path, compiler)
+                engine, net_path, branch_name, source, make_path, out_path, compiler,
+                cache_source=True, ccache=config.ccache, jobs=jobs)
 
         except utils.OpenBenchBuildFailedException as error:
 
@@ -1120,90 +2201,204 @@ def safe_create_genfens_opening_book(config, dev_name, dev_network):
             ServerReporter.report_engine_error(config, error.message)
             raise
 
-def safe_run_benchmarks(config, branch, engine, network):
+def safe_run_benchmarks(config, branches, placement=None):
+
+    # Takes a list of (branch, engine, network), and returns the speed of each. Speeds
+    # come from the Bench Cache only if every branch hits, else all are benchmarked,
+    # interleaved, together, so that their ratio is measured under the same load
+
+    speeds, pending, results = {}, [], []
 
-    name     = config.workload['test'][branch]['name']
-    private  = config.workload['test'][branch]['private']
-    expected = int(config.workload['test'][branch]['bench'])
-    binary   = os.path.join('Engines', engine)
+    # Each bench is pinned to one of the CPUs that Cutechess will be using, one apiece
+    affinity = [[cpu] for cpus in placement for cpu in cpus] if placement else None
+    threads  = len(affinity) if affinity else config.threads
 
     try:
-        print('\nRunning %dx Benchmarks for %s' % (config.threads, name))
-        speed, nodes = bench.run_benchmark(
-            binary, network, private, config.threads, 1, expected)
+
+        for branch, engine, network in branches:
+
+            name     = config.workload['test'][branch]['name']
+            private  = config.workload['test'][branch]['private']
+            expected = int(config.workload['test'][branch]['bench'])
+            binary   = os.path.join('Engines', engine)
+            key      = bench_cache_key(config, binary, network, threads, affinity)
+
+            args     = (binary, network, private, expected)
+
+            # One single-threaded bench confirms that the binary matches its cached entry
+            if entry := config.bench_cache.lookup(key):
+
+                print('\nRunning 1x Benchmark for %s' % (name))
+                nodes, speed = bench.multi_core_bench(binary, network, private, 1, affinity)[0]
+                bench.summarize_benchmark(engine, [nodes], [speed], expected)
+
+                if config.bench_cache.matches(entry, nodes):
+                    speeds[branch] = entry['nps']
+
+            pending.append((branch, name, key, args))
+
+        # Every branch hit, so none need to be benchmarked
+        if len(speeds) == len(branches):
+
+            for branch, name, key, args in pending:
+                print('Speed for %s is %d (cached)' % (name, speeds[branch]))
+
+            return [speeds[branch] for branch, engine, network in branches]
+
+        print('\nRunning %dx Interleaved Benchmarks for %s' % (
+            threads, ', '.join(x[1] for x in pending)))
+
+        results = bench.run_interleaved_benchmarks([x[3] for x in pending],
+            threads, BENCH_MIN_SETS, BENCH_MAX_SETS, BENCH_PRECISION, affinity)
+
+        for (branch, name, key, args), result in zip(pending, results):
+
+            print('Bench for %s is %d' % (name, result.bench))
+            print('Speed for %s is %d +- %d (%d samples, %d outliers)' % (
+                name, result.nps, result.ci, result.samples, result.rejected))
+            speeds[branch] = result.nps
+
+            config.bench_cache.store(key, result.nps, result.bench)
 
     except utils.OpenBenchBadBenchException as error:
         ServerReporter.report_bad_bench(config, error.message)
         raise
 
-    print('Bench for %s is %d' % (name, nodes))
-    print('Speed for %s is %d' % (name, speed))
-    return speed
+    return [speeds[branch] for branch, engine, network in branches]
 
+def bench_cache_key(config, binary, network, threads, affinity):
 
-def build_cutechess_command(config, dev_cmd, base_cmd, scale_factor, timestamp, cutechess_idx):
+    # Private engines are paired with a Network, while public ones embed it
+    machine = (config.cpu_name, config.logical_cores, config.os_name, config.sockets, affinity)
+    return cache.artifact_key(
+        utils.file_sha256(binary), network and os.path.basename(network),
+        threads, *machine)
 
-    flags  = ' ' + Cutechess.basic_settings(config)
-    flags += ' ' + Cutechess.concurrency_settings(config)
-    flags += ' ' + Cutechess.adjudication_settings(config)
-    flags += ' ' + Cutechess.engine_settings(config, dev_cmd, 'dev', scale_factor, cutechess_idx)
-    flags += ' ' + Cutechess.engine_settings(config, base_cmd, 'base', scale_factor, cutechess_idx)
-    flags += ' ' + Cutechess.book_settings(config, cutechess_idx)
-    flags += ' ' + Cutechess.pgnout_settings(config, timestamp, cutechess_idx)
 
-    return ['cutechess-ob.exe', './cutechess-ob'][IS_LINUX] + flags
+def run_and_parse_match(config, runner, command, cutechess_idx, pipeline, abort_flag, cpus=None):
 
-def run_and_parse_cutechess(config, command, cutechess_idx, results_queue, abort_flag):
+    print('\n[#%d] Launching %s...\n%s\n' % (cutechess_idx, runner.__name__, command))
+    if cpus: print('[#%d] Pinned to CPUs %s\n' % (cutechess_idx, ','.join(map(str, cpus))))
+    process = topology.pinned_popen(command.split(), cpus, stdout=PIPE)
 
-    print('\n[#%d] Launching Cutechess...\n%s\n' % (cutechess_idx, command))
-    cutechess = Popen(command.split(), stdout=PIPE)
+    results = empty_match_results()
 
-    results = {
+    # Read each line of output until the pipe closes and we get b"" back
+    for line in iter(process.stdout.readline, b''):
 
-        'trinomial'   : [0, 0, 0],       # LDW
-        'pentanomial' : [0, 0, 0, 0, 0], # LL DL DD DW WW
-        'games'       : {},              # game_id : result_str
+        if abort_flag.is_set():
+            break
 
-        'crashes'     : 0,               # " disconnect" or "connection stalls"
-        'timelosses'  : 0,               # " loses on time "
-        'illegals'    : 0,               # " illegal move "
+        # Skip the noisiest lines without decoding them
+        if line.startswith((b'Started game', b'Score of')):
+            continue
+
+        line = line.strip().decode('ascii')
+        print('[#%d] %s' % (cutechess_idx, line))
+
+        if not line.startswith('Finished game'):
+            continue
+
+        runner.update_results(results, line)
+
+        flush_finished_pairs(results, pipeline, cutechess_idx)
+
+def run_native_match(config, dev_name, base_name, scale_factor, timestamp, cutechess_idx, pipeline, abort_flag, cpus=None):
+
+    # Plays the same games that Cutechess would, with the same accounting of results
+    results = empty_match_results()
+
+    def engine_spec(branch, command):
+        options = [x.strip('"').split('=', 1) for x in MatchRunner.engine_options(config, branch, cutechess_idx, False)]
+        control = scale_time_control(config.workload, scale_factor, branch)
+        name    = '%s-%s' % (config.workload['test'][branch]['engine'], branch)
+        return native_runner.EngineSpec(name, os.path.abspath(os.path.join('Engines', command)),
+            'Engines', [tuple(x) for x in options if len(x) == 2], native_runner.TimeControl(control))
+
+    def on_game(game, players, result, reason):
+        print('[#%d] Finished game %d (%s): %s {%s}' % (cutechess_idx, game, players, result, reason))
+        MatchRunner.record_game(results, game, result, reason)
+        flush_finished_pairs(results, pipeline, cutechess_idx)
+
+    is_frc = MatchRunner.is_frc(config)
+
+    settings = {
+        'engines'     : { 'dev' : engine_spec('dev', dev_name), 'base' : engine_spec('base', base_name) },
+        'games'       : config.workload['distribution']['games-per-cutechess'],
+        'concurrency' : config.workload['distribution']['concurrency-per'],
+        'book'        : (*MatchRunner.opening_book(config, cutechess_idx), is_frc),
+        'repeat'      : MatchRunner.plays_reverses(config),
+        'chess960'    : is_frc,
+        'win_adj'     : config.workload['test']['win_adj' ],
+        'draw_adj'    : config.workload['test']['draw_adj'],
+        'pgn_path'    : MatchRunner.pgn_name(config, timestamp, cutechess_idx),
+        'cpus'        : cpus,
     }
 
+    # Each copy referees its games from a process of its own. Spawn, rather than fork,
+    # since the Worker is threaded. Results are still accounted for in this thread
+    context = multiprocessing.get_context('spawn')
+    games   = context.Queue()
+    stop    = context.Event()
+    process = context.Process(target=native_runner.play_match, args=(settings, games, stop), daemon=True)
+
+    print('\n[#%d] Launching Native Match...\n' % (cutechess_idx))
+    process.start()
+
     while True:
 
-        # Read each line of output until the pipe closes and we get "" back
-        line = cutechess.stdout.readline().strip().decode('ascii')
-        if not line:
+        if abort_flag.is_set():
+            stop.set()
+
+        try: game = games.get(timeout=1)
+        except queue.Empty:
+            if process.is_alive(): continue
             break
 
-        if abort_flag.is_set():
+        if game is None:
             break
 
-        if 'Started game' not in line and 'Score of' not in line:
-            print('[#%d] %s' % (cutechess_idx, line))
+        on_game(*game)
 
-        if 'Finished game' in line:
-            Cutechess.update_results(results, line)
+    process.join()
 
-        # Add to the results queue every time we have a game-pair finished
-        if any(results['pentanomial']):
+    if process.exitcode:
+        print('[#%d] Native Match exited with code %d' % (cutechess_idx, process.exitcode))
 
-            # Place the results into the Queue, and be sure to copy the lists
-            results_queue.put({
-                'trinomial'     : list(results['trinomial']),
-                'pentanomial'   : list(results['pentanomial']),
-                'crashes'       : results['crashes'],
-                'timelosses'    : results['timelosses'],
-                'illegals'      : results['illegals'],
-                'cutechess_idx' : cutechess_idx,
-            })
+def empty_match_results():
 
-            # Clear out all the results, so we can start collecting a new set
-            results['trinomial'  ] = [0, 0, 0]
-            results['pentanomial'] = [0, 0, 0, 0, 0]
-            results['crashes'    ] = 0
-            results['timelosses' ] = 0
-            results['illegals'   ] = 0
+    return {
+
+        'trinomial'   : [0, 0, 0],       # LDW
+        'pentanomial' : [0, 0, 0, 0, 0], # LL DL DD DW WW
+        'games'       : {},              # game_id : result_str
+
+        'crashes'     : 0,               # " disconnect" or "connection stalls"
+        'timelosses'  : 0,               # " loses on time "
+        'illegals'    : 0,               # " illegal move "
+    }
+
+def flush_finished_pairs(results, pipeline, cutechess_idx):
+
+    # Add to the results pipeline every time we have a game-pair finished
+    if any(results['pentanomial']):
+
+        # Place the results into the Pipeline, and be sure to copy the lists
+        pipeline.put({
+            'trinomial'     : list(results['trinomial']),
+            'pentanomial'   : list(results['pentanomial']),
+            'crashes'       : results['crashes'],
+            'timelosses'    : results['timelosses'],
+            'illegals'      : results['illegals'],
+            'cutechess_idx' : cutechess_idx,
+        })
+
+        # Clear out all the results, so we can start collecting a new set
+        results['trinomial'  ] = [0, 0, 0]
+        results['pentanomial'] = [0, 0, 0, 0, 0]
+        results['crashes'    ] = 0
+        results['timelosses' ] = 0
+        results['illegals'   ] = 0
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 #                                                                           #
@@ -1214,13 +2409,25 @@ def run_and_parse_cutechess(config, command, cutechess_idx, results_queue, abort
 def reload_local_imports():
 
     import bench
+    import cache
+    import chessboard
+    import game_records
     import genfens
+    import native_runner
     import pgn_util
+    import prewarm
+    import topology
     import utils
 
     importlib.reload(bench)
+    importlib.reload(cache)
+    importlib.reload(chessboard)
+    importlib.reload(game_records)
     importlib.reload(genfens)
+    importlib.reload(native_runner)
     importlib.reload(pgn_util)
+    importlib.reload(prewarm)
+    importlib.reload(topology)
     importlib.reload(utils)
 
 def parse_arguments(client_args):
@@ -1239,6 +2446,15 @@ def parse_arguments(client_args):
     p.add_argument(      '--fleet'   , help='Fleet Mode'                  , action='store_true')
     p.add_argument(      '--noisy'   , help='Reject time-based workloads' , action='store_true')
     p.add_argument(      '--focus'   , help='Prefer certain engine(s)'    , nargs='+'          )
+    p.add_argument(      '--cache-dir', help='Artifact Cache, may be shared' , required=False     )
+    p.add_argument(      '--cache-mb' , help='Artifact Cache size limit'     , default=4096       )
+    p.add_argument(      '--ccache'   , help='Compile engines using ccache'  , action='store_true')
+    p.add_argument(      '--bench-cache-age', help='Seconds to reuse Benchmarks, 0 disables', default=3600)
+    p.add_argument(      '--affinity'   , help='Pin Cutechess and Benchmarks to CPUs (one Worker per host)', action='store_true')
+    p.add_argument(      '--prefetch'   , help='Prepare the next Workload during this one'   , action='store_true')
+    p.add_argument(      '--runner'     , help='Play games with Cutechess, Fastchess, or natively, ignoring what Tests request', choices=sorted(MATCH_RUNNERS))
+    p.add_argument(      '--pgn-fifo'   , help='Read PGNs from named pipes, instead of files (Linux)', action='store_true')
+    p.add_argument(      '--prewarm'    , help='Load Networks, books, and Syzygy into memory before playing', action='store_true')
 
     # Ignore unknown arguments ( from client )
     worker_args, unknown = p.parse_known_args()
@@ -1259,7 +2475,11 @@ def run_openbench_worker(client_args):
     try_forever(server_configure_worker, [config], setup_error)
 
     if IS_LINUX:
-        set_cutechess_permissions()
+        set_runner_permissions('cutechess-ob')
+
+    # Fastchess is optional, and may be placed alongside cutechess-ob
+    if IS_LINUX and os.path.isfile('fastchess'):
+        set_runner_permissions('fastchess')
 
     # Cleanup in case openbench.exit still exists
     if os.path.isfile('openbench.exit'):
@@ -1274,7 +2494,10 @@ def run_openbench_worker(client_args):
 
         try:
             # Cleanup on each workload request
-            cleanup_client()
+            cleanup_client(config)
+
+            # Deliver any Results left over from a failed upload or a crash
+            replay_results_journal(config)
 
             # Keep asking for a workload until we get a response
             try_forever(server_request_workload, [config], connection_error)
@@ -1285,8 +2508,8 @@ def run_openbench_worker(client_args):
             # Otherwise --fleet workers will exit when there is no work
             elif config.fleet: time.sleep(TIMEOUT_ERROR); sys.exit()
 
-            # In either case, wait before requesting again
-            else: time.sleep(TIMEOUT_WORKLOAD)
+            # In either case, wait before requesting again, as long as the Server asks
+            else: time.sleep(config.pacing['poll_delay'])
 
         # Caught by client.py, prompting a Client Update
         except BadVersionException:
@@ -1301,4 +2524,4 @@ def run_openbench_worker(client_args):
 
         except Exception:
             traceback.print_exc()
-            time.sleep(TIMEOUT_ERROR)
+            time.sleep(config.pacing['retry_after'])
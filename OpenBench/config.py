@@ -31,6 +31,22 @@ OPENBENCH_STATIC_VERSION = 'v6'
 OPENBENCH_CONFIG          = None # Initialized by OpenBench/apps.py
 OPENBENCH_CONFIG_CHECKSUM = None # Initialized by OpenBench/apps.py
 
+PGN_CODECS              = ['zstd', 'xz', 'bz2'] # bz2 is always accepted, for older Clients
+PGN_COMPRESSION_DEFAULT = {
+    'codecs' : ['bz2'], 'zstd_level' : 10, 'xz_level' : 9, 'zstd_dictionary' : None,
+    'chunk_timeout' : 3600, # Seconds since the last chunk arrived, before archiving what we have
+}
+
+PACING_DEFAULT = {
+    'target_reports_per_second' : 10,   # Rate of reports to aim for, across every Machine
+    'target_latency'            : 0.25, # Seconds to handle a request, before backing off
+    'min_report_interval'       : 15,
+    'max_report_interval'       : 120,
+    'retry_after'               : 10,
+    'poll_delay'                : 30,
+    'max_poll_delay'            : 300,
+}
+
 def create_openbench_config():
 
     with open(os.path.join(PROJECT_PATH, 'Config', 'config.json')) as fin:
@@ -45,6 +61,15 @@ def create_openbench_config():
         engine : load_engine_config(engine) for engine in config_dict['engines']
     }
 
+    config_dict['pgn_compression'] = load_pgn_compression_config(
+        config_dict.get('pgn_compression', {}))
+
+    config_dict['pacing'] = load_pacing_config(config_dict.get('pacing', {}))
+
+    # Binary game records are only collected when asked for
+    config_dict['upload_game_records'] = config_dict.get('upload_game_records', False)
+    assert type(config_dict['upload_game_records']) == bool
+
     # Rolling sha256sum of the engine's build configs
     checksum = hashlib.sha256(b'').digest()
     for engine, engine_config in config_dict['engines'].items():
@@ -64,6 +89,40 @@ def load_book_config(book_name):
 
     return conf
 
+def load_pgn_compression_config(conf):
+
+    conf = { **PGN_COMPRESSION_DEFAULT, **conf }
+
+    assert type(conf['codecs']) == list and all(x in PGN_CODECS for x in conf['codecs'])
+    assert type(conf['zstd_level']) == int and 1 <= conf['zstd_level'] <= 22
+    assert type(conf['xz_level']) == int and 0 <= conf['xz_level'] <= 9
+    assert type(conf['chunk_timeout']) in (int, float) and conf['chunk_timeout'] > 0
+
+    # Trained zstd dictionaries live in Config/, and are identified by their dictionary id
+    conf['zstd_dictionary_id'] = 0
+    if conf['zstd_dictionary']:
+
+        with open(os.path.join(PROJECT_PATH, 'Config', conf['zstd_dictionary']), 'rb') as fin:
+            header = fin.read(8)
+
+        assert header[:4] == b'\x37\xa4\x30\xec'
+        conf['zstd_dictionary_id'] = int.from_bytes(header[4:8], 'little')
+
+    return conf
+
+def load_pacing_config(conf):
+
+    conf = { **PACING_DEFAULT, **conf }
+
+    assert all(type(value) in (int, float) and value > 0 for value in conf.values())
+    assert conf['min_report_interval'] <= conf['max_report_interval']
+    assert conf['poll_delay'] <= conf['max_poll_delay']
+
+    # Machines that do not report within five minutes are no longer considered active
+    assert conf['max_report_interval'] < 300
+
+    return conf
+
 def load_engine_config(engine_name):
 
     try:
@@ -161,6 +220,7 @@ def verify_engine_test_preset(test_preset):
 
         'book_name',
         'upload_pgns',
+        'runner',
         'priority',
         'throughput',
         'workload_size',
@@ -201,6 +261,7 @@ def verify_engine_tune_preset(tune_preset):
 
         'book_name',
         'upload_pgns',
+        'runner',
         'priority',
         'throughput',
         'syzygy_wdl',
@@ -238,6 +299,7 @@ def verify_engine_datagen_preset(datagen_preset):
 
         'book_name',
         'upload_pgns',
+        'runner',
         'priority',
         'throughput',
         'workload_size',
@@ -84,6 +84,11 @@ class Result(Model):
     crashes  = IntegerField(default=0)
     timeloss = IntegerField(default=0)
 
+    # Most recent ids of the Workers' journaled reports and error batches, so that a resent
+    # report or batch is ignored
+    APPLIED_LIMIT = 256
+    applied  = JSONField(default=list, blank=True)
+
     def __str__(self):
         return '{0} {1}'.format(self.test.dev.name, self.machine.__str__())
 
@@ -94,6 +99,12 @@ class Test(Model):
         BASE = 'BASE', 'BASE'
         BOTH = 'BOTH', 'BOTH'
 
+    class MatchRunner(TextChoices):
+        DEFAULT   = 'DEFAULT'  , 'DEFAULT'
+        CUTECHESS = 'CUTECHESS', 'CUTECHESS'
+        FASTCHESS = 'FASTCHESS', 'FASTCHESS'
+        NATIVE    = 'NATIVE'   , 'NATIVE'
+
     # Misc information
     author      = CharField(max_length=64)
     upload_pgns = CharField(max_length=16, default='FALSE')
@@ -129,6 +140,9 @@ class Test(Model):
     scale_method  = CharField(max_length=16, choices=ScaleMethod.choices, default=ScaleMethod.BASE)
     scale_nps     = IntegerField(default=0)
 
+    # Program which plays the games, or DEFAULT to let each Worker decide
+    runner = CharField(max_length=16, choices=MatchRunner.choices, default=MatchRunner.DEFAULT)
+
     # Tablebases and Cutechess adjudicatoins
     syzygy_wdl  = CharField(max_length=16, default='OPTIONAL')
     syzygy_adj  = CharField(max_length=16, default='OPTIONAL')
@@ -203,6 +217,7 @@ class LogEvent(Model):
 
     machine_id = IntegerField(default=0)   # Only set for Client based Log Events
     test_id    = IntegerField(default=0)   # Should always be set
+    count      = IntegerField(default=1)   # Occurrences, for batched engine errors
 
     created    = DateTimeField(auto_now_add=True)
 
@@ -224,13 +239,36 @@ class Network(Model):
 
 class PGN(Model):
 
+    class Codec(TextChoices):
+        BZ2  = 'bz2' , 'bz2'
+        XZ   = 'xz'  , 'xz'
+        ZSTD = 'zstd', 'zstd'
+
+    SUFFIXES = { 'bz2' : 'bz2', 'xz' : 'xz', 'zstd' : 'zst' }
+
     test_id    = IntegerField(default=0)
     result_id  = IntegerField(default=0)
     book_index = IntegerField(default=0)
+    sequence   = IntegerField(default=0)
+    final      = BooleanField(default=True)
     processed  = BooleanField(default=False)
+    codec      = CharField(max_length=8, choices=Codec.choices, default=Codec.BZ2)
+    dictionary = BigIntegerField(default=0) # zstd dictionary id, or 0 if none was used
+    records    = BooleanField(default=False) # Binary game records were sent with the PGN
 
     def __str__(self):
-        return self.filename()
+        return self.chunk_filename()
 
     def filename(self):
-        return '%s.%s.%s.pgn.bz2' % (self.test_id, self.result_id, self.book_index)
+        return '%s.%s.%s.pgn.%s' % (self.test_id, self.result_id, self.book_index, self.SUFFIXES[self.codec])
+
+    def chunk_filename(self):
+        return '%s.%s.%s.%s.pgn.%s.part' % (
+            self.test_id, self.result_id, self.book_index, self.sequence, self.SUFFIXES[self.codec])
+
+    def records_filename(self):
+        return '%s.%s.%s.records.%s' % (self.test_id, self.result_id, self.book_index, self.SUFFIXES[self.codec])
+
+    def records_chunk_filename(self):
+        return '%s.%s.%s.%s.records.%s.part' % (
+            self.test_id, self.result_id, self.book_index, self.sequence, self.SUFFIXES[self.codec])
@@ -0,0 +1,88 @@
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                             #
+#   OpenBench is a chess engine testing framework authored by Andrew Grant.   #
+#   <https://github.com/AndyGrant/OpenBench>           <andrew@grantnet.us>   #
+#                                                                             #
+#   OpenBench is free software: you can redistribute it and/or modify         #
+#   it under the terms of the GNU General Public License as published by      #
+#   the Free Software Foundation, either version 3 of the License, or         #
+#   (at your option) any later version.                                       #
+#                                                                             #
+#   OpenBench is distributed in the hope that it will be useful,              #
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of            #
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the             #
+#   GNU General Public License for more details.                              #
+#                                                                             #
+#   You should have received a copy of the GNU General Public License         #
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# Advisory pacing for Clients. The Server spreads the reports of the active Machines,
+# so that the fleet as a whole stays near a target rate of requests, and backs off
+# further whenever Client requests take longer than usual to handle. Clients are told
+# how often to report, how long to wait before retrying, and how long to wait before
+# asking for another workload. Load is measured separately by each Server process.
+#
+# Only two functions should be used externally from this Module.
+# 1. with track_request(): ...
+# 2. hints = pacing_hints()
+
+import contextlib
+import random
+import threading
+import time
+
+import OpenBench.config
+import OpenBench.utils
+
+LATENCY_WEIGHT    = 0.05 # Weight of each request in the moving average of latency
+MACHINES_LIFETIME = 30   # Seconds before counting the active Machines again
+
+_state = { 'latency' : 0.0, 'machines' : 0, 'counted' : 0.0 }
+_lock  = threading.Lock()
+
+@contextlib.contextmanager
+def track_request():
+
+    start = time.time()
+    try: yield
+    finally:
+        elapsed = time.time() - start
+        with _lock:
+            _state['latency'] += LATENCY_WEIGHT * (elapsed - _state['latency'])
+
+def active_machines():
+
+    # Counting is a query of its own, so reuse the count for a while
+    with _lock:
+        if time.time() - _state['counted'] < MACHINES_LIFETIME:
+            return _state['machines']
+
+    machines = OpenBench.utils.getRecentMachines().count()
+
+    with _lock:
+        _state['machines'], _state['counted'] = machines, time.time()
+
+    return machines
+
+def pacing_hints():
+
+    conf = OpenBench.config.OPENBENCH_CONFIG['pacing']
+
+    # Spread the reports of every active Machine to stay near the target rate
+    interval = active_machines() / conf['target_reports_per_second']
+
+    # Back off further, in proportion to how slowly requests are being handled
+    with _lock:
+        interval *= max(1.0, _state['latency'] / conf['target_latency'])
+
+    interval = min(conf['max_report_interval'], max(conf['min_report_interval'], interval))
+    backoff  = interval / conf['min_report_interval']
+
+    # Jitter the retries, so that Clients failing together do not return together
+    return {
+        'report_interval' : round(interval, 1),
+        'retry_after'     : round(conf['retry_after'] * backoff * random.uniform(0.5, 1.5), 1),
+        'poll_delay'      : round(min(conf['max_poll_delay'], conf['poll_delay'] * backoff), 1),
+    }
@@ -18,14 +18,18 @@
 #                                                                             #
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
+import collections
 import os
+import shutil
 import sys
 import tarfile
 import threading
 import time
 import traceback
 
+from OpenBench.config import OPENBENCH_CONFIG
 from OpenBench.models import PGN
+from OpenSite.settings import PROJECT_PATH
 
 from django.db import transaction, OperationalError
 from django.core.files.base import ContentFile
@@ -33,38 +37,112 @@ from django.core.files.storage import FileSystemStorage
 
 class PGNWatcher(threading.Thread):
 
+    ## Workers upload their PGNs in chunks, while games are still being played. Once every
+    ## chunk of a Workload has arrived, the chunks are joined in sequence into a single
+    ## .pgn.bz2, .pgn.xz, or .pgn.zst, per the codec the Worker negotiated, which is added
+    ## to the Test's .tar archive. Concatenated streams of each codec are themselves valid,
+    ## so the chunks never need to be decompressed here. zstd dictionaries are archived
+    ## alongside the PGNs as pgn.<id>.dict, so that the archive can always be read. Binary
+    ## game records, if the Worker sent them, are joined in the same way into .records.tar.
+    ## PGNs from before chunking have no chunk files, and are archived without joining.
+    ## Chunks arriving after their Workload was archived are joined and archived later,
+    ## as a further member named after the first late chunk's sequence number.
+
     def __init__(self, stop_event, *args, **kwargs):
         self.stop_event = stop_event
         super().__init__(*args, **kwargs)
 
-    def process_pgn(self, pgn):
+    def chunks_are_ready(self, chunks):
+
+        # All chunks, up to and including the final one, have arrived
+        final = [pgn.sequence for pgn in chunks if pgn.final]
+        if final and len(chunks) == final[0] + 1:
+            return True
+
+        # Workers may die before sending the final chunk, so wait only so long after the last
+        timeout = OPENBENCH_CONFIG['pgn_compression']['chunk_timeout']
+        paths   = [FileSystemStorage().path(pgn.chunk_filename()) for pgn in chunks]
+        newest  = max([os.path.getmtime(path) for path in paths if os.path.exists(path)], default=0)
+        return time.time() - newest > timeout
+
+    def archive_dictionaries(self, tar, chunks):
+
+        conf     = OPENBENCH_CONFIG['pgn_compression']
+        archived = set(tar.getnames())
+
+        for dictionary in set(pgn.dictionary for pgn in chunks if pgn.dictionary):
+
+            # Only the current dictionary is accepted by client_submit_pgn
+            arcname = 'pgn.%d.dict' % (dictionary)
+            if arcname not in archived and dictionary == conf['zstd_dictionary_id']:
+                tar.add(os.path.join(PROJECT_PATH, 'Config', conf['zstd_dictionary']), arcname=arcname)
+
+    def archive_chunks(self, chunks, archive, filename, chunk_filename):
+
+        tar_path = FileSystemStorage('Media/PGNs').path('%d.%s.tar' % (chunks[0].test_id, archive))
+        out_path = FileSystemStorage().path(filename(chunks[0]))
 
-        tar_path = FileSystemStorage('Media/PGNs').path('%d.pgn.tar' % (pgn.test_id))
-        pgn_path = FileSystemStorage().path(pgn.filename())
+        # Ensure Media/PGNs exists
+        dir_name = os.path.dirname(tar_path)
+        if not os.path.exists(dir_name):
+            os.makedirs(dir_name)
+
+        # PGNs uploaded whole, before chunking, are already joined, and are archived as they are
+        present = [pgn for pgn in chunks if FileSystemStorage().exists(chunk_filename(pgn))]
+        legacy  = not present and os.path.exists(out_path)
+
+        # Join the chunks, in order, into a single compressed file
+        if not legacy:
+            with open(out_path, 'wb') as fout:
+                for pgn in present:
+                    with FileSystemStorage().open(chunk_filename(pgn), 'rb') as fin:
+                        shutil.copyfileobj(fin, fout)
+
+        # First file will create the initial .tar file
+        mode = 'a' if os.path.exists(tar_path) else 'w'
+        with tarfile.open(tar_path, mode) as tar:
+
+            # Late chunks are named after their first chunk, dropping the .part suffix
+            arcname = filename(chunks[0])
+            if present and arcname in tar.getnames():
+                arcname = chunk_filename(present[0])[:-len('.part')]
+
+            self.archive_dictionaries(tar, chunks)
+            tar.add(out_path, arcname=arcname)
+
+        # Delete the joined file and its chunks
+        FileSystemStorage().delete(filename(chunks[0]))
+        for pgn in chunks:
+            FileSystemStorage().delete(chunk_filename(pgn))
+
+    def process_pgn(self, chunks):
 
         with transaction.atomic():
 
-            # Ensure Media/PGNs exists
-            dir_name = os.path.dirname(tar_path)
-            if not os.path.exists(dir_name):
-                os.makedirs(dir_name)
+            self.archive_chunks(chunks, 'pgn', PGN.filename, PGN.chunk_filename)
 
-            # First PGN will create the initial .tar file
-            mode = 'a' if os.path.exists(tar_path) else 'w'
-            with tarfile.open(tar_path, mode) as tar:
-                tar.add(pgn_path, arcname=pgn.filename())
+            # Game records go to their own archive, leaving the PGN archive as it was
+            if records := [pgn for pgn in chunks if pgn.records]:
+                self.archive_chunks(records, 'records', PGN.records_filename, PGN.records_chunk_filename)
 
-            # Delete the raw .pgn.bz2 file, and don't process it again
-            FileSystemStorage().delete(pgn.filename())
-            pgn.processed = True
-            pgn.save()
+            # Don't process these chunks again
+            for pgn in chunks:
+                pgn.processed = True
+                pgn.save()
 
     def run(self):
         while not self.stop_event.wait(timeout=15):
 
             try: # Never exit on errors, to keep the watcher alive
-                for pgn in PGN.objects.filter(processed=False):
-                    self.process_pgn(pgn)
+
+                # Group the chunks of each Workload, which share a Test, Result, and book index
+                workloads = collections.defaultdict(list)
+                for pgn in PGN.objects.filter(processed=False).order_by('sequence'):
+                    workloads[(pgn.test_id, pgn.result_id, pgn.book_index)].append(pgn)
+
+                for chunks in workloads.values():
+                    if self.chunks_are_ready(chunks):
+                        self.process_pgn(chunks)
 
             # Expect the database to be locked sometimes
             except OperationalError as error:
@@ -74,4 +152,4 @@ class PGNWatcher(threading.Thread):
 
             except: # Totally unknown error
                 traceback.print_exc()
-                sys.stdout.flush()
\ No newline at end of file
+                sys.stdout.flush()
@@ -62,10 +62,12 @@ urlpatterns = [
     django.urls.path(r'clientGetBuildInfo/', OpenBench.views.client_get_build_info),
     django.urls.path(r'clientWorkerInfo/', OpenBench.views.client_worker_info),
     django.urls.path(r'clientGetWorkload/', OpenBench.views.client_get_workload),
+    django.urls.path(r'clientPeekWorkload/', OpenBench.views.client_peek_workload),
     django.urls.path(r'clientGetNetwork/<str:engine>/<str:name>/', OpenBench.views.client_get_network),
     django.urls.path(r'clientBenchError/', OpenBench.views.client_bench_error),
     django.urls.path(r'clientSubmitNPS/', OpenBench.views.client_submit_nps),
     django.urls.path(r'clientSubmitError/', OpenBench.views.client_submit_error),
+    django.urls.path(r'clientSubmitErrors/', OpenBench.views.client_submit_errors),
     django.urls.path(r'clientSubmitResults/', OpenBench.views.client_submit_results),
     django.urls.path(r'clientHeartbeat/', OpenBench.views.client_heartbeat),
     django.urls.path(r'clientSubmitPGN/', OpenBench.views.client_submit_pgn),
@@ -78,6 +80,8 @@ urlpatterns = [
     django.urls.path(r'api/networks/<str:engine>/<str:identifier>/delete/', OpenBench.views.api_network_delete),
     django.urls.path(r'api/buildinfo/', OpenBench.views.api_build_info),
     django.urls.path(r'api/pgns/<int:pgn_id>/', OpenBench.views.api_pgns),
+    django.urls.path(r'api/pgns/<int:pgn_id>/records/', OpenBench.views.api_pgns, { 'archive' : 'records' }),
+    django.urls.path(r'api/pgn_dictionary/<int:dictionary_id>/', OpenBench.views.api_pgn_dictionary),
 
     # Redirect anything else to the Index
     django.urls.path(r'', OpenBench.views.index),
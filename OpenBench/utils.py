@@ -33,7 +33,7 @@ from django.core.files.base import ContentFile
 from django.core.files.storage import FileSystemStorage
 from django.db import transaction
 from django.db.models import F
-from django.http import FileResponse
+from django.http import FileResponse, HttpResponse
 from django.utils import timezone
 from wsgiref.util import FileWrapper
 
@@ -351,14 +351,35 @@ def network_delete(request, engine, network):
 
 def network_download(request, engine, network):
 
+    netfile = os.path.join(MEDIA_ROOT, network.sha256)
+    size    = os.path.getsize(netfile)
+    fileobj = open(netfile, 'rb')
+
+    # Clients may resume an interrupted download with "Range: bytes=<offset>-"
+    offset = 0
+    if (match := re.match(r'^bytes=(\d+)-$', request.META.get('HTTP_RANGE', ''))):
+        offset = int(match.group(1))
+
+    # Unable to satisfy a Range starting beyond the end of the file
+    if offset and offset >= size:
+        fileobj.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % (size)
+        return response
+
     # Craft the download HTML response
-    netfile  = os.path.join(MEDIA_ROOT, network.sha256)
-    fwrapper = FileWrapper(open(netfile, 'rb'), 8192)
-    response = FileResponse(fwrapper, content_type='application/octet-stream')
+    fileobj.seek(offset)
+    fwrapper = FileWrapper(fileobj, 1024 * 1024)
+    response = FileResponse(fwrapper, content_type='application/octet-stream', status=[200, 206][bool(offset)])
+
+    # Partial responses must describe which portion of the file is being sent
+    if offset:
+        response['Content-Range'] = 'bytes %d-%d/%d' % (offset, size - 1, size)
 
     # Set all headers and return response
     response['Expires'] = (datetime.datetime.utcnow() + datetime.timedelta(days=7)).ctime()
-    response['Content-Length'] = os.path.getsize(netfile)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Length'] = size - offset
     response['Content-Disposition'] = 'attachment; filename=' + network.sha256
     return response
 
@@ -562,13 +583,25 @@ def update_test(request, machine):
     # Pentanomial Implementation
     LL, LD, DD, DW, WW = map(int, request.POST['pentanomial'].split())
 
+    # Journal entry of the report, which older Workers do not send
+    entry_id = request.POST.get('entry_id')
+
     with transaction.atomic():
 
-        test = Test.objects.select_for_update().get(id=test_id)
+        test   = Test.objects.select_for_update().get(id=test_id)
+        result = Result.objects.select_for_update().get(id=result_id)
 
         if test.finished or test.deleted:
             return { 'stop' : True }
 
+        # Reports which timed out after being applied are resent, and must not count twice
+        if entry_id and entry_id in result.applied:
+            return {}
+
+        if entry_id:
+            result.applied = (result.applied + [entry_id])[-Result.APPLIED_LIMIT:]
+            result.save(update_fields=['applied'])
+
         test.losses += losses # Trinomial
         test.draws  += draws
         test.wins   += wins
@@ -622,21 +655,21 @@ def update_test(request, machine):
 
         test.save()
 
-    # Update Result object; No risk from concurrent access
-    Result.objects.filter(id=result_id).update(
-        games    = F('games'   ) + games,
-        losses   = F('losses'  ) + losses,
-        draws    = F('draws'   ) + draws,
-        wins     = F('wins'    ) + wins,
-        LL       = F('LL'      ) + LL,
-        LD       = F('LD'      ) + LD,
-        DD       = F('DD'      ) + DD,
-        DW       = F('DW'      ) + DW,
-        WW       = F('WW'      ) + WW,
-        crashes  = F('crashes' ) + crashes,
-        timeloss = F('timeloss') + timelosses,
-        updated  = timezone.now()
-    )
+        # Update Result object; Within the transaction, along with the applied entry id
+        Result.objects.filter(id=result_id).update(
+            games    = F('games'   ) + games,
+            losses   = F('losses'  ) + losses,
+            draws    = F('draws'   ) + draws,
+            wins     = F('wins'    ) + wins,
+            LL       = F('LL'      ) + LL,
+            LD       = F('LD'      ) + LD,
+            DD       = F('DD'      ) + DD,
+            DW       = F('DW'      ) + DW,
+            WW       = F('WW'      ) + WW,
+            crashes  = F('crashes' ) + crashes,
+            timeloss = F('timeloss') + timelosses,
+            updated  = timezone.now()
+        )
 
     # Update Profile object; No risk from concurrent access
     Profile.objects.filter(user=Machine.objects.get(id=machine_id).user).update(
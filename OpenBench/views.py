@@ -18,7 +18,7 @@
 #                                                                             #
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-import os, hashlib, datetime, json, secrets, sys, re
+import os, hashlib, datetime, json, secrets, sys, re, bz2
 
 import django.http
 import django.shortcuts
@@ -27,9 +27,10 @@ import django.contrib.auth
 import OpenBench.config
 import OpenBench.utils
 import OpenBench.model_utils
+import OpenBench.pacing
 
 from OpenBench.workloads.create_workload import create_workload
-from OpenBench.workloads.get_workload import get_workload
+from OpenBench.workloads.get_workload import get_workload, peek_workload
 from OpenBench.workloads.modify_workload import modify_workload
 from OpenBench.workloads.verify_workload import verify_workload
 from OpenBench.workloads.view_workload import view_workload
@@ -424,7 +425,10 @@ def users(request):
 def event(request, pk):
 
     try:
-        with open(os.path.join(MEDIA_ROOT, LogEvent.objects.get(id=pk).log_file)) as fin:
+        # Batched engine errors share one bz2 compressed log, for the entire Workload
+        fname  = os.path.join(MEDIA_ROOT, LogEvent.objects.get(id=pk).log_file)
+        opener = bz2.open if fname.endswith('.bz2') else open
+        with opener(fname, 'rt') as fin:
             return render(request, 'event.html', { 'content' : fin.read() })
     except:
         return redirect(request, '/index/', error='No logs for event exist')
@@ -580,8 +584,9 @@ def verify_worker(function):
         if machine.info.get('OPENBENCH_CONFIG_CHECKSUM') != OPENBENCH_CONFIG_CHECKSUM:
             return JsonResponse({ 'error' : 'Server Configuration Changed' })
 
-        # Otherwise, carry on, and pass along the machine
-        return function(*args, machine)
+        # Otherwise, carry on, and pass along the machine, timing the request for pacing
+        with OpenBench.pacing.track_request():
+            return function(*args, machine)
 
     return wrapped_verify_worker
 
@@ -673,7 +678,12 @@ def client_get_network(request, engine, name):
 @csrf_exempt
 @verify_worker
 def client_get_workload(request, machine):
-    return JsonResponse(get_workload(request, machine))
+    return JsonResponse({ **get_workload(request, machine), 'pacing' : OpenBench.pacing.pacing_hints() })
+
+@csrf_exempt
+@verify_worker
+def client_peek_workload(request, machine):
+    return JsonResponse(peek_workload(request, machine))
 
 @csrf_exempt
 @verify_worker
@@ -730,12 +740,63 @@ def client_submit_error(request, machine):
 
     return JsonResponse({})
 
+@csrf_exempt
+@verify_worker
+def client_submit_errors(request, machine):
+
+    ## Report a batch of errors during gameplay, counted by their failure signature. Each
+    ## signature gets a single Event per Workload, whose count grows with every batch, and
+    ## every Event of the Workload shares one log, made of concatenated bz2 streams.
+
+    test_id   = int(request.POST['test_id'])
+    result_id = int(request.POST['result_id'])
+    batch_id  = request.POST.get('batch_id') # Older Workers do not send one
+    errors    = json.loads(request.POST['errors'])
+    log_file  = 'errors.%d.%d.log.bz2' % (test_id, result_id)
+
+    # Reject logs which could not be appended as a valid bz2 stream
+    logs = request.FILES['logs'].read() if 'logs' in request.FILES else b''
+    try: bz2.decompress(logs)
+    except (OSError, ValueError): return JsonResponse({ 'error' : 'Malformed error logs' })
+
+    with transaction.atomic():
+
+        # Batches which timed out after being applied are resent, and must not count twice
+        if batch_id:
+
+            result = Result.objects.select_for_update().get(id=result_id)
+            if batch_id in result.applied:
+                return JsonResponse({})
+
+            result.applied = (result.applied + [batch_id])[-Result.APPLIED_LIMIT:]
+            result.save(update_fields=['applied'])
+
+        for summary, count in errors.items():
+
+            event, created = LogEvent.objects.get_or_create(
+                machine_id = machine.id,
+                test_id    = test_id,
+                log_file   = log_file,
+                summary    = summary[:128],
+                defaults   = { 'author' : machine.user.username, 'count' : int(count) })
+
+            if not created:
+                LogEvent.objects.filter(id=event.id).update(count=F('count') + int(count))
+
+        # Save the Logs to /Media/ to be viewed later, alongside earlier batches
+        if logs:
+            with open(os.path.join(MEDIA_ROOT, log_file), 'ab') as fout:
+                fout.write(logs)
+
+    return JsonResponse({})
+
 @csrf_exempt
 @verify_worker
 def client_submit_results(request, machine):
 
-    # Returns {}, or { 'stop' : True }
-    return JsonResponse(OpenBench.utils.update_test(request, machine))
+    # Returns {}, or { 'stop' : True }, along with pacing hints
+    response = OpenBench.utils.update_test(request, machine)
+    return JsonResponse({ **response, 'pacing' : OpenBench.pacing.pacing_hints() })
 
 @csrf_exempt
 @verify_worker
@@ -744,9 +805,9 @@ def client_heartbeat(request, machine):
     # Force a refresh of the updated timestamp
     machine.save()
 
-    # Include a 'stop' header iff the test was finished
+    # Include a 'stop' header iff the test was finished, along with pacing hints
     test = Test.objects.get(id=int(request.POST['test_id']))
-    return JsonResponse([{}, { 'stop' : True }][test.finished])
+    return JsonResponse({ **[{}, { 'stop' : True }][test.finished], 'pacing' : OpenBench.pacing.pacing_hints() })
 
 @csrf_exempt
 @verify_worker
@@ -754,15 +815,38 @@ def client_submit_pgn(request, machine):
 
     with transaction.atomic():
 
-        # Format: test.result.book-index.pgn.bz2
+        # Format: test.result.book-index.sequence.pgn.<codec>.part
         pgn            = PGN()
         pgn.test_id    = int(request.POST['test_id']   )
         pgn.result_id  = int(request.POST['result_id'] )
         pgn.book_index = int(request.POST['book_index'])
+        pgn.sequence   = int(request.POST.get('sequence', 0))
+        pgn.final      = bool(int(request.POST.get('final', 1)))
+        pgn.codec      = request.POST.get('codec', PGN.Codec.BZ2)
+        pgn.dictionary = int(request.POST.get('dictionary', 0))
+        pgn.records    = 'records' in request.FILES
+
+        # Only accept codecs we offered, and dictionaries we are able to archive
+        conf = OPENBENCH_CONFIG['pgn_compression']
+        if pgn.codec != PGN.Codec.BZ2 and pgn.codec not in conf['codecs']:
+            return JsonResponse({ 'error' : 'Unsupported PGN codec %s' % (pgn.codec) })
+
+        if pgn.dictionary not in (0, conf['zstd_dictionary_id']):
+            return JsonResponse({ 'error' : 'Unknown PGN dictionary %d' % (pgn.dictionary) })
+
+        # Chunks may be retried after a timeout, despite having arrived
+        chunks = PGN.objects.filter(test_id=pgn.test_id, result_id=pgn.result_id)
+        if chunks.filter(book_index=pgn.book_index, sequence=pgn.sequence).exists():
+            return JsonResponse({})
+
         pgn.save()
 
-        # Save the .pgn.bz2 to /Media/
-        FileSystemStorage().save(pgn.filename(), ContentFile(request.FILES['file'].read()))
+        # Save the chunk to /Media/, for the PGNWatcher to reassemble
+        FileSystemStorage().save(pgn.chunk_filename(), ContentFile(request.FILES['file'].read()))
+
+        # As well as the binary game records for the chunk, if they were sent
+        if pgn.records:
+            FileSystemStorage().save(pgn.records_chunk_filename(), ContentFile(request.FILES['records'].read()))
 
     return JsonResponse({})
 
@@ -894,7 +978,21 @@ def api_build_info(request):
     return api_response(data)
 
 @csrf_exempt
-def api_pgns(request, pgn_id):
+def api_pgn_dictionary(request, dictionary_id):
+
+    if not api_authenticate(request):
+        return api_response({ 'error' : 'API requires authentication for this server' })
+
+    # Only the dictionary currently in use is served, although archives retain older ones
+    conf = OPENBENCH_CONFIG['pgn_compression']
+    if not conf['zstd_dictionary'] or dictionary_id != conf['zstd_dictionary_id']:
+        return api_response({ 'error' : 'PGN dictionary %d does not exist' % (dictionary_id) })
+
+    fpath = os.path.join(PROJECT_PATH, 'Config', conf['zstd_dictionary'])
+    return FileResponse(open(fpath, 'rb'), content_type='application/octet-stream')
+
+@csrf_exempt
+def api_pgns(request, pgn_id, archive='pgn'):
 
     # 0. Make sure the request has the correct permissions
     if not api_authenticate(request):
@@ -904,10 +1002,11 @@ def api_pgns(request, pgn_id):
     try: workload = Test.objects.get(pk=pgn_id)
     except: return api_response({ 'error' : 'Requested Workload Id does not exist' })
 
-    # 2. Make sure there actually is a PGN attached to the Workload
-    pgn_path = FileSystemStorage('Media/PGNs').path('%d.pgn.tar' % (pgn_id))
+    # 2. Make sure there actually is a PGN, or game records, attached to the Workload
+    pgn_name = '%d.%s.tar' % (pgn_id, archive)
+    pgn_path = FileSystemStorage('Media/PGNs').path(pgn_name)
     if not os.path.exists(pgn_path):
-        return api_response({ 'error' : 'Unable to find PGN for Workload #%d' % (pgn_id) })
+        return api_response({ 'error' : 'Unable to find %s for Workload #%d' % (archive.upper(), pgn_id) })
 
     # 3. Make sure the workload is not currently running
     if not workload.finished:
@@ -917,7 +1016,7 @@ def api_pgns(request, pgn_id):
     if OpenBench.utils.getRecentMachines().filter(workload=pgn_id):
         return api_response({ 'error' : 'Some machines are still on this Workload. Try again shortly' })
 
-    # 5. Make sure there are no pending .pgn.bz2 files to be processed
+    # 5. Make sure there are no pending PGN chunks to be processed
     if PGN.objects.filter(test_id=pgn_id).filter(processed=False):
         return api_response({ 'error' : 'Still processing individual PGNs into the archive. Try again shortly' })
 
@@ -928,7 +1027,7 @@ def api_pgns(request, pgn_id):
     # Set all headers and return response
     response['Expires'] = -1
     response['Content-Length'] = os.path.getsize(pgn_path)
-    response['Content-Disposition'] = 'attachment; filename=%d.pgn.tar' % (pgn_id)
+    response['Content-Disposition'] = 'attachment; filename=%s' % (pgn_name)
     return response
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -115,6 +115,7 @@ def create_new_test(request):
     test.author            = request.user.username
     test.book_name         = request.POST['book_name']
     test.upload_pgns       = request.POST['upload_pgns']
+    test.runner            = request.POST.get('runner', 'DEFAULT')
 
     test.dev               = get_engine(*dev_info)
     test.dev_repo          = request.POST['dev_repo']
@@ -183,6 +184,7 @@ def create_new_tune(request):
     test.author           = request.user.username
     test.book_name        = request.POST['book_name']
     test.upload_pgns      = request.POST['upload_pgns']
+    test.runner           = request.POST.get('runner', 'DEFAULT')
 
     test.dev              = test.base              = get_engine(*dev_info)
     test.dev_repo         = test.base_repo         = request.POST['dev_repo']
@@ -234,6 +236,7 @@ def create_new_datagen(request):
     test.author            = request.user.username
     test.book_name         = request.POST['book_name']
     test.upload_pgns       = request.POST['upload_pgns']
+    test.runner            = request.POST.get('runner', 'DEFAULT')
 
     test.dev               = get_engine(*dev_info)
     test.dev_repo          = request.POST['dev_repo']
@@ -21,6 +21,9 @@
 # Module serves a singular purpose, to invoke:
 # >>> get_workload(Machine)
 #
+# Workers may also invoke peek_workload(Machine), which selects a workload in the
+# same way, but without assigning it, so that its artifacts can be prefetched.
+#
 # Refer to: https://github.com/AndyGrant/OpenBench/wiki/Workload-Assignment
 
 import math
@@ -51,6 +54,20 @@ def get_workload(request, machine):
 
     return { 'workload' : workload_to_dictionary(test, result, machine) }
 
+def peek_workload(request, machine):
+
+    # Select a workload, but do not assign it, nor create a Result, nor touch the book
+    if not (test := select_workload(request, machine)):
+        return {}
+
+    workload = { 'test' : { 'id' : test.id } }
+
+    workload['test']['book'] = book_to_dictionary(test)
+    workload['test']['dev' ] = engine_to_dictionary(test, 'dev' )
+    workload['test']['base'] = engine_to_dictionary(test, 'base')
+
+    return { 'workload' : workload }
+
 def select_workload(request, machine):
 
     # Step 1: Refine active workloads to the candidate assignments
@@ -207,47 +224,17 @@ def workload_to_dictionary(test, result, machine):
         'play_reverses' : test.play_reverses,
         'scale_method'  : test.scale_method,
         'scale_nps'     : test.scale_nps,
+        'runner'        : test.runner,
     }
 
-    workload['test']['book'] = {
-        'name'   : test.book_name,
-        'sha'    : OPENBENCH_CONFIG['books'].get(test.book_name, { 'sha'    : None })['sha'   ],
-        'source' : OPENBENCH_CONFIG['books'].get(test.book_name, { 'source' : None })['source'],
-    }
-
-    workload['test']['dev'] = {
-        'id'           : test.dev.id,
-        'name'         : test.dev.name,
-        'source'       : test.dev.source,
-        'sha'          : test.dev.sha,
-        'bench'        : test.dev.bench,
-        'engine'       : test.dev_engine,
-        'options'      : test.dev_options,
-        'network'      : test.dev_network,
-        'netname'      : test.dev_netname,
-        'time_control' : test.dev_time_control,
-        'build'        : OPENBENCH_CONFIG['engines'][test.dev_engine]['build'],
-        'private'      : OPENBENCH_CONFIG['engines'][test.dev_engine]['private'],
-    }
-
-    workload['test']['base'] = {
-        'id'           : test.base.id,
-        'name'         : test.base.name,
-        'source'       : test.base.source,
-        'sha'          : test.base.sha,
-        'bench'        : test.base.bench,
-        'engine'       : test.base_engine,
-        'options'      : test.base_options,
-        'network'      : test.base_network,
-        'netname'      : test.base_netname,
-        'time_control' : test.base_time_control,
-        'build'        : OPENBENCH_CONFIG['engines'][test.base_engine]['build'],
-        'private'      : OPENBENCH_CONFIG['engines'][test.base_engine]['private'],
-    }
+    workload['test']['book'] = book_to_dictionary(test)
+    workload['test']['dev' ] = engine_to_dictionary(test, 'dev' )
+    workload['test']['base'] = engine_to_dictionary(test, 'base')
 
     workload['distribution']   = game_distribution(test, machine)
     workload['spsa']           = spsa_to_dictionary(test, workload)
     workload['reporting_type'] = test.spsa.get('reporting_type', 'BATCHED')
+    workload['pgn']            = pgn_compression_to_dictionary()
 
     with transaction.atomic():
 
@@ -269,6 +256,47 @@ def workload_to_dictionary(test, result, machine):
 
     return workload
 
+def pgn_compression_to_dictionary():
+
+    # Codecs in order of preference. Workers use the first that they support
+    conf = OPENBENCH_CONFIG['pgn_compression']
+
+    return {
+        'codecs'     : conf['codecs'],
+        'levels'     : { 'zstd' : conf['zstd_level'], 'xz' : conf['xz_level'], 'bz2' : 9 },
+        'dictionary' : conf['zstd_dictionary_id'],
+        'records'    : OPENBENCH_CONFIG['upload_game_records'],
+    }
+
+def book_to_dictionary(test):
+
+    return {
+        'name'   : test.book_name,
+        'sha'    : OPENBENCH_CONFIG['books'].get(test.book_name, { 'sha'    : None })['sha'   ],
+        'source' : OPENBENCH_CONFIG['books'].get(test.book_name, { 'source' : None })['source'],
+    }
+
+def engine_to_dictionary(test, branch):
+
+    # Either test.dev and test.dev_*, or test.base and test.base_*
+    engine = getattr(test, '%s_engine' % (branch))
+    commit = getattr(test, branch)
+
+    return {
+        'id'           : commit.id,
+        'name'         : commit.name,
+        'source'       : commit.source,
+        'sha'          : commit.sha,
+        'bench'        : commit.bench,
+        'engine'       : engine,
+        'options'      : getattr(test, '%s_options' % (branch)),
+        'network'      : getattr(test, '%s_network' % (branch)),
+        'netname'      : getattr(test, '%s_netname' % (branch)),
+        'time_control' : getattr(test, '%s_time_control' % (branch)),
+        'build'        : OPENBENCH_CONFIG['engines'][engine]['build'],
+        'private'      : OPENBENCH_CONFIG['engines'][engine]['private'],
+    }
+
 def spsa_to_dictionary(test, workload):
 
     if test.test_mode != 'SPSA':
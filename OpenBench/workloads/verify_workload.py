@@ -92,6 +92,7 @@ def verify_test_creation(errors, request):
         # Verify everything about the Test Settings
         (verify_configuration  , 'book_name', 'Book', 'books'),
         (verify_upload_pgns    , 'upload_pgns', 'Upload PGNs'),
+        (verify_runner         , 'runner', 'Runner'),
         (verify_test_mode      , 'test_mode'),
         (verify_sprt_bounds    , 'test_bounds'),
         (verify_sprt_conf      , 'test_confidence'),
@@ -140,6 +141,7 @@ def verify_tune_creation(errors, request):
         # Verify everything about the Test Settings
         (verify_configuration         , 'book_name', 'Book', 'books'),
         (verify_upload_pgns           , 'upload_pgns', 'Upload PGNs'),
+        (verify_runner                , 'runner', 'Runner'),
 
         # Verify everything about the General Settings
         (verify_integer               , 'priority', 'Priority'),
@@ -198,6 +200,7 @@ def verify_datagen_creation(errors, request):
         (verify_datagen_reverse, 'datagen_play_reverses'),
         (verify_datagen_book   , 'book_name', 'Book', 'books'),
         (verify_upload_pgns    , 'upload_pgns', 'Upload PGNs'),
+        (verify_runner         , 'runner', 'Runner'),
 
         # Verify everything about the General Settings
         (verify_integer        , 'priority', 'Priority'),
@@ -345,6 +348,12 @@ def verify_upload_pgns(errors, request, field, field_name):
     try: request.POST[field] in ['FALSE', 'COMPACT', 'VERBOSE']
     except: errors.append('"%s" must be FALSE, COMPACT, or VERBOSE' % (field_name))
 
+def verify_runner(errors, request, field, field_name):
+    try: assert request.POST.get(field, 'DEFAULT') in Test.MatchRunner
+    except:
+        choices = [f[0] for f in Test.MatchRunner.choices]
+        errors.append('%s must be one of {%s}' % (field_name, ', '.join(choices)))
+
 def verify_datagen_games(errors, request, field):
     try: assert int(request.POST[field]) > 0
     except: errors.append('Data Generation must last for at least one game')
@@ -21,12 +21,23 @@
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 import argparse
-import bz2
 import io
 import os
 import re
+import sys
 import tarfile
 
+# NumPy is only needed to process game records
+try: import numpy
+except ImportError: numpy = None
+
+# Needed to include from ../Client/*.py
+PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
+sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
+
+from pgn_util import iter_archive_pgns
+from game_records import EVAL_BOOK, EVAL_UNKNOWN, game_headers, load_records
+
 def pgn_iterator(content):
 
     def pgn_header_list(lines):
@@ -72,6 +83,41 @@ def process_content(content, data, result_id, use_scale):
                 data[result_id][white if white_stm else black]['ply']   += 1
             white_stm = not white_stm
 
+def process_records(block, data, use_scale):
+
+    # Every ply belongs to a game, and is played by White or Black, per the side to move
+    counts  = numpy.diff(block.ply_offsets).astype(numpy.int64)
+    game    = numpy.repeat(numpy.arange(block.games), counts)
+    ply     = numpy.arange(block.plies) - block.ply_offsets[:-1].astype(numpy.int64)[game]
+    valid   = (block.evals != EVAL_BOOK) & (block.evals != EVAL_UNKNOWN)
+
+    headers = [dict(game_headers(block, x)) for x in range(block.games)]
+    black   = numpy.array(['FEN' in x and x['FEN'].split()[1] == 'b' for x in headers], dtype=numpy.int64)
+    mover   = 2 * game + ((ply % 2) ^ black[game])
+
+    # Sums of Nodes, Time, and Plies, for each (game, side) pair
+    length  = 2 * block.games
+    nodes   = numpy.bincount(mover, weights=block.nodes * valid, minlength=length)
+    time    = numpy.bincount(mover, weights=block.times * valid, minlength=length)
+    plies   = numpy.bincount(mover, weights=valid, minlength=length)
+
+    result_id = str(block.result_id)
+    if result_id not in data:
+        data[result_id] = {}
+
+    for x, header_dict in enumerate(headers):
+
+        factor = float(header_dict['ScaleFactor']) if use_scale else 1.00
+        sides  = (header_dict['White'].split('-')[-1], header_dict['Black'].split('-')[-1])
+
+        for side, engine in enumerate(sides):
+            if engine not in data[result_id]:
+                data[result_id][engine] = { 'nodes' : 0, 'time' : 0, 'games' : 0, 'ply' : 0 }
+            data[result_id][engine]['games'] += 1
+            data[result_id][engine]['nodes'] += int(nodes[2 * x + side])
+            data[result_id][engine]['time' ] += time[2 * x + side] / factor
+            data[result_id][engine]['ply'  ] += int(plies[2 * x + side])
+
 def report_verbose_stats(data):
 
     header = 'Result ID    Games      Dev       Base   '
@@ -123,17 +169,23 @@ def report_general_stats(data):
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('filename', help='Path to the OpenBench pgn archive')
+    parser.add_argument('filename', help='Path to the OpenBench pgn archive, or to records from archive2records.py')
     parser.add_argument('--scale' , help='Adjust based on ScaleFactor', action='store_true')
     parser.add_argument('-v', '--verbose', help='Verbose reporting per machine', action='store_true')
     args = parser.parse_args()
 
     data = {}
-    with tarfile.open(args.filename, 'r') as tar:
-        for member in filter(lambda x: x.isfile(), tar.getmembers()):
-            if file := tar.extractfile(member):
-                test_id, result_id, seed, _, _ = member.name.split('.')
-                process_content(bz2.decompress(file.read()), data, result_id, args.scale)
+
+    # Uncompressed game records are memory mapped, rather than scanned with regexes
+    if not tarfile.is_tarfile(args.filename):
+        for block in load_records(args.filename):
+            process_records(block, data, args.scale)
+
+    else:
+        with tarfile.open(args.filename, 'r') as tar:
+            for name, content in iter_archive_pgns(tar):
+                test_id, result_id = name.split('.')[:2] # Late chunks carry their sequence too
+                process_content(content, data, result_id, args.scale)
 
     if args.verbose:
         report_verbose_stats(data)
@@ -21,9 +21,17 @@
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 import argparse
-import bz2
+import os
+import sys
 import tarfile
 
+# Needed to include from ../Client/*.py
+PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
+sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
+
+from pgn_util import iter_archive_pgns
+from game_records import export_pgn, iter_archive_records
+
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
@@ -32,7 +40,11 @@ if __name__ == '__main__':
 
     data = {}
     with tarfile.open(args.archive, 'r') as tar:
-        for member in filter(lambda x: x.isfile(), tar.getmembers()):
-            if file := tar.extractfile(member):
-                for line in bz2.decompress(file.read()).decode('utf-8').split('\n'):
-                    print (line)
\ No newline at end of file
+        for name, content in iter_archive_pgns(tar):
+            for line in content.decode('utf-8').split('\n'):
+                print (line)
+
+        # Archives of binary game records are exported back to PGN
+        for name, records in iter_archive_records(tar):
+            for line in export_pgn(records).split('\n'):
+                print (line)
\ No newline at end of file
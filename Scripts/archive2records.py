@@ -0,0 +1,53 @@
+#!/bin/python3
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                           #
+#   OpenBench is a chess engine testing framework authored by Andrew Grant. #
+#   <https://github.com/AndyGrant/OpenBench>           <andrew@grantnet.us> #
+#                                                                           #
+#   OpenBench is free software: you can redistribute it and/or modify       #
+#   it under the terms of the GNU General Public License as published by    #
+#   the Free Software Foundation, either version 3 of the License, or       #
+#   (at your option) any later version.                                     #
+#                                                                           #
+#   OpenBench is distributed in the hope that it will be useful,            #
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+#   GNU General Public License for more details.                            #
+#                                                                           #
+#   You should have received a copy of the GNU General Public License       #
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+#                                                                           #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# Decompresses OpenBench .records.tar archives, from /api/pgns/<id>/records/,
+# into a single file of game records. The output can be memory mapped with
+# game_records.load_records(), for example by archive2nps.py.
+
+import argparse
+import os
+import sys
+import tarfile
+
+# Needed to include from ../Client/*.py
+PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
+sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
+
+from game_records import iter_archive_records, iter_block_layouts
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('archives', help='Paths to OpenBench records archives', nargs='+')
+    parser.add_argument('--output', help='Path to write the game records', required=True)
+    args = parser.parse_args()
+
+    games = 0
+    with open(args.output, 'wb') as fout:
+        for archive in args.archives:
+            with tarfile.open(archive, 'r') as tar:
+                for name, records in iter_archive_records(tar):
+                    games += sum(fields[2] for fields, layout in iter_block_layouts(records))
+                    fout.write(records)
+
+    print ('Wrote %d games to %s' % (games, args.output))
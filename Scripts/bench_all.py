@@ -32,7 +32,7 @@ PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
 sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
 
 from utils import *
-from bench import run_benchmark
+from bench import run_interleaved_benchmarks
 
 def engine_binary_name(engine, configs):
     return '%s-%s' % (engine, configs[engine]['test_presets']['default']['base_branch'])
@@ -119,6 +119,7 @@ if __name__ == '__main__':
     parser.add_argument('--engines', help='List of specific engines', nargs='+')
     parser.add_argument('--threads', help='Concurrent Benchmarks',  required=True, type=int)
     parser.add_argument('--sets'   , help='Benchmark Sample Count', required=True, type=int)
+    parser.add_argument('--precision', help='Stop early once the 95%% CI is within this fraction', type=float, default=0.0)
     args   = credentialed_cmdline_args(parser)
 
     # Get the build info, and default network info, for all applicable engines
@@ -154,7 +155,7 @@ if __name__ == '__main__':
 
     # Pretty Formatting
     max_length   = max(len(engine) for engine in engines)
-    print_format = '%-' + str(max_length) + 's %8d nps %10d nodes in %6.3f seconds'
+    print_format = '%-' + str(max_length) + 's %8d nps +- %6d %10d nodes in %6.3f seconds (%d samples, %d outliers)'
 
     for engine in engines:
 
@@ -171,8 +172,10 @@ if __name__ == '__main__':
         net_path    = os.path.join('Networks', configs[engine]['network']['sha']) if private_net else None
 
         try:
-            nps, nodes = run_benchmark(binary, net_path, private_net, args.threads, args.sets)
-            print (print_format % (engine, nps, nodes, nodes / max(1e-6, nps)))
+            result = run_interleaved_benchmarks([(binary, net_path, private_net, None)],
+                args.threads, 1 if args.precision else args.sets, args.sets, args.precision)[0]
+            print (print_format % (engine, result.nps, result.ci, result.bench,
+                result.bench / max(1e-6, result.nps), result.samples, result.rejected))
 
         except OpenBenchBadBenchException as error:
             print ('%s: %s' % (engine, error))
@@ -0,0 +1,68 @@
+#!/bin/python3
+
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#                                                                           #
+#   OpenBench is a chess engine testing framework authored by Andrew Grant. #
+#   <https://github.com/AndyGrant/OpenBench>           <andrew@grantnet.us> #
+#                                                                           #
+#   OpenBench is free software: you can redistribute it and/or modify       #
+#   it under the terms of the GNU General Public License as published by    #
+#   the Free Software Foundation, either version 3 of the License, or       #
+#   (at your option) any later version.                                     #
+#                                                                           #
+#   OpenBench is distributed in the hope that it will be useful,            #
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of          #
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           #
+#   GNU General Public License for more details.                            #
+#                                                                           #
+#   You should have received a copy of the GNU General Public License       #
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.   #
+#                                                                           #
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+# Trains a zstd dictionary from the games in existing OpenBench pgn archives.
+# Place the output in Config/, and name it as pgn_compression.zstd_dictionary
+# in Config/config.json. Workers will fetch it when compressing with zstd.
+
+import argparse
+import os
+import random
+import sys
+import tarfile
+import zstandard
+
+# Needed to include from ../Client/*.py
+PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
+sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
+
+from pgn_util import PATTERN_GAME_END, iter_archive_pgns, zstd_dictionary_id
+
+def archive_games(archive):
+
+    # Each game, with its headers and comments, is a separate training sample
+    with tarfile.open(archive, 'r') as tar:
+        for name, content in iter_archive_pgns(tar):
+            start = 0
+            for match in PATTERN_GAME_END.finditer(content):
+                yield content[start:match.end()]
+                start = match.end()
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('archives', help='Paths to OpenBench pgn archives', nargs='+')
+    parser.add_argument('--output', help='Path to write the dictionary', required=True)
+    parser.add_argument('--size'  , help='Size of the dictionary in bytes', type=int, default=112640)
+    parser.add_argument('--games' , help='Maximum number of games sampled', type=int, default=100000)
+    parser.add_argument('--seed'  , help='Seed used to sample the games', type=int, default=0)
+    args = parser.parse_args()
+
+    samples = [game for archive in args.archives for game in archive_games(archive)]
+    samples = random.Random(args.seed).sample(samples, min(args.games, len(samples)))
+
+    dictionary = zstandard.train_dictionary(args.size, samples).as_bytes()
+    with open(args.output, 'wb') as fout:
+        fout.write(dictionary)
+
+    print ('Trained dictionary %d from %d games, %d bytes' % (
+        zstd_dictionary_id(dictionary), len(samples), len(dictionary)))
@@ -0,0 +1,92 @@
+#!/bin/python3
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Needed to include from ../Client/*.py
+PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
+sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
+
+from pgn_util import PGNCodec, compress_list_of_pgns, decompress_pgn_payload, strip_entire_pgn
+
+def vary_numbers(text, rng):
+
+    # Replaying identical games would flatter bz2, so perturb the times and node counts
+    return re.sub(r'(\d+/\d+) (\d+) (\d+)\}',
+        lambda x: '%s %d %d}' % (x.group(1), rng.randint(0, 5000), rng.randint(0, 10 ** 7)), text)
+
+def build_pgn(fname, copies, seed):
+
+    games = []
+    for example_pgn in [ 'example1.pgn', 'example2.pgn', 'example3.pgn', ]:
+        with open(example_pgn) as fin:
+            games.append(fin.read().strip() + '\n\n')
+
+    rng = random.Random(seed)
+    with open(fname, 'w') as fout:
+        for x in range(copies):
+            for text in games:
+                fout.write(vary_numbers(text, rng))
+
+def measure(function, *args, trace=True, **kwargs):
+
+    start   = time.time()
+    output  = function(*args, **kwargs)
+    elapsed = time.time() - start
+
+    # Tracing allocations is slow, so the peak is measured on a separate run
+    if not trace:
+        return output, elapsed, 0
+
+    tracemalloc.start()
+    function(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return output, elapsed, peak
+
+def strip_all(fnames, scale_factor, compact):
+    return ''.join(strip_entire_pgn(fname, scale_factor, compact) for fname in fnames)
+
+if __name__ == '__main__':
+
+    p = argparse.ArgumentParser()
+    p.add_argument('--copies'   , help='Copies of the example PGNs to compress', type=int, default=100)
+    p.add_argument('--files'    , help='PGNs to spread the copies across'      , type=int, default=4)
+    p.add_argument('--processes', help='Processes for parallel compression'    , type=int, default=os.cpu_count())
+    p.add_argument('--seed'     , help='Seed used to vary the copies'          , type=int, default=0)
+    p.add_argument('--codec'    , help='Codec used for compression'            , default='bz2', choices=['bz2', 'xz', 'zstd'])
+    p.add_argument('--level'    , help='Compression level for the codec'       , type=int, default=9)
+    args = p.parse_args()
+
+    codec = PGNCodec(args.codec, args.level, None)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+
+        # One PGN per copy of Cutechess
+        fnames = [os.path.join(tmpdir, 'games.%d.pgn' % (x)) for x in range(args.files)]
+        for x, fname in enumerate(fnames):
+            build_pgn(fname, args.copies // args.files, args.seed + x)
+
+        size  = sum(os.path.getsize(fname) for fname in fnames)
+        games = sum(line.startswith('[Event ') for fname in fnames for line in open(fname))
+
+        for compact in [ True, False ]:
+
+            stripped, strip_time, _ = measure(strip_all, fnames, 1.0, compact)
+            serial, serial_time, serial_peak = measure(compress_list_of_pgns, fnames, 1.0, compact, 1, codec=codec)
+            parallel, parallel_time, _ = measure(compress_list_of_pgns, fnames, 1.0, compact, args.processes, codec=codec, trace=False)
+
+            # Multi-stream output, one stream per PGN, decompresses as a whole
+            assert decompress_pgn_payload(serial).decode() == stripped
+            assert decompress_pgn_payload(parallel).decode() == stripped
+
+            print ('%-7s | %5d games | %6.2f MB | strip %5.2fs | serial %5.2fs | %2d processes %5.2fs | %6.0f games/s | peak %5.1f MB | %6.2f MB %s' % (
+                ['Verbose', 'Compact'][compact], games, size / 1024 ** 2, strip_time, serial_time,
+                args.processes, parallel_time, games / parallel_time, serial_peak / 1024 ** 2, len(serial) / 1024 ** 2, codec.name))
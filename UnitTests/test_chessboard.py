@@ -0,0 +1,52 @@
+#!/bin/python3
+
+import os
+import sys
+
+# Needed to include from ../Client/*.py
+PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
+sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
+
+from chessboard import Board, STARTPOS
+
+# FEN, Chess960, Depth, Expected Nodes
+PERFT_POSITIONS = [
+    (STARTPOS, False, 3, 8902),
+    ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', False, 2, 2039),
+    ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', False, 3, 2812),
+    ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', False, 3, 9467),
+    ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', False, 2, 1486),
+    ('bqnb1rkr/pp3ppp/3ppn2/2p5/5P2/P2P4/NPP1P1PP/BQ1BNRKR w HFhf - 2 9', True, 2, 528),
+]
+
+def perft(board, depth):
+
+    if depth == 0:
+        return 1
+
+    nodes = 0
+    for move in board.legal_moves():
+        child = board.copy()
+        child.push(move)
+        nodes += perft(child, depth - 1)
+
+    return nodes
+
+def verify_san_round_trip(board, moves):
+
+    for san in moves:
+        move = board.parse_san(san)
+        assert move and board.san(move) == san
+        assert board.parse_uci(board.uci(move)) == move
+        board.push(move)
+
+if __name__ == '__main__':
+
+    for fen, chess960, depth, expected in PERFT_POSITIONS:
+        assert perft(Board.from_fen(fen, chess960), depth) == expected
+
+    verify_san_round_trip(Board.from_fen(STARTPOS), 'e4 e5 Nf3 Nc6 Bb5 a6 Ba4 Nf6 O-O Be7'.split())
+
+    board = Board.from_fen('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+    board.push(board.parse_uci('a1a8'))
+    assert board.outcome() == ('1-0', 'White mates')
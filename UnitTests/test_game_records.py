@@ -0,0 +1,80 @@
+#!/bin/python3
+
+import os
+import re
+import sys
+import tempfile
+
+# Needed to include from ../Client/*.py
+PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
+sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
+
+from game_records import encode_pgn_texts, export_pgn, iter_record_blocks, load_records
+from game_records import pack_eval, pack_san, unpack_eval, unpack_san, numpy
+from pgn_util import strip_pgn_text
+
+def verify_san_packing(text):
+
+    # Every SAN that the examples contain must survive packing
+    for san in set(re.findall(r'([a-zA-Z0-9+=#-]+) \{', text)):
+        assert unpack_san(pack_san(san)) == san
+
+def verify_export(text, compact):
+
+    # Exports are stripped PGN, and re-encoding an export changes nothing
+    records = encode_pgn_texts([text], 1.0, compact)
+    assert encode_pgn_texts([export_pgn(records)], 1.0, compact) == records
+    return records
+
+def verify_round_trip(text, compact):
+
+    # Exports match the stripped PGN, except for evals which could not be stored exactly
+    stripped = strip_pgn_text(text, 1.0, compact)
+    expected = re.sub(r'\{(?!book\}|unknown\}|(?:[+-]\d+\.\d\d|[+-]M\d+|0\.00) )[^}]*\}', '{unknown}', stripped)
+    assert export_pgn(encode_pgn_texts([text], 1.0, compact)) == expected
+
+def verify_memory_map(records):
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+
+        fname = os.path.join(tmpdir, 'games.records')
+        with open(fname, 'wb') as fout:
+            fout.write(records)
+
+        # Memory mapped blocks must hold the same arrays as the decoded ones
+        for mapped, decoded in zip(load_records(fname), iter_record_blocks(records)):
+            assert mapped.games == decoded.games and mapped.plies == decoded.plies
+            assert list(mapped.moves) == list(decoded.moves)
+            assert list(mapped.nodes) == list(decoded.nodes)
+            assert bytes(mapped.headers) == decoded.headers
+
+if __name__ == '__main__':
+
+    for score in [ 'book', 'unknown', '0.00', '+0.31', '-4.15', '+99.99', '+300.00', '+M9', '-M12', '+M1999' ]:
+        assert score == 'unknown' or unpack_eval(pack_eval(score)) == score
+
+    # Evals which cannot be exported exactly as written are unknown, rather than altered
+    for score in [ '436', '+300.01', '-0.00', '+1.5', '+M2000', 'M3' ]:
+        assert unpack_eval(pack_eval(score)) == 'unknown'
+
+    for example_pgn in [ 'example1.pgn', 'example2.pgn', 'example3.pgn', ]:
+        with open(example_pgn) as fin:
+            text = fin.read()
+
+        verify_san_packing(text)
+
+        for compact in [ True, False ]:
+            verify_export(text, compact)
+            verify_round_trip(text, compact)
+
+    # Cutechess formatted evals are exported exactly as they were written
+    with open('example3.pgn') as fin:
+        text = fin.read()
+    assert export_pgn(verify_export(text, False)) == strip_pgn_text(text, 1.0, False)
+
+    # Blocks may be concatenated, as the Server does with each chunk
+    records = verify_export(text, False) + verify_export(text, True)
+    assert len(list(iter_record_blocks(records))) == 2
+
+    if numpy is not None:
+        verify_memory_map(records)
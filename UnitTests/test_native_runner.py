@@ -0,0 +1,160 @@
+#!/bin/python3
+
+import os
+import re
+import stat
+import sys
+import tempfile
+import threading
+
+# Needed to include from ../Client/*.py
+PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
+sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
+
+import native_runner
+
+# A scripted UCI engine, which plays the first legal move. Misbehaviour is chosen by MODE
+FAKE_ENGINE = '''#!%(python)s
+import os, sys, time
+sys.path.append(%(client)r)
+import chessboard
+
+MODE, MARKER = %(mode)r, %(marker)r
+board, applied, searches = None, [], 0
+
+if MODE == 'dead':
+    sys.exit(1)
+
+for line in sys.stdin:
+
+    tokens = line.split()
+
+    if tokens[:1] == ['uci']:
+        print('id name fake', 'uciok', sep='\\n', flush=True)
+
+    elif tokens[:1] == ['isready']:
+        print('readyok', flush=True)
+
+    elif tokens[:1] == ['position']:
+        moves = tokens[tokens.index('moves') + 1:] if 'moves' in tokens else []
+        if board is None or moves[:len(applied)] != applied:
+            board, applied = chessboard.Board.from_fen(' '.join(tokens[2:8])), []
+        for move in moves[len(applied):]:
+            board.push(board.parse_uci(move))
+            applied.append(move)
+
+    elif tokens[:1] == ['go']:
+
+        searches += 1
+
+        if MODE == 'log':
+            with open(MARKER, 'a') as fout:
+                fout.write(line)
+
+        if MODE == 'stall':
+            continue
+
+        if MODE == 'crash' and searches == 2 and not os.path.exists(MARKER):
+            open(MARKER, 'w').close()
+            sys.exit(1)
+
+        if MODE == 'slow':
+            time.sleep(0.3)
+
+        score = -1000 if MODE == 'resign' else 0
+        print('info depth 1 seldepth 1 nodes 1 score cp %%d' %% (score), flush=True)
+        print('bestmove %%s' %% (board.uci(board.legal_moves()[0])), flush=True)
+
+    elif tokens[:1] == ['quit']:
+        break
+'''
+
+def create_engine(tmpdir, mode):
+
+    path = os.path.join(tmpdir, 'fake-%s' % (mode))
+    with open(path, 'w') as fout:
+        fout.write(FAKE_ENGINE % {
+            'python' : sys.executable, 'client' : os.path.abspath(os.path.join(PARENT, 'Client')),
+            'mode'   : mode,           'marker' : os.path.join(tmpdir, 'marker-%s' % (mode)),
+        })
+
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+def play_match(tmpdir, dev, base, games, concurrency, tc, win_adj='None', dev_tc=None):
+
+    book = os.path.join(tmpdir, 'book.epd')
+    with open(book, 'w') as fout:
+        fout.write('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1\n')
+
+    engines = {
+        'dev'  : native_runner.EngineSpec('dev' , create_engine(tmpdir, dev ), tmpdir, [], native_runner.TimeControl(dev_tc or tc)),
+        'base' : native_runner.EngineSpec('base', create_engine(tmpdir, base), tmpdir, [], native_runner.TimeControl(tc)),
+    }
+
+    # Short games, as the fake engines always report a drawn score
+    results = {}
+    native_runner.Match(
+        engines, games, concurrency, native_runner.OpeningBook(book, 'epd', 'sequential', 1, 0, False),
+        True, False, win_adj, 'movenumber=0 movecount=2 score=10', os.path.join(tmpdir, 'games.pgn'),
+        lambda number, players, result, reason: results.update({ number : (players, result, reason) }),
+        threading.Event()).play()
+
+    assert sorted(results) == list(range(1, games + 1))
+    return results
+
+def dev_lost_every_game(results, reason):
+
+    for number, (players, result, text) in results.items():
+        assert result == ('0-1' if players.startswith('dev') else '1-0')
+        assert reason in text
+
+def verify_time_forfeit():
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dev_lost_every_game(play_match(tmpdir, 'slow', 'normal', 2, 1, 'tc=0.1+0'), 'loses on time')
+
+def verify_stall():
+
+    native_runner.STALL_TIMEOUT = 1
+
+    # Stalled engines are killed and replaced, so that every game is still played
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dev_lost_every_game(play_match(tmpdir, 'stall', 'normal', 4, 2, 'tc=inf nodes=1'), 'connection stalls')
+
+def verify_crash_recovery():
+
+    # One crash loses one game, and the restarted engine plays the rest
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = play_match(tmpdir, 'crash', 'normal', 4, 1, 'tc=10+0.1')
+        reasons = [reason for players, result, reason in results.values()]
+        assert sum('disconnects' in x for x in reasons) == 1
+        assert sum('Draw by adjudication' in x for x in reasons) == 3
+
+    # Engines which cannot even be started forfeit each game, rather than ending the Match
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dev_lost_every_game(play_match(tmpdir, 'dead', 'normal', 4, 2, 'tc=10+0.1'), 'disconnects')
+
+def verify_adjudication():
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = play_match(tmpdir, 'resign', 'normal', 2, 1, 'tc=10+0.1', win_adj='movecount=3 score=500')
+        dev_lost_every_game(results, 'wins by adjudication')
+
+def verify_increments():
+
+    # Each side is told its own increment, not the increment of the side to move
+    with tempfile.TemporaryDirectory() as tmpdir:
+        play_match(tmpdir, 'log', 'normal', 2, 1, 'tc=10+0.2', dev_tc='tc=10+0.1')
+        with open(os.path.join(tmpdir, 'marker-log')) as fin:
+            text = fin.read()
+
+    # Dev plays White, then Black, and is the only engine logging its searches
+    assert set(re.findall(r'winc (\d+) binc (\d+)', text)) == { ('100', '200'), ('200', '100') }
+
+if __name__ == '__main__':
+    verify_time_forfeit()
+    verify_stall()
+    verify_crash_recovery()
+    verify_adjudication()
+    verify_increments()
@@ -9,7 +9,9 @@ PARENT = os.path.join(os.path.dirname(__file__), os.path.pardir)
 sys.path.append(os.path.abspath(os.path.join(PARENT, 'Client')))
 
 from pgn_util import pgn_iterator, pgn_strip_movelist
+from pgn_util import complete_games_length, strip_entire_pgn, strip_pgn_text
 from pgn_util import REGEX_COMMENT_COMPACT, REGEX_COMMENT_VERBOSE
+from pgn_util import PGNCodec, compress_list_of_pgns, decompress_pgn_payload, supported_pgn_codecs
 
 def verify_stripped_move_list(move_list, compact):
 
@@ -19,8 +21,36 @@ def verify_stripped_move_list(move_list, compact):
     for move, comment in re.findall(r'([a-zA-Z0-9+=#-]+)\s\{([^}]*)\}', move_list):
         assert comment in special_comments or comment_regex.match(comment)
 
+def verify_chunked_stripping(fname, chunk_size):
+
+    with open(fname, 'rb') as fin:
+        data = fin.read()
+
+    # Read whole games from the front of each chunk, as if the PGN were still being written
+    stripped, offset = '', 0
+    while length := complete_games_length(data[offset:offset+chunk_size]):
+        stripped += strip_pgn_text(data[offset:offset+length].decode('utf-8'), 1.0, False)
+        offset   += length
+
+    # Anything left over is only read once the file is no longer being written
+    stripped += strip_pgn_text(data[offset:].decode('utf-8'), 1.0, False)
+    assert stripped == strip_entire_pgn(fname, 1.0, False)
+
+def verify_codec_round_trip(fnames, codec):
+
+    # One stream per PGN, which must decompress as a whole, regardless of codec
+    compressed = compress_list_of_pgns(fnames, 1.0, False, 1, codec=codec)
+    expected   = ''.join(strip_entire_pgn(fname, 1.0, False) for fname in fnames)
+    assert decompress_pgn_payload(compressed).decode('utf-8') == expected
+
 if __name__ == '__main__':
     for example_pgn in [ 'example1.pgn', 'example2.pgn', 'example3.pgn', ]:
         for headers, move_list in pgn_iterator(example_pgn):
             for compact in [ True, False ]:
                 verify_stripped_move_list(pgn_strip_movelist(move_list, compact), compact)
+
+    for example_pgn in [ 'example1.pgn', 'example2.pgn', 'example3.pgn', ]:
+        verify_chunked_stripping(example_pgn, 8192)
+
+    for codec in supported_pgn_codecs():
+        verify_codec_round_trip([ 'example1.pgn', 'example2.pgn', 'example3.pgn', ], PGNCodec(codec, 6, None))